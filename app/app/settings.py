@@ -37,6 +37,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     'rest_framework',
     'drf_spectacular',
     'rest_framework.authtoken',
@@ -132,6 +133,10 @@ MEDIA_URL = '/static/media/'
 MEDIA_ROOT = '/vol/web/media'
 STATIC_ROOT = '/vol/web/static'
 
+# Uploads are spooled on the same volume as the media files, so saving
+# one is a rename rather than a copy
+FILE_UPLOAD_TEMP_DIR = os.path.join(MEDIA_ROOT, 'tmp')
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/3.2/ref/settings/#default-auto-field
 
@@ -139,10 +144,88 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 AUTH_USER_MODEL = 'core.User'
 
+# JSON is rendered and parsed with orjson when it is installed
+# (pip install orjson), the same classes use DRF's stdlib json without it
 REST_FRAMEWORK = {
     'DEFAULT_SCHEMA_CLASS': 'drf_spectacular.openapi.AutoSchema',
+    'DEFAULT_RENDERER_CLASSES': [
+        'core.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+    'DEFAULT_PARSER_CLASSES': [
+        'core.parsers.FastJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ],
+}
+
+# Token -> user lookups are cached for TTL seconds in a bounded
+# in-process LRU. An invalidation (token deleted, user deactivated or
+# password changed) only reaches the LRU of the process handling it, so
+# the in-process mode is only safe with a single process: other workers
+# keep accepting the old credentials for up to TTL seconds. With several
+# workers set CACHE (env TOKEN_AUTH_CACHE) to a CACHES alias shared by
+# all of them (memcached, redis), the lookups are then kept there only.
+TOKEN_AUTH_CACHE = {
+    'MAX_SIZE': 10000,
+    'TTL': 60,
+    'CACHE': os.environ.get('TOKEN_AUTH_CACHE') or None,
+}
+
+# Page size of the recipe list, clients can ask for up to the max
+# with the page_size query parameter
+RECIPE_PAGE_SIZE = 50
+RECIPE_MAX_PAGE_SIZE = 500
+
+# Maximum number of recipes accepted by one bulk request
+RECIPE_BULK_MAX = 100
+
+# Recipes read from the database cursor at a time by the NDJSON export
+RECIPE_EXPORT_CHUNK_SIZE = 2000
+
+# Threads generating the resized variants of uploaded recipe images,
+# 0 generates them in the request right after the upload commits
+RECIPE_IMAGE_WORKERS = 2
+
+# Largest recipe image upload, enforced while the body is read
+RECIPE_IMAGE_MAX_BYTES = 10 * 1024 * 1024
+
+# Largest recipe image in pixels (width x height), checked from the
+# header before anything decodes it
+RECIPE_IMAGE_MAX_PIXELS = 40 * 1000 * 1000
+
+# Sizes the recipe image endpoint resizes to. The results are cached in
+# CACHE_DIR, least recently used first evicted past CACHE_MAX_BYTES, and
+# clients may keep them for MAX_AGE seconds
+RECIPE_IMAGE_RESIZE = {
+    'WIDTHS': [160, 320, 640, 960, 1280, 1920],
+    'QUALITIES': [60, 75, 90],
+    'DEFAULT_QUALITY': 75,
+    'CACHE_DIR': '/vol/web/cache',
+    'CACHE_MAX_BYTES': 512 * 1024 * 1024,
+    'MAX_AGE': 7 * 24 * 60 * 60,
 }
 
+# Type-ahead search of tag/ingredient names (q=): default and maximum
+# number of matches returned, and how many recent results each process
+# keeps for repeated prefixes
+RECIPE_ATTR_AUTOCOMPLETE = {
+    'LIMIT': 10,
+    'MAX_LIMIT': 50,
+    'CACHE_SIZE': 10000,
+}
+
+# Header handing media file transfers to the front proxy once the view
+# checked the owner: 'X-Accel-Redirect' (nginx), 'X-Sendfile' (Apache,
+# lighttpd) or None to send them, with Range support, from the worker
+MEDIA_SENDFILE_HEADER = os.environ.get('MEDIA_SENDFILE_HEADER') or None
+
+# Internal nginx location aliased to MEDIA_ROOT, for X-Accel-Redirect
+MEDIA_INTERNAL_URL = '/internal/media/'
+
+# Seconds clients may keep media files, named after their content
+MEDIA_MAX_AGE = 30 * 24 * 60 * 60
+
 #To upload image in document api swagger
 SPECTACULAR_SETTINGS = {
     'COMPONENT_SPLIT_REQUEST': True,
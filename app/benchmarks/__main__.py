@@ -0,0 +1,19 @@
+"""
+Run the API benchmark: python -m benchmarks --help
+or the serializers one: python -m benchmarks serialization --help
+"""
+import os
+import sys
+
+import django
+
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'app.settings')
+django.setup()
+
+if sys.argv[1:2] == ['serialization']:
+    from benchmarks.serialization import main
+    main(sys.argv[2:])
+else:
+    from benchmarks.api import main
+    main()
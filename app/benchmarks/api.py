@@ -0,0 +1,349 @@
+"""
+End-to-end benchmark of the API endpoints.
+
+Boots the app on a throwaway test database, seeds a fixed-size dataset
+with seed_data and drives each scenario with concurrent clients over
+HTTP. Run from the app directory with the usual DB_* variables:
+
+    python -m benchmarks --size small --output results.json
+
+Clients and server share one process, so compare the numbers across
+commits on the same machine rather than reading them as capacity.
+"""
+import argparse
+import io
+import json
+import os
+import platform
+import subprocess
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from itertools import count
+from urllib import request as urlrequest
+from urllib.error import HTTPError
+
+import django
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.core.servers.basehttp import (
+    ThreadedWSGIServer,
+    WSGIRequestHandler,
+)
+from django.core.wsgi import get_wsgi_application
+from django.db import connection, connections
+from django.urls import reverse
+
+from PIL import Image
+from rest_framework.authtoken.models import Token
+
+from benchmarks.stats import (
+    peak_rss_kb,
+    summarize,
+)
+from core.models import (
+    Recipe,
+    Tag,
+)
+
+
+DATASETS = {
+    'small': {'users': 100, 'recipes': 10000},
+    'medium': {'users': 1000, 'recipes': 100000},
+    'large': {'users': 10000, 'recipes': 1000000},
+}
+
+"""seed_data defaults, fixed so the datasets stay comparable"""
+SEED_PASSWORD = 'seedpass123'
+
+
+class QuietHandler(WSGIRequestHandler):
+    """Request handler that does not log every request."""
+
+    def log_message(self, *args):
+        pass
+
+
+class QueryCounter:
+    """WSGI wrapper counting the SQL queries run by the requests."""
+
+    def __init__(self, app):
+        self.app = app
+        self.lock = threading.Lock()
+        self.count = 0
+
+    def __call__(self, environ, start_response):
+        with connection.execute_wrapper(self._count):
+            return self.app(environ, start_response)
+
+    def _count(self, execute, sql, params, many, context):
+        with self.lock:
+            self.count += 1
+        return execute(sql, params, many, context)
+
+    def reset(self):
+        """Return the count so far and start again from zero."""
+        with self.lock:
+            queries, self.count = self.count, 0
+        return queries
+
+
+def _json(method, path, data):
+    return method, path, json.dumps(data).encode(), {
+        'Content-Type': 'application/json'}
+
+
+def _png():
+    """Return a small PNG image as bytes."""
+    buffer = io.BytesIO()
+    Image.new('RGB', (64, 64)).save(buffer, format='PNG')
+    return buffer.getvalue()
+
+
+def _multipart(field_name, filename, content):
+    """Return (body, content type) of a single file upload."""
+    boundary = uuid.uuid4().hex
+    body = b''.join([
+        f'--{boundary}\r\n'.encode(),
+        f'Content-Disposition: form-data; name="{field_name}"; '
+        f'filename="{filename}"\r\n'.encode(),
+        b'Content-Type: image/png\r\n\r\n',
+        content,
+        f'\r\n--{boundary}--\r\n'.encode(),
+    ])
+    return body, f'multipart/form-data; boundary={boundary}'
+
+
+"""every scenario returns (method, path, body, headers) of request i"""
+SCENARIOS = {
+    'recipe-list': lambda ctx, i: (
+        'GET', reverse('recipe:recipe-list'), None, {}),
+    'recipe-list-filtered': lambda ctx, i: (
+        'GET',
+        f'{reverse("recipe:recipe-list")}?tags={ctx["tag_ids"]}',
+        None,
+        {},
+    ),
+    'recipe-detail': lambda ctx, i: (
+        'GET',
+        reverse('recipe:recipe-detail',
+                args=[ctx['recipe_ids'][i % len(ctx['recipe_ids'])]]),
+        None,
+        {},
+    ),
+    'recipe-create': lambda ctx, i: _json(
+        'POST', reverse('recipe:recipe-list'), {
+            'title': f'Benchmark recipe {i}',
+            'time_minutes': 10,
+            'price': '5.50',
+            'tags': [{'name': 'tag-1'}, {'name': f'tag-{i % 50}'}],
+            'ingredients': [
+                {'name': 'ingredient-1'},
+                {'name': f'ingredient-{i % 500}'},
+            ],
+        }),
+    'tag-list': lambda ctx, i: (
+        'GET', reverse('recipe:tag-list'), None, {}),
+    'ingredient-list': lambda ctx, i: (
+        'GET', reverse('recipe:ingredient-list'), None, {}),
+    'ingredient-autocomplete': lambda ctx, i: (
+        'GET',
+        f'{reverse("recipe:ingredient-list")}?q=ingredient-{i % 50}',
+        None,
+        {},
+    ),
+    'token': lambda ctx, i: _json(
+        'POST', reverse('user:token'), {
+            'email': ctx['email'],
+            'password': SEED_PASSWORD,
+        }),
+    'upload-image': lambda ctx, i: (
+        'POST',
+        reverse('recipe:recipe-upload-image',
+                args=[ctx['recipe_ids'][i % len(ctx['recipe_ids'])]]),
+        ctx['upload'][0],
+        {'Content-Type': ctx['upload'][1]},
+    ),
+}
+
+
+def _send(base_url, token, method, path, body, headers):
+    """Send one request and return its status code."""
+    headers = dict(headers)
+    if token:
+        headers['Authorization'] = f'Token {token}'
+    req = urlrequest.Request(
+        base_url + path, data=body, headers=headers, method=method)
+    try:
+        with urlrequest.urlopen(req) as res:
+            res.read()
+            return res.status
+    except HTTPError as error:
+        error.read()
+        return error.code
+
+
+def run_scenario(base_url, name, ctx, counter, requests, concurrency,
+                 warmup):
+    """Drive one scenario with concurrent clients and summarize it."""
+    build = SCENARIOS[name]
+    token = None if name == 'token' else ctx['token']
+    for i in range(warmup):
+        _send(base_url, token, *build(ctx, i))
+
+    numbers = count(warmup)
+    last = warmup + requests
+
+    def client():
+        latencies = []
+        errors = 0
+        for i in numbers:
+            if i >= last:
+                break
+            started = time.perf_counter()
+            status = _send(base_url, token, *build(ctx, i))
+            latencies.append(time.perf_counter() - started)
+            if status >= 400:
+                errors += 1
+
+        return latencies, errors
+
+    counter.reset()
+    started = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as pool:
+        results = [pool.submit(client) for _ in range(concurrency)]
+        results = [result.result() for result in results]
+    elapsed = time.perf_counter() - started
+
+    return summarize(
+        [latency for latencies, errors in results for latency in latencies],
+        elapsed,
+        errors=sum(errors for latencies, errors in results),
+        queries=counter.reset(),
+    )
+
+
+def seed(size):
+    """Seed the dataset once and return the context of the scenarios."""
+    prefix = f'bench-{size}-'
+    email = f'{prefix}0@example.com'
+    if not get_user_model().objects.filter(email=email).exists():
+        call_command(
+            'seed_data',
+            users=DATASETS[size]['users'],
+            recipes=DATASETS[size]['recipes'],
+            email_prefix=prefix,
+            password=SEED_PASSWORD,
+            seed=0,
+            stdout=io.StringIO(),
+        )
+
+    """seed_data gives the most recipes to the first user"""
+    user = get_user_model().objects.get(email=email)
+    return {
+        'email': email,
+        'token': Token.objects.get_or_create(user=user)[0].key,
+        'recipe_ids': list(
+            Recipe.objects.filter(user=user)
+            .order_by('id').values_list('id', flat=True)[:100]),
+        'tag_ids': ','.join(
+            str(tag_id) for tag_id in Tag.objects.filter(user=user)
+            .order_by('id').values_list('id', flat=True)[:2]),
+        'upload': _multipart('image', 'image.png', _png()),
+    }
+
+
+def git_commit():
+    """Return the commit being benchmarked, if known."""
+    try:
+        result = subprocess.run(
+            ['git', 'rev-parse', 'HEAD'], capture_output=True, text=True)
+    except OSError:
+        return None
+
+    return result.stdout.strip() or None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog='python -m benchmarks',
+        description='Benchmark the API endpoints, report JSON.',
+    )
+    parser.add_argument('--size', choices=DATASETS, default='small')
+    parser.add_argument(
+        '--scenario',
+        action='append',
+        choices=SCENARIOS,
+        help='Scenario to run, may be repeated. Default: all.',
+    )
+    parser.add_argument('--requests', type=int, default=500,
+                        help='Measured requests per scenario.')
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--warmup', type=int, default=20)
+    parser.add_argument(
+        '--keepdb',
+        action='store_true',
+        help='Keep the seeded test database for the next run.',
+    )
+    parser.add_argument('--output', help='File to write, default stdout.')
+    args = parser.parse_args(argv)
+
+    """benchmark the production code paths, not the debug ones"""
+    settings.DEBUG = False
+    settings.ALLOWED_HOSTS = ['127.0.0.1']
+    """uploads, their spooled files and the resized images all go to a
+    throwaway directory, never to the deployment's ones"""
+    media_root = tempfile.TemporaryDirectory()
+    settings.MEDIA_ROOT = media_root.name
+    settings.FILE_UPLOAD_TEMP_DIR = os.path.join(media_root.name, 'tmp')
+    os.makedirs(settings.FILE_UPLOAD_TEMP_DIR)
+    settings.RECIPE_IMAGE_RESIZE = {
+        **settings.RECIPE_IMAGE_RESIZE,
+        'CACHE_DIR': os.path.join(media_root.name, 'cache'),
+    }
+
+    old_name = connection.creation.create_test_db(
+        verbosity=0, keepdb=args.keepdb, serialize=False)
+    try:
+        ctx = seed(args.size)
+
+        counter = QueryCounter(get_wsgi_application())
+        httpd = ThreadedWSGIServer(('127.0.0.1', 0), QuietHandler)
+        httpd.set_app(counter)
+        threading.Thread(target=httpd.serve_forever, daemon=True).start()
+        base_url = f'http://127.0.0.1:{httpd.server_address[1]}'
+
+        try:
+            scenarios = {
+                name: run_scenario(
+                    base_url, name, ctx, counter,
+                    args.requests, args.concurrency, args.warmup)
+                for name in args.scenario or SCENARIOS
+            }
+        finally:
+            httpd.shutdown()
+            httpd.server_close()
+    finally:
+        connections.close_all()
+        if not args.keepdb:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+        media_root.cleanup()
+
+    report = {
+        'commit': git_commit(),
+        'python': platform.python_version(),
+        'django': django.get_version(),
+        'dataset': {'size': args.size, **DATASETS[args.size]},
+        'concurrency': args.concurrency,
+        'scenarios': scenarios,
+        'peak_rss_kb': peak_rss_kb(),
+    }
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output + '\n')
+    else:
+        print(output)
@@ -0,0 +1,177 @@
+"""
+Microbenchmark of serializing recipe lists.
+
+Serializes the same in-memory recipes with the DRF serializers, as
+prefetched model instances, and with RecipeReadSerializer, as .values()
+rows, then renders and parses the JSON with DRF's stdlib json classes and
+the orjson ones of core, and reports the CPU time per recipe. No database
+is needed:
+
+    python -m benchmarks serialization --recipes 1000 --tags 3
+
+The queries are left out on purpose, the API benchmark measures them.
+"""
+import argparse
+import io
+import json
+import platform
+import time
+from decimal import Decimal
+
+import django
+from django.conf import settings
+from django.test import RequestFactory
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+
+from benchmarks.api import git_commit
+from core.parsers import FastJSONParser
+from core.renderers import FastJSONRenderer, orjson
+from core.models import (
+    Recipe,
+    Tag,
+    Ingredient,
+)
+from recipe.serializers import (
+    RecipeDetailSerializer,
+    RecipeReadSerializer,
+    RecipeSerializer,
+)
+
+
+SERIALIZERS = {
+    'list': RecipeSerializer,
+    'detail': RecipeDetailSerializer,
+}
+
+
+def make_recipes(count, related):
+    """Return count recipes as instances, and as rows with their items."""
+    instances, rows = [], []
+    items = {'tags': {}, 'ingredients': {}}
+    for recipe_id in range(1, count + 1):
+        row = {
+            'id': recipe_id,
+            'title': f'Recipe {recipe_id}',
+            'time_minutes': recipe_id % 120,
+            'price': Decimal(recipe_id % 5000).scaleb(-2),
+            'link': f'https://example.com/recipes/{recipe_id}',
+            'description': 'Mix everything and bake for an hour. ' * 4,
+            'image': f'uploads/recipe/{recipe_id}.jpg',
+            'image_variants': {
+                'thumbnail': {
+                    'jpeg': f'uploads/recipe/{recipe_id}-thumb.jpg',
+                    'webp': f'uploads/recipe/{recipe_id}-thumb.webp',
+                    'width': 200,
+                    'height': 150,
+                },
+            },
+        }
+        recipe = Recipe(**row)
+        recipe._prefetched_objects_cache = {}
+        for field_name, model in (('tags', Tag), ('ingredients', Ingredient)):
+            objs = [
+                model(id=recipe_id * related + n, name=f'{field_name} {n}')
+                for n in range(related)
+            ]
+            recipe._prefetched_objects_cache[field_name] = objs
+            items[field_name][recipe_id] = [
+                {'id': obj.id, 'name': obj.name} for obj in objs]
+        instances.append(recipe)
+        rows.append(row)
+
+    return instances, rows, items
+
+
+def measure(serialize, count, repeat):
+    """Return the best time of repeat runs, in microseconds per recipe."""
+    """the best run is the one least disturbed by the rest of the system"""
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        serialize()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+
+    return round(best / count * 1e6, 2)
+
+
+def compare(drf, fast, count, repeat):
+    """Return the times of the DRF and the fast JSON classes."""
+    drf = measure(drf, count, repeat)
+    fast = measure(fast, count, repeat)
+
+    return {
+        'drf_us_per_recipe': drf,
+        'fast_us_per_recipe': fast,
+        'speedup': round(drf / fast, 1),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog='python -m benchmarks serialization',
+        description='Benchmark serializing recipe lists, report JSON.',
+    )
+    parser.add_argument('--recipes', type=int, default=1000)
+    parser.add_argument('--tags', type=int, default=3,
+                        help='Tags and ingredients per recipe.')
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args(argv)
+
+    settings.ALLOWED_HOSTS = ['127.0.0.1']
+    instances, rows, items = make_recipes(args.recipes, args.tags)
+    request = RequestFactory().get(
+        '/api/recipe/recipes/', HTTP_HOST='127.0.0.1')
+    context = {'request': request}
+
+    results, rendering, parsing = {}, {}, {}
+    for name, serializer_class in SERIALIZERS.items():
+        fields = list(serializer_class.Meta.fields)
+        reader = RecipeReadSerializer(
+            rows, fields=fields, many=True, context=context)
+        related = {
+            field_name: items[field_name]
+            for field_name in ('tags', 'ingredients')
+            if field_name in fields
+        }
+        """both must emit the same, or the comparison is meaningless"""
+        assert reader.to_representation(rows, related) == \
+            serializer_class(instances, many=True, context=context).data
+
+        drf = measure(
+            lambda: serializer_class(
+                instances, many=True, context=context).data,
+            args.recipes, args.repeat)
+        rows_us = measure(
+            lambda: reader.to_representation(rows, related),
+            args.recipes, args.repeat)
+        results[name] = {
+            'drf_us_per_recipe': drf,
+            'rows_us_per_recipe': rows_us,
+            'speedup': round(drf / rows_us, 1),
+        }
+
+        data = reader.to_representation(rows, related)
+        body = JSONRenderer().render(data)
+        assert FastJSONRenderer().render(data) == body
+        rendering[name] = compare(
+            lambda: JSONRenderer().render(data),
+            lambda: FastJSONRenderer().render(data),
+            args.recipes, args.repeat)
+        parsing[name] = compare(
+            lambda: JSONParser().parse(io.BytesIO(body)),
+            lambda: FastJSONParser().parse(io.BytesIO(body)),
+            args.recipes, args.repeat)
+
+    print(json.dumps({
+        'commit': git_commit(),
+        'python': platform.python_version(),
+        'django': django.get_version(),
+        'recipes': args.recipes,
+        'tags': args.tags,
+        'orjson': orjson.__version__ if orjson is not None else None,
+        'serializers': results,
+        'renderers': rendering,
+        'parsers': parsing,
+    }, indent=2))
@@ -0,0 +1,49 @@
+"""
+Statistics reported by the benchmarks.
+"""
+import resource
+import sys
+
+
+def percentile(values, pct):
+    """Return the pct percentile of sorted values, interpolated."""
+    if not values:
+        return None
+    rank = (len(values) - 1) * pct / 100
+    lower = int(rank)
+    upper = min(lower + 1, len(values) - 1)
+
+    return values[lower] + (values[upper] - values[lower]) * (rank - lower)
+
+
+def summarize(latencies, elapsed, errors=0, queries=None):
+    """Return the report of one scenario, latencies in seconds."""
+    latencies = sorted(latencies)
+    count = len(latencies)
+    summary = {
+        'requests': count,
+        'errors': errors,
+        'throughput_rps': round(count / elapsed, 1) if elapsed else None,
+        'latency_ms': {
+            name: round(value * 1000, 2) if value is not None else None
+            for name, value in [
+                ('p50', percentile(latencies, 50)),
+                ('p95', percentile(latencies, 95)),
+                ('p99', percentile(latencies, 99)),
+                ('mean', sum(latencies) / count if count else None),
+                ('max', latencies[-1] if count else None),
+            ]
+        },
+    }
+    if queries is not None:
+        summary['queries_per_request'] = (
+            round(queries / count, 2) if count else None)
+
+    return summary
+
+
+def peak_rss_kb():
+    """Return the peak resident set size of this process in KiB."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    """ru_maxrss is in bytes on macOS and KiB on Linux"""
+    return peak // 1024 if sys.platform == 'darwin' else peak
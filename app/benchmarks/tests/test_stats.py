@@ -0,0 +1,33 @@
+"""
+Tests for the benchmark statistics.
+"""
+from django.test import SimpleTestCase
+
+from benchmarks.stats import (
+    percentile,
+    summarize,
+)
+
+
+class StatsTests(SimpleTestCase):
+    """Test the benchmark statistics."""
+
+    def test_percentile_interpolates(self):
+        """Test percentiles between two samples are interpolated."""
+        values = [1, 2, 3, 4, 5]
+
+        self.assertEqual(percentile(values, 0), 1)
+        self.assertEqual(percentile(values, 50), 3)
+        self.assertEqual(percentile(values, 90), 4.6)
+        self.assertEqual(percentile(values, 100), 5)
+        self.assertIsNone(percentile([], 50))
+
+    def test_summarize(self):
+        """Test the summary of a scenario."""
+        summary = summarize([0.003, 0.001, 0.002], elapsed=0.5, queries=9)
+
+        self.assertEqual(summary['requests'], 3)
+        self.assertEqual(summary['throughput_rps'], 6.0)
+        self.assertEqual(summary['latency_ms']['p50'], 2.0)
+        self.assertEqual(summary['latency_ms']['max'], 3.0)
+        self.assertEqual(summary['queries_per_request'], 3.0)
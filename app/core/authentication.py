@@ -0,0 +1,154 @@
+"""
+Authentication backends for the APIs.
+"""
+import pickle
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+
+
+"""key of the invalidation counter in the shared cache"""
+GENERATION_KEY = 'auth-token-generation'
+
+
+class TokenCache:
+    """Bounded LRU of token key -> (user, token) with a time to live."""
+
+    """Entries are stored pickled so every request gets its own user
+    object, a view changing request.user cannot leak into other requests.
+    When a CACHES alias is given, entries are kept in that cache only, and
+    so is the generation, a local copy would outlive an invalidation made
+    by another process for up to the TTL."""
+    def __init__(self, max_size, ttl, cache_alias=None):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.cache_alias = cache_alias
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._generation = 0
+
+    def _shared_cache(self):
+        """Return the Django cache backing this one, if any."""
+        return caches[self.cache_alias] if self.cache_alias else None
+
+    def _shared_key(self, key):
+        """Return the key used in the shared Django cache."""
+        return f'auth-token:{key}'
+
+    @property
+    def generation(self):
+        """Counter bumped on every invalidation."""
+        shared = self._shared_cache()
+        if shared is not None:
+            return shared.get_or_set(GENERATION_KEY, 0, None)
+
+        return self._generation
+
+    def get(self, key):
+        """Return the cached (user, token) for key or None."""
+        shared = self._shared_cache()
+        if shared is not None:
+            data = shared.get(self._shared_key(key))
+            return pickle.loads(data) if data is not None else None
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires, data = entry
+                if expires > time.monotonic():
+                    self._entries.move_to_end(key)
+                    return pickle.loads(data)
+                del self._entries[key]
+
+        return None
+
+    def set(self, key, value, generation):
+        """Cache value unless an invalidation ran since generation."""
+        """A lookup that started before a token was deleted or a user
+        changed must not put the stale result back into the cache"""
+        if generation != self.generation:
+            return
+
+        data = pickle.dumps(value)
+        shared = self._shared_cache()
+        if shared is not None:
+            shared.set(self._shared_key(key), data, self.ttl)
+        else:
+            self._store(key, data)
+
+    def _store(self, key, data):
+        """Store pickled data in the local LRU, evicting the oldest."""
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, data)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def delete_many(self, keys):
+        """Remove keys from the cache."""
+        keys = list(keys)
+        with self._lock:
+            self._generation += 1
+            for key in keys:
+                self._entries.pop(key, None)
+
+        shared = self._shared_cache()
+        if shared is not None:
+            try:
+                shared.incr(GENERATION_KEY)
+            except ValueError:
+                shared.set(GENERATION_KEY, 1, None)
+            if keys:
+                shared.delete_many([self._shared_key(key) for key in keys])
+
+    def clear(self):
+        """Remove every entry from the local LRU."""
+        with self._lock:
+            self._generation += 1
+            self._entries.clear()
+
+
+token_cache = TokenCache(
+    max_size=settings.TOKEN_AUTH_CACHE['MAX_SIZE'],
+    ttl=settings.TOKEN_AUTH_CACHE['TTL'],
+    cache_alias=settings.TOKEN_AUTH_CACHE['CACHE'],
+)
+
+
+def invalidate_tokens(keys):
+    """Drop cached lookups for token keys, now and once committed."""
+    """Invalidating again on commit stops a request that read the old
+    rows before the transaction committed from caching them"""
+    keys = list(keys)
+    token_cache.delete_many(keys)
+    transaction.on_commit(lambda: token_cache.delete_many(keys))
+
+
+def invalidate_user_tokens(user_id):
+    """Drop cached lookups for every token of a user."""
+    invalidate_tokens(
+        Token.objects.filter(user_id=user_id).values_list('key', flat=True)
+    )
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """Token authentication caching token -> user lookups."""
+
+    def authenticate_credentials(self, key):
+        """Return (user, token) from the cache or the database."""
+        cached = token_cache.get(key)
+        if cached is not None:
+            return cached
+
+        generation = token_cache.generation
+        user, token = super().authenticate_credentials(key)
+        token_cache.set(key, (user, token), generation)
+
+        return user, token
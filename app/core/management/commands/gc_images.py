@@ -0,0 +1,147 @@
+"""
+Django command to delete the image files no recipe refers to.
+"""
+import os
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from core.models import (
+    ImageBlob,
+    Recipe,
+)
+
+
+class Command(BaseCommand):
+    """Django command to garbage collect the stored images."""
+
+    help = (
+        'Delete image files whose reference count dropped to zero, and '
+        'with --scan-files files under the upload directory without any '
+        'reference count (left by failed uploads or older versions).'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=500,
+            help='Number of files handled per transaction.',
+        )
+        parser.add_argument(
+            '--grace-minutes',
+            type=int,
+            default=60,
+            help='Keep files unreferenced for less than this, so uploads '
+                 'still in flight are not collected.',
+        )
+        parser.add_argument(
+            '--scan-files',
+            action='store_true',
+            help='Also walk the upload directory for files without a row.',
+        )
+        parser.add_argument('--dry-run', action='store_true')
+
+    def handle(self, *args, **options):
+        """Entrypoint for command."""
+        self.storage = Recipe._meta.get_field('image').storage
+        self.dry_run = options['dry_run']
+        cutoff = timezone.now() - timedelta(minutes=options['grace_minutes'])
+
+        deleted, freed = self._collect_blobs(cutoff, options['batch_size'])
+        self.stdout.write(f'{deleted} unreferenced images deleted.')
+        if options['scan_files']:
+            orphans, orphan_bytes = self._collect_orphans(
+                cutoff, options['batch_size'])
+            self.stdout.write(f'{orphans} orphaned files deleted.')
+            deleted += orphans
+            freed += orphan_bytes
+
+        self.stdout.write(self.style.SUCCESS(
+            f'{"Would free" if self.dry_run else "Freed"} {freed} bytes '
+            f'in {deleted} files.'
+        ))
+
+    """Only the rows at zero are read, through the partial index, and
+    every batch is locked with SKIP LOCKED so it does not wait on (or for)
+    uploads taking a reference meanwhile"""
+    def _collect_blobs(self, cutoff, batch_size):
+        """Delete the files of the rows unreferenced since cutoff."""
+        deleted = freed = 0
+        last = None
+        while True:
+            with transaction.atomic():
+                rows = ImageBlob.objects.select_for_update(
+                    skip_locked=True,
+                ).filter(ref_count__lte=0, updated_at__lt=cutoff)
+                if last is not None:
+                    rows = rows.filter(updated_at__gte=last[0]).exclude(
+                        updated_at=last[0], name__lte=last[1])
+                batch = list(rows.order_by('updated_at', 'name').values_list(
+                    'updated_at', 'name')[:batch_size])
+                if not batch:
+                    break
+                last = batch[-1]
+                names = [name for updated_at, name in batch]
+
+                """only the rows still unreferenced lose their file"""
+                names = list(ImageBlob.objects.filter(
+                    name__in=names, ref_count__lte=0,
+                ).values_list('name', flat=True))
+                if not self.dry_run:
+                    ImageBlob.objects.filter(
+                        name__in=names, ref_count__lte=0).delete()
+                freed += self._delete_files(names)
+                deleted += len(names)
+
+        return deleted, freed
+
+    def _collect_orphans(self, cutoff, batch_size):
+        """Delete files older than cutoff that have no row."""
+        deleted = freed = 0
+        for batch in self._walk_uploads(cutoff.timestamp(), batch_size):
+            known = set(ImageBlob.objects.filter(
+                name__in=batch).values_list('name', flat=True))
+            orphans = [name for name in batch if name not in known]
+            freed += self._delete_files(orphans)
+            deleted += len(orphans)
+
+        return deleted, freed
+
+    def _walk_uploads(self, cutoff, batch_size):
+        """Yield batches of storage names of the old uploaded files."""
+        root = self.storage.path('')
+        temp_dir = os.path.abspath(settings.FILE_UPLOAD_TEMP_DIR)
+        batch = []
+        for directory, subdirs, files in os.walk(self.storage.path('uploads')):
+            """in-flight uploads are spooled under MEDIA_ROOT too"""
+            subdirs[:] = [
+                subdir for subdir in subdirs
+                if os.path.join(directory, subdir) != temp_dir
+            ]
+            for filename in files:
+                path = os.path.join(directory, filename)
+                if os.path.getmtime(path) >= cutoff:
+                    continue
+                batch.append(
+                    os.path.relpath(path, root).replace(os.sep, '/'))
+                if len(batch) == batch_size:
+                    yield batch
+                    batch = []
+        if batch:
+            yield batch
+
+    def _delete_files(self, names):
+        """Delete the files, return the bytes freed."""
+        freed = 0
+        for name in names:
+            if not self.storage.exists(name):
+                continue
+            freed += self.storage.size(name)
+            if not self.dry_run:
+                self.storage.delete(name)
+
+        return freed
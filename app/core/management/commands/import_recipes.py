@@ -0,0 +1,203 @@
+"""
+Django command to import recipes from a CSV or NDJSON file.
+"""
+import csv
+import json
+import os
+import time
+from itertools import islice
+
+from django.contrib.auth import get_user_model
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from core.models import (
+    CollectionVersion,
+    Recipe,
+    Tag,
+    Ingredient,
+)
+
+
+RECIPE_FIELDS = ['title', 'description', 'time_minutes', 'price', 'link']
+
+"""separator of the tag/ingredient names inside a CSV column"""
+CSV_NAME_SEPARATOR = '|'
+
+
+class Command(BaseCommand):
+    """Django command to import recipes in bulk."""
+
+    help = (
+        'Import recipes for a user from a CSV file (columns: title, '
+        'description, time_minutes, price, link, tags, ingredients with '
+        f'"{CSV_NAME_SEPARATOR}" between names) or an NDJSON file such as '
+        'the recipe export.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='CSV or NDJSON file to import.')
+        parser.add_argument(
+            '--user',
+            required=True,
+            help='Email of the user owning the imported recipes.',
+        )
+        parser.add_argument(
+            '--format',
+            choices=['csv', 'ndjson'],
+            help='File format, guessed from the extension by default.',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Number of recipes committed per transaction.',
+        )
+        parser.add_argument(
+            '--resume',
+            action='store_true',
+            help='Skip the rows committed by a previous failed run.',
+        )
+
+    def handle(self, *args, **options):
+        """Entrypoint for command."""
+        try:
+            user = get_user_model().objects.get(email=options['user'])
+        except get_user_model().DoesNotExist:
+            raise CommandError(f'No user with email {options["user"]}.')
+
+        path = options['path']
+        file_format = options['format'] or (
+            'csv' if path.lower().endswith('.csv') else 'ndjson')
+        batch_size = options['batch_size']
+        if batch_size < 1:
+            raise CommandError('--batch-size must be at least 1.')
+        checkpoint_path = f'{path}.checkpoint'
+
+        skip = 0
+        if options['resume'] and os.path.exists(checkpoint_path):
+            with open(checkpoint_path) as checkpoint:
+                skip = json.load(checkpoint)['rows']
+            self.stdout.write(f'Resuming after {skip} rows...')
+
+        """names already known for the user, name -> id, filled as the
+        import creates new ones so every name is looked up only once"""
+        names = {
+            'tags': dict(
+                Tag.objects.filter(user=user).values_list('name', 'id')),
+            'ingredients': dict(Ingredient.objects.filter(
+                user=user).values_list('name', 'id')),
+        }
+
+        done = skip
+        started = time.monotonic()
+        with open(path, newline='') as source:
+            rows = islice(self._read_rows(source, file_format), skip, None)
+            while True:
+                batch = list(islice(rows, batch_size))
+                if not batch:
+                    break
+
+                with transaction.atomic():
+                    self._import_batch(user, batch, done, names)
+                    CollectionVersion.objects.bump(user.id)
+                done += len(batch)
+                self._write_checkpoint(checkpoint_path, done)
+
+                rate = (done - skip) / max(time.monotonic() - started, 1e-6)
+                self.stdout.write(
+                    f'{done} rows imported ({rate:.0f} rows/s)')
+
+        if os.path.exists(checkpoint_path):
+            os.remove(checkpoint_path)
+
+        elapsed = time.monotonic() - started
+        rate = (done - skip) / max(elapsed, 1e-6)
+        self.stdout.write(self.style.SUCCESS(
+            f'Imported {done - skip} recipes in {elapsed:.1f}s '
+            f'({rate:.0f} rows/s).'
+        ))
+
+    def _read_rows(self, source, file_format):
+        """Yield the rows of the file as dicts with lists of names."""
+        """a line that is no JSON object is yielded as the error, so it is
+        reported with its row number like the other invalid rows"""
+        if file_format == 'csv':
+            for row in csv.DictReader(source):
+                for field_name in ('tags', 'ingredients'):
+                    row[field_name] = [
+                        name.strip()
+                        for name in (row.get(field_name) or '').split(
+                            CSV_NAME_SEPARATOR)
+                        if name.strip()
+                    ]
+                yield row
+        else:
+            for line in source:
+                if not line.strip():
+                    continue
+                try:
+                    row = json.loads(line)
+                except ValueError as error:
+                    yield error
+                    continue
+                if not isinstance(row, dict):
+                    yield ValueError('not a JSON object')
+                    continue
+                """the export has {"id", "name"} objects, accept both"""
+                for field_name in ('tags', 'ingredients'):
+                    row[field_name] = [
+                        item['name'] if isinstance(item, dict) else item
+                        for item in row.get(field_name) or []
+                    ]
+                yield row
+
+    def _import_batch(self, user, batch, offset, names):
+        """Insert a batch of rows with their tags/ingredients."""
+        recipes = []
+        for number, row in enumerate(batch, start=offset + 1):
+            if isinstance(row, ValueError):
+                raise CommandError(f'Row {number} is invalid: {row}')
+            recipe = Recipe(user=user, **{
+                field: row[field]
+                for field in RECIPE_FIELDS
+                if row.get(field) not in (None, '')
+            })
+            try:
+                recipe.clean_fields(exclude=['user', 'image'])
+            except ValidationError as error:
+                raise CommandError(f'Row {number} is invalid: {error}')
+            recipes.append(recipe)
+
+        recipes = Recipe.objects.bulk_create(recipes)
+
+        for field_name, known in names.items():
+            field = Recipe._meta.get_field(field_name)
+            missing = [
+                name for row in batch for name in row[field_name]
+                if name not in known
+            ]
+            for obj in field.related_model.objects.get_or_create_many(
+                    user, missing):
+                known[obj.name] = obj.id
+
+            through = field.remote_field.through
+            attr_col = f'{field.m2m_reverse_field_name()}_id'
+            through.objects.bulk_create(
+                [
+                    through(**{'recipe_id': recipe.id, attr_col: known[name]})
+                    for recipe, row in zip(recipes, batch)
+                    for name in dict.fromkeys(row[field_name])
+                ],
+                ignore_conflicts=True,
+            )
+
+    def _write_checkpoint(self, checkpoint_path, rows):
+        """Record how many rows are committed, for --resume."""
+        """written after the commit: a crash in between re-imports at
+        most the last batch, it never skips rows"""
+        tmp_path = f'{checkpoint_path}.tmp'
+        with open(tmp_path, 'w') as checkpoint:
+            json.dump({'rows': rows}, checkpoint)
+        os.replace(tmp_path, checkpoint_path)
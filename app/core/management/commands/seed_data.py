@@ -0,0 +1,244 @@
+"""
+Django command to generate a synthetic dataset for load testing.
+"""
+import csv
+import io
+import random
+import time
+from decimal import Decimal
+from itertools import accumulate
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.utils import timezone
+
+from core.models import (
+    Recipe,
+    Tag,
+    Ingredient,
+)
+
+
+ADJECTIVES = [
+    'Spicy', 'Smoky', 'Creamy', 'Crispy', 'Roasted', 'Grilled', 'Sweet',
+    'Tangy', 'Hearty', 'Light', 'Classic', 'Rustic', 'Quick', 'Slow',
+]
+DISHES = [
+    'Curry', 'Soup', 'Salad', 'Stew', 'Pasta', 'Risotto', 'Tacos', 'Pie',
+    'Noodles', 'Bowl', 'Casserole', 'Sandwich', 'Stir Fry', 'Cake',
+]
+
+
+def zipf_cum_weights(n, exponent):
+    """Return cumulative Zipf weights for ranks 1..n."""
+    return list(accumulate(1 / rank ** exponent for rank in range(1, n + 1)))
+
+
+class Command(BaseCommand):
+    """Django command to seed users, recipes, tags and ingredients."""
+
+    help = (
+        'Generate a deterministic synthetic dataset: users with Zipf '
+        'skewed recipe counts, a shared tag vocabulary and Zipf '
+        'distributed ingredient usage.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=100)
+        parser.add_argument(
+            '--recipes',
+            type=int,
+            default=10000,
+            help='Total number of recipes, spread over the users.',
+        )
+        parser.add_argument(
+            '--tags',
+            type=int,
+            default=50,
+            help='Size of the tag vocabulary given to every user.',
+        )
+        parser.add_argument(
+            '--ingredients',
+            type=int,
+            default=500,
+            help='Number of ingredients of every user.',
+        )
+        parser.add_argument(
+            '--skew',
+            type=float,
+            default=1.1,
+            help='Zipf exponent of recipe counts and attribute usage.',
+        )
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=5000,
+            help='Number of recipes inserted per transaction.',
+        )
+        parser.add_argument(
+            '--email-prefix',
+            default='seed',
+            help='Users are named <prefix><n>@example.com.',
+        )
+        parser.add_argument('--password', default='seedpass123')
+
+    def handle(self, *args, **options):
+        """Entrypoint for command."""
+        for option in ('users', 'tags', 'ingredients', 'batch_size'):
+            if options[option] < 1:
+                raise CommandError(f'--{option.replace("_", "-")} must be '
+                                   'at least 1.')
+
+        rng = random.Random(options['seed'])
+        started = time.monotonic()
+
+        users = self._create_users(options)
+        tags = self._create_attrs(Tag, users, 'tag', options['tags'])
+        ingredients = self._create_attrs(
+            Ingredient, users, 'ingredient', options['ingredients'])
+        self.stdout.write(f'Created {len(users)} users with tags and '
+                          f'ingredients in {time.monotonic() - started:.1f}s')
+
+        skew = options['skew']
+        user_weights = zipf_cum_weights(len(users), skew)
+        counts = [
+            int(options['recipes'] * (weight - previous) / user_weights[-1])
+            for previous, weight in zip([0] + user_weights, user_weights)
+        ]
+        """the rounding remainder goes to the biggest user"""
+        counts[0] += options['recipes'] - sum(counts)
+
+        tag_weights = zipf_cum_weights(options['tags'], skew)
+        ingredient_weights = zipf_cum_weights(options['ingredients'], skew)
+
+        batch = []
+        done = 0
+        for user, count in zip(users, counts):
+            for number in range(count):
+                batch.append((
+                    user.id,
+                    f'{rng.choice(ADJECTIVES)} {rng.choice(DISHES)} {number}',
+                    rng.randint(5, 180),
+                    Decimal(rng.randint(100, 5000)) / 100,
+                    rng.choices(
+                        tags[user.id], cum_weights=tag_weights,
+                        k=rng.randint(0, 4)),
+                    rng.choices(
+                        ingredients[user.id], cum_weights=ingredient_weights,
+                        k=rng.randint(2, 10)),
+                ))
+
+                if len(batch) == options['batch_size']:
+                    done += self._insert_batch(batch)
+                    batch = []
+                    self._report(done, started)
+        if batch:
+            done += self._insert_batch(batch)
+            self._report(done, started)
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Seeded {done} recipes in {time.monotonic() - started:.1f}s.'))
+
+    def _create_users(self, options):
+        """Create the users in bulk and return them."""
+        emails = [
+            f'{options["email_prefix"]}{number}@example.com'
+            for number in range(options['users'])
+        ]
+        User = get_user_model()
+        if User.objects.filter(email__in=emails).exists():
+            raise CommandError(
+                'Seed users already exist, use another --email-prefix.')
+
+        """hashing is slow on purpose, so share one hash between users"""
+        password = make_password(options['password'])
+        users = User.objects.bulk_create(
+            [
+                User(email=email, name=email.split('@')[0], password=password)
+                for email in emails
+            ],
+            batch_size=options['batch_size'],
+        )
+
+        return users
+
+    def _create_attrs(self, model, users, prefix, count):
+        """Create count names for every user, return user id -> ids."""
+        objs = model.objects.bulk_create(
+            [
+                model(user=user, name=f'{prefix}-{number}')
+                for user in users
+                for number in range(count)
+            ],
+            batch_size=5000,
+        )
+        ids = {user.id: [] for user in users}
+        for obj in objs:
+            ids[obj.user_id].append(obj.id)
+
+        return ids
+
+    def _insert_batch(self, batch):
+        """Insert recipes and both through tables in one transaction."""
+        """building model objects costs more than the inserts at this
+        size, so take the ids from the sequence and COPY plain rows"""
+        now = timezone.now()
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(
+                'SELECT nextval(pg_get_serial_sequence(%s, %s)) '
+                'FROM generate_series(1, %s)',
+                [Recipe._meta.db_table, 'id', len(batch)],
+            )
+            ids = [row[0] for row in cursor.fetchall()]
+
+            self._copy(
+                cursor, Recipe,
+                ['id', 'user_id', 'title', 'description', 'time_minutes',
+                 'price', 'link', 'updated_at', 'image_variants'],
+                (
+                    (recipe_id, user_id, title, '', time_minutes, price, '',
+                     now, '{}')
+                    for recipe_id, (user_id, title, time_minutes, price, *_)
+                    in zip(ids, batch)
+                ),
+            )
+            """dict.fromkeys drops the ids drawn twice"""
+            self._copy(
+                cursor, Recipe.tags.through, ['recipe_id', 'tag_id'],
+                (
+                    (recipe_id, tag_id)
+                    for recipe_id, row in zip(ids, batch)
+                    for tag_id in dict.fromkeys(row[4])
+                ),
+            )
+            self._copy(
+                cursor, Recipe.ingredients.through,
+                ['recipe_id', 'ingredient_id'],
+                (
+                    (recipe_id, ingredient_id)
+                    for recipe_id, row in zip(ids, batch)
+                    for ingredient_id in dict.fromkeys(row[5])
+                ),
+            )
+
+        return len(batch)
+
+    def _copy(self, cursor, model, columns, rows):
+        """Load rows into the table of model with COPY."""
+        buffer = io.StringIO()
+        """unquoted empty fields are NULL in COPY, so quote the strings"""
+        csv.writer(buffer, quoting=csv.QUOTE_NONNUMERIC).writerows(rows)
+        buffer.seek(0)
+        cursor.copy_expert(
+            f'COPY {model._meta.db_table} ({", ".join(columns)}) '
+            'FROM STDIN WITH (FORMAT csv)',
+            buffer,
+        )
+
+    def _report(self, done, started):
+        """Write the progress and the insert rate."""
+        rate = done / max(time.monotonic() - started, 1e-6)
+        self.stdout.write(f'{done} recipes seeded ({rate:.0f} recipes/s)')
@@ -0,0 +1,56 @@
+# Generated by Django 3.2.25 on 2026-10-17 23:36
+
+from django.db import migrations
+from django.db.models import Count, Min
+
+
+def merge_duplicates(apps, model_name, field_name):
+    """Merge tags/ingredients sharing a name for the same user.
+
+    The row with the lowest id is kept, recipes linked to a duplicate are
+    linked to the kept row instead and the duplicates are deleted.
+    """
+    model = apps.get_model('core', model_name)
+    field = apps.get_model('core', 'Recipe')._meta.get_field(field_name)
+    through = field.remote_field.through
+    attr_col = f'{field.m2m_reverse_field_name()}_id'
+
+    groups = model.objects.values('user_id', 'name').annotate(
+        rows=Count('id'),
+        keep_id=Min('id'),
+    ).filter(rows__gt=1)
+
+    for group in groups.iterator():
+        duplicate_ids = list(model.objects.filter(
+            user_id=group['user_id'],
+            name=group['name'],
+        ).exclude(id=group['keep_id']).values_list('id', flat=True))
+        recipe_ids = through.objects.filter(
+            **{f'{attr_col}__in': duplicate_ids}
+        ).values_list('recipe_id', flat=True).distinct()
+
+        through.objects.bulk_create(
+            [
+                through(**{'recipe_id': recipe_id, attr_col: group['keep_id']})
+                for recipe_id in recipe_ids
+            ],
+            ignore_conflicts=True,
+        )
+        model.objects.filter(id__in=duplicate_ids).delete()
+
+
+def dedupe_names(apps, schema_editor):
+    """Merge duplicate names before the unique constraints are added."""
+    merge_duplicates(apps, 'Tag', 'tags')
+    merge_duplicates(apps, 'Ingredient', 'ingredients')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0005_recipe_image'),
+    ]
+
+    operations = [
+        migrations.RunPython(dedupe_names, migrations.RunPython.noop),
+    ]
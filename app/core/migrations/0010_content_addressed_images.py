@@ -0,0 +1,63 @@
+# Generated by Django 3.2.25 on 2026-10-17 23:58
+
+from collections import Counter
+
+import core.models
+import core.storage
+from django.db import migrations, models
+
+
+def count_existing_files(apps, schema_editor):
+    """Create the reference counts of the images already stored.
+
+    Files without a row are treated as orphans by gc_images, so every
+    image and variant referenced before this migration gets one.
+    """
+    Recipe = apps.get_model('core', 'Recipe')
+    ImageBlob = apps.get_model('core', 'ImageBlob')
+
+    counts = Counter()
+    rows = Recipe.objects.exclude(image__isnull=True).exclude(image='')
+    for image, variants in rows.values_list(
+            'image', 'image_variants').iterator():
+        counts[image] += 1
+        for variant in variants.values():
+            counts.update(
+                value for value in variant.values() if isinstance(value, str))
+
+    ImageBlob.objects.bulk_create(
+        [ImageBlob(name=name, ref_count=count)
+         for name, count in counts.items()],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0009_recipe_image_variants'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ImageBlob',
+            fields=[
+                ('name', models.CharField(max_length=255, primary_key=True, serialize=False)),
+                ('ref_count', models.IntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.AlterField(
+            model_name='recipe',
+            name='image',
+            field=models.ImageField(null=True, storage=core.storage.ContentAddressedStorage(), upload_to=core.models.recipe_image_file_path),
+        ),
+        migrations.AddIndex(
+            model_name='imageblob',
+            index=models.Index(condition=models.Q(('ref_count__lte', 0)), fields=['updated_at'], name='imageblob_unreferenced_idx'),
+        ),
+        migrations.RunPython(
+            count_existing_files,
+            migrations.RunPython.noop,
+        ),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 3.2.25 on 2026-10-18 00:33
+
+import core.models
+import core.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0013_recipe_ordering_indexes'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='recipe',
+            name='image',
+            field=models.ImageField(null=True, storage=core.storage.ContentAddressedStorage(reference_counted=True), upload_to=core.models.recipe_image_file_path),
+        ),
+    ]
@@ -3,15 +3,27 @@ Database models.
 """
 import uuid
 import os
+from collections import Counter
 from django.conf import settings
+from django.utils import timezone
 
-from django.db import models
+from django.db import connections, models
+from django.db.models import F
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVectorField
 from django.contrib.auth.models import (
     AbstractBaseUser,
     BaseUserManager,
     PermissionsMixin,
 )
 
+from core.storage import ContentAddressedStorage
+
+
+"""text search configuration of Recipe.search_vector, the trigger filling
+it is created with the same one in migration 0011"""
+RECIPE_SEARCH_CONFIG = 'english'
+
 
 def recipe_image_file_path(instance, filename):
     """Generate file path for new recipe image."""
@@ -48,6 +60,107 @@ class UserManager(BaseUserManager):
         return user
 
 
+class RecipeAttrManager(models.Manager):
+    """Manager for recipe attributes like tags and ingredients."""
+
+    def get_or_create_many(self, user, names):
+        """Return objects for names, creating the missing ones in bulk."""
+        """dict.fromkeys drops repeated names but keeps the order"""
+        names = list(dict.fromkeys(names))
+        if not names:
+            return []
+
+        found = {
+            obj.name: obj
+            for obj in self.filter(user=user, name__in=names)
+        }
+        missing = [name for name in names if name not in found]
+        if missing:
+            """ignore_conflicts makes this ON CONFLICT DO NOTHING, so a
+            name created concurrently by another request hits the per-user
+            unique constraint and is skipped. Postgres does not return ids
+            for skipped rows, so read the new rows back in one more query"""
+            self.bulk_create(
+                [self.model(user=user, name=name) for name in missing],
+                ignore_conflicts=True,
+            )
+            found.update({
+                obj.name: obj
+                for obj in self.filter(user=user, name__in=missing)
+            })
+
+        return [found[name] for name in names]
+
+
+class CollectionVersionManager(models.Manager):
+    """Manager for per-user collection versions."""
+
+    def current(self, user_id):
+        """Return the collection version of a user."""
+        return self.filter(user_id=user_id).values_list(
+            'version', flat=True).first() or 0
+
+    def bump(self, user_id):
+        """Increment the collection version of a user."""
+        bump = {'version': F('version') + 1}
+        if self.filter(user_id=user_id).update(**bump):
+            return
+
+        """the row is created by the first write of the user, get_or_create
+        copes with two first writes racing to create it"""
+        _, created = self.get_or_create(
+            user_id=user_id,
+            defaults={'version': 1},
+        )
+        if not created:
+            self.filter(user_id=user_id).update(**bump)
+
+
+class ImageBlobManager(models.Manager):
+    """Manager for the reference counts of stored image files."""
+
+    def acquire(self, names):
+        """Count one more reference to each name, repeats included."""
+        counts = Counter(name for name in names if name)
+        if not counts:
+            return
+
+        """one upsert, which waits for a gc_images batch holding the row
+        and then counts on the row it left, or on a new one if it was
+        collected. Sorted so concurrent calls lock rows in one order"""
+        table = connections[self.db].ops.quote_name(self.model._meta.db_table)
+        now = timezone.now()
+        params = []
+        for name in sorted(counts):
+            params += [name, counts[name], now]
+        with connections[self.db].cursor() as cursor:
+            cursor.execute(
+                f'INSERT INTO {table} (name, ref_count, updated_at) '
+                f'VALUES {", ".join(["(%s, %s, %s)"] * len(counts))} '
+                f'ON CONFLICT (name) DO UPDATE SET '
+                f'ref_count = {table}.ref_count + EXCLUDED.ref_count, '
+                f'updated_at = EXCLUDED.updated_at',
+                params,
+            )
+
+    def release(self, names):
+        """Count one less reference to each name, repeats included."""
+        counts = Counter(name for name in names if name)
+        if counts:
+            self._add(counts, -1)
+
+    def _add(self, counts, sign):
+        """One UPDATE per distinct count, usually just one."""
+        by_count = {}
+        for name, count in counts.items():
+            by_count.setdefault(count, []).append(name)
+        for count, names in by_count.items():
+            self.filter(name__in=names).update(
+                ref_count=F('ref_count') + sign * count,
+                updated_at=timezone.now(),
+            )
+
+
 class User(AbstractBaseUser, PermissionsMixin):
     """User in the system."""
     email = models.EmailField(max_length=255, unique=True)
@@ -71,14 +184,97 @@ class Recipe(models.Model):
     time_minutes = models.IntegerField()
     price = models.DecimalField(max_digits=5, decimal_places=2)
     link = models.CharField(max_length=255, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
     tags = models.ManyToManyField('Tag')
     ingredients = models.ManyToManyField('Ingredient')
     """specify the function recipe_image_file_path, no need to call it with ()"""
-    image = models.ImageField(null=True, upload_to=recipe_image_file_path)
+    image = models.ImageField(
+        null=True,
+        upload_to=recipe_image_file_path,
+        storage=ContentAddressedStorage(reference_counted=True),
+    )
+    """resized copies of image, filled in by recipe.images once generated"""
+    image_variants = models.JSONField(default=dict, blank=True)
+    """title (weight A) and description (weight B) as a tsvector, kept up
+    to date by a database trigger so bulk_create and COPY fill it too"""
+    search_vector = SearchVectorField(null=True, editable=False)
+
+    """recipe lists filter by user and sort newest first or by one of the
+    other keys, with the id as tiebreaker"""
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', '-id'], name='recipe_user_id_idx'),
+            models.Index(
+                fields=['user', 'price', 'id'],
+                name='recipe_user_price_idx',
+            ),
+            models.Index(
+                fields=['user', 'time_minutes', 'id'],
+                name='recipe_user_time_idx',
+            ),
+            models.Index(
+                fields=['user', 'title', 'id'],
+                name='recipe_user_title_idx',
+            ),
+            GinIndex(fields=['search_vector'], name='recipe_search_idx'),
+        ]
 
     def __str__(self):
         return self.title
 
+    @staticmethod
+    def file_names(image, image_variants):
+        """Return the stored files of an image and its variants."""
+        if not image:
+            return []
+
+        return [str(image)] + [
+            value
+            for variant in image_variants.values()
+            for value in variant.values()
+            if isinstance(value, str)
+        ]
+
+
+"""Kept out of the User table so saving a (possibly cached) user object
+can never write back an old version"""
+class CollectionVersion(models.Model):
+    """Version of a user's recipes, tags and ingredients."""
+    """bumped by every write to them, it drives the list ETags"""
+    user = models.OneToOneField(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        primary_key=True,
+    )
+    version = models.PositiveBigIntegerField(default=0)
+
+    objects = CollectionVersionManager()
+
+
+"""Files of ContentAddressedStorage can be shared by several recipes, a
+file is only deleted (by the gc_images command) once no row refers to it
+for a while"""
+class ImageBlob(models.Model):
+    """Reference count of a stored image file."""
+    name = models.CharField(max_length=255, primary_key=True)
+    ref_count = models.IntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    objects = ImageBlobManager()
+
+    """the garbage collection only reads the unreferenced rows"""
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=['updated_at'],
+                name='imageblob_unreferenced_idx',
+                condition=models.Q(ref_count__lte=0),
+            ),
+        ]
+
+    def __str__(self):
+        return self.name
+
 
 """Creating Tag for recipe"""
 class Tag(models.Model):
@@ -89,6 +285,26 @@ class Tag(models.Model):
         on_delete=models.CASCADE,
     )
 
+    objects = RecipeAttrManager()
+
+    """names are unique per user, the index behind the constraint also
+    serves the (user_id, name) lookups and the sort by name. The trigram
+    index (btree_gin for user_id) serves the type-ahead search"""
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'name'],
+                name='tag_user_name_unique',
+            ),
+        ]
+        indexes = [
+            GinIndex(
+                fields=['user', 'name'],
+                opclasses=['int8_ops', 'gin_trgm_ops'],
+                name='tag_user_name_trgm_idx',
+            ),
+        ]
+
     def __str__(self):
         return self.name
 
@@ -101,5 +317,22 @@ class Ingredient(models.Model):
         on_delete=models.CASCADE,
     )
 
+    objects = RecipeAttrManager()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'name'],
+                name='ingredient_user_name_unique',
+            ),
+        ]
+        indexes = [
+            GinIndex(
+                fields=['user', 'name'],
+                opclasses=['int8_ops', 'gin_trgm_ops'],
+                name='ingredient_user_name_trgm_idx',
+            ),
+        ]
+
     def __str__(self):
-        return self.name
\ No newline at end of file
+        return self.name
@@ -0,0 +1,57 @@
+"""
+JSON rendering with orjson, when it is installed.
+"""
+import json
+
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+"""orjson has no Decimal support and writes datetimes its own way, so
+those, and anything else it does not know, go through DRF's encoder and
+come out as before: Decimals as floats, UTC datetimes ending in Z"""
+_encoder = JSONEncoder()
+OPTIONS = (
+    orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME
+    if orjson is not None else None
+)
+
+
+def dumps(data):
+    """Return data as compact UTF-8 JSON, like DRF's JSONRenderer."""
+    """\\u2028 and \\u2029 are escaped so the JSON stays a JavaScript
+    subset and a line of NDJSON"""
+    if orjson is None:
+        ret = json.dumps(
+            data,
+            cls=JSONEncoder,
+            ensure_ascii=False,
+            separators=(',', ':'),
+        ).encode()
+    else:
+        ret = orjson.dumps(data, default=_encoder.default, option=OPTIONS)
+
+    return ret.replace(
+        b'\xe2\x80\xa8', b'\\u2028').replace(b'\xe2\x80\xa9', b'\\u2029')
+
+
+class FastJSONRenderer(JSONRenderer):
+    """JSONRenderer encoding with orjson, stdlib json without it."""
+
+    """indented output (the browsable API, indent= in Accept) and the
+    non-default UNICODE_JSON, COMPACT_JSON and STRICT_JSON settings are
+    left to DRF"""
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        if orjson is None or self.ensure_ascii or not self.compact or \
+                not self.strict or \
+                self.get_indent(accepted_media_type, renderer_context or {}):
+            return super().render(data, accepted_media_type, renderer_context)
+
+        return dumps(data)
@@ -0,0 +1,47 @@
+"""
+Signal handlers for the core app.
+"""
+from django.conf import settings
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from rest_framework.authtoken.models import Token
+
+from core.authentication import (
+    invalidate_tokens,
+    invalidate_user_tokens,
+)
+from core.models import (
+    ImageBlob,
+    Recipe,
+)
+
+
+@receiver(post_delete, sender=Token)
+def token_deleted(sender, instance, **kwargs):
+    """Stop accepting a deleted token straight away."""
+    invalidate_tokens([instance.key])
+
+
+"""covers deactivation and password/profile changes, including the ones
+made through UserSerializer.update, so the next request reloads the user"""
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+def user_saved(sender, instance, created, **kwargs):
+    """Reload a changed user on their next request."""
+    if not created:
+        invalidate_user_tokens(instance.pk)
+
+
+"""the recipes go with the user through the cascade, which does not pass
+through the views releasing their images"""
+@receiver(pre_delete, sender=settings.AUTH_USER_MODEL)
+def user_deleted(sender, instance, **kwargs):
+    """Release the images of a deleted user's recipes."""
+    ImageBlob.objects.release(
+        name
+        for image, variants in Recipe.objects.filter(
+            user=instance,
+            image__gt='',
+        ).values_list('image', 'image_variants')
+        for name in Recipe.file_names(image, variants)
+    )
@@ -0,0 +1,77 @@
+"""
+Content-addressed file storage.
+"""
+import hashlib
+import os
+import tempfile
+
+from django.apps import apps
+from django.core.files import File
+from django.core.files.move import file_move_safe
+from django.core.files.storage import FileSystemStorage
+from django.utils.deconstruct import deconstructible
+
+
+"""Only the directory and the extension of the name given by upload_to are
+kept, so the same bytes uploaded again return the existing file instead of
+a copy. Files can be shared between rows, which is why they are reference
+counted with core.models.ImageBlob and removed by the gc_images command
+rather than deleted directly"""
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    """File system storage naming files after the sha256 of their bytes."""
+
+    def __init__(self, *args, reference_counted=False, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.reference_counted = reference_counted
+
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        if not hasattr(content, 'chunks'):
+            content = File(content, name)
+
+        digest = hashlib.sha256()
+        for chunk in content.chunks():
+            digest.update(chunk)
+        digest = digest.hexdigest()
+        content.seek(0)
+
+        directory, filename = os.path.split(name)
+        ext = os.path.splitext(filename)[1].lower()
+        name = os.path.join(directory, digest[:2], f'{digest}{ext}')
+        if self.reference_counted:
+            """the file is counted before exists() is trusted: gc_images
+            deletes a row and its file under a row lock, which the count
+            waits for, and never collects a row counted since"""
+            apps.get_model('core', 'ImageBlob').objects.acquire([name])
+        if self.exists(name):
+            return name
+
+        return self._save(name, content)
+
+    def _save(self, name, content):
+        """Write the file, replacing one saved concurrently."""
+        """a concurrent save of the same name has the same bytes, so
+        replacing it is harmless"""
+        full_path = self.path(name)
+        directory = os.path.dirname(full_path)
+        os.makedirs(directory, exist_ok=True)
+
+        if hasattr(content, 'temporary_file_path'):
+            """uploads spooled on the same volume are just renamed"""
+            file_move_safe(
+                content.temporary_file_path(), full_path,
+                allow_overwrite=True,
+            )
+        else:
+            with tempfile.NamedTemporaryFile(
+                    dir=directory, delete=False) as tmp:
+                for chunk in content.chunks():
+                    tmp.write(chunk)
+            os.replace(tmp.name, full_path)
+
+        if self.file_permissions_mode is not None:
+            os.chmod(full_path, self.file_permissions_mode)
+
+        return name.replace('\\', '/')
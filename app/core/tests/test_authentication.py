@@ -0,0 +1,132 @@
+"""
+Tests for the cached token authentication.
+"""
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from core.authentication import (
+    TokenCache,
+    token_cache,
+)
+
+
+ME_URL = reverse('user:me')
+
+
+class TokenCacheTests(TestCase):
+    """Test the token LRU cache."""
+
+    def test_evicts_least_recently_used(self):
+        """Test the oldest unused entry is evicted when full."""
+        cache = TokenCache(max_size=2, ttl=60)
+        cache.set('a', 'user-a', cache.generation)
+        cache.set('b', 'user-b', cache.generation)
+        cache.get('a')
+        cache.set('c', 'user-c', cache.generation)
+
+        self.assertEqual(cache.get('a'), 'user-a')
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(cache.get('c'), 'user-c')
+
+    @patch('core.authentication.time.monotonic')
+    def test_entries_expire(self, patched_monotonic):
+        """Test entries are dropped after the TTL."""
+        patched_monotonic.return_value = 100
+        cache = TokenCache(max_size=2, ttl=60)
+        cache.set('a', 'user-a', cache.generation)
+
+        patched_monotonic.return_value = 161
+
+        self.assertIsNone(cache.get('a'))
+
+    def test_stale_lookup_not_cached(self):
+        """Test a lookup started before an invalidation is not cached."""
+        cache = TokenCache(max_size=2, ttl=60)
+        generation = cache.generation
+        cache.delete_many(['a'])
+        cache.set('a', 'user-a', generation)
+
+        self.assertIsNone(cache.get('a'))
+
+    @override_settings(CACHES={'tokens': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'token-cache-tests',
+    }})
+    def test_shared_invalidation(self):
+        """Test an invalidation in one process applies to the others."""
+        worker_a = TokenCache(max_size=2, ttl=60, cache_alias='tokens')
+        worker_b = TokenCache(max_size=2, ttl=60, cache_alias='tokens')
+        worker_a.set('a', 'user-a', worker_a.generation)
+        generation = worker_a.generation
+        self.assertEqual(worker_b.get('a'), 'user-a')
+
+        worker_b.delete_many(['a'])
+        worker_a.set('a', 'user-a', generation)
+
+        self.assertIsNone(worker_a.get('a'))
+        self.assertIsNone(worker_b.get('a'))
+
+
+class CachedTokenAuthenticationTests(TestCase):
+    """Test authenticating API requests with cached tokens."""
+
+    def setUp(self):
+        token_cache.clear()
+        self.user = get_user_model().objects.create_user(
+            email='user@example.com',
+            password='testpass123',
+            name='Test Name',
+        )
+        self.token = Token.objects.create(user=self.user)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+
+    def test_token_lookup_cached(self):
+        """Test only the first request looks the token up."""
+        res = self.client.get(ME_URL)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+        with self.assertNumQueries(0):
+            res = self.client.get(ME_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['email'], self.user.email)
+
+    def test_deleted_token_rejected(self):
+        """Test a deleted token stops working immediately."""
+        self.client.get(ME_URL)
+
+        self.token.delete()
+        res = self.client.get(ME_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_deactivated_user_rejected(self):
+        """Test a deactivated user is rejected immediately."""
+        self.client.get(ME_URL)
+
+        self.user.is_active = False
+        self.user.save()
+        res = self.client.get(ME_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_user_update_reloads_user(self):
+        """Test changes through the user API are seen on the next request."""
+        self.client.get(ME_URL)
+
+        payload = {'name': 'Updated name', 'password': 'newpassword123'}
+        res = self.client.patch(ME_URL, payload)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+        with self.assertNumQueries(1):
+            res = self.client.get(ME_URL)
+
+        self.assertEqual(res.data['name'], payload['name'])
@@ -1,13 +1,32 @@
 """
 Test custom Django management commands.
 """
+from datetime import timedelta
+from decimal import Decimal
+from io import StringIO
+import json
+import os
+import tempfile
+import time
 from unittest.mock import patch
 
 from psycopg2 import OperationalError as Psycopg2OpError
 
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.files.base import ContentFile
 from django.core.management import call_command
+from django.core.management.base import CommandError
 from django.db.utils import OperationalError
-from django.test import SimpleTestCase
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+
+from core.models import (
+    CollectionVersion,
+    ImageBlob,
+    Recipe,
+    Tag,
+)
 
 
 @patch('core.management.commands.wait_for_db.Command.check')
@@ -31,4 +50,296 @@ class CommandTests(SimpleTestCase):
         call_command('wait_for_db')
 
         self.assertEqual(patched_check.call_count, 6)
-        patched_check.assert_called_with(databases=['default'])
\ No newline at end of file
+        patched_check.assert_called_with(databases=['default'])
+
+
+class ImportRecipesCommandTests(TestCase):
+    """Test the import_recipes command."""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            'user@example.com',
+            'testpass123',
+        )
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp_dir.cleanup)
+
+    def _write(self, name, content):
+        """Write content to a file of the temporary directory."""
+        path = os.path.join(self.tmp_dir.name, name)
+        with open(path, 'w') as f:
+            f.write(content)
+
+        return path
+
+    def _import(self, path, *args):
+        """Run the command for the user and return its output."""
+        out = StringIO()
+        call_command(
+            'import_recipes', path, '--user', self.user.email, *args,
+            stdout=out,
+        )
+
+        return out.getvalue()
+
+    def test_import_csv(self):
+        """Test importing recipes with shared tags and ingredients."""
+        Tag.objects.create(user=self.user, name='Dinner')
+        path = self._write('recipes.csv', (
+            'title,time_minutes,price,tags,ingredients\n'
+            'Curry,30,5.50,Dinner|Thai,Rice|Chili\n'
+            'Soup,10,2.00,Dinner,Salt|Salt\n'
+            'Toast,5,1.00,,\n'
+        ))
+
+        out = self._import(path, '--batch-size', '2')
+
+        recipes = Recipe.objects.filter(user=self.user).order_by('id')
+        self.assertEqual(
+            [recipe.title for recipe in recipes], ['Curry', 'Soup', 'Toast'])
+        self.assertEqual(recipes[0].price, Decimal('5.50'))
+        self.assertCountEqual(
+            recipes[0].tags.values_list('name', flat=True), ['Dinner', 'Thai'])
+        self.assertCountEqual(
+            recipes[1].ingredients.values_list('name', flat=True), ['Salt'])
+        self.assertEqual(Tag.objects.filter(user=self.user).count(), 2)
+        self.assertIn('rows/s', out)
+        self.assertEqual(CollectionVersion.objects.current(self.user.id), 2)
+
+    def test_import_ndjson_export(self):
+        """Test the NDJSON export format can be imported."""
+        rows = [
+            {
+                'id': 7,
+                'title': 'Curry',
+                'time_minutes': 30,
+                'price': '5.50',
+                'link': '',
+                'description': 'Hot',
+                'tags': [{'id': 3, 'name': 'Thai'}],
+                'ingredients': [{'id': 4, 'name': 'Rice'}],
+            },
+        ]
+        path = self._write(
+            'recipes.ndjson', ''.join(json.dumps(row) + '\n' for row in rows))
+
+        self._import(path)
+
+        recipe = Recipe.objects.get(user=self.user)
+        self.assertEqual(recipe.description, 'Hot')
+        self.assertEqual(recipe.tags.get().name, 'Thai')
+        self.assertEqual(recipe.ingredients.get().name, 'Rice')
+
+    def test_import_invalid_row_resumable(self):
+        """Test an invalid row keeps committed batches and can resume."""
+        path = self._write('recipes.csv', (
+            'title,time_minutes,price\n'
+            'One,1,1.00\n'
+            'Two,2,2.00\n'
+            'Three,x,3.00\n'
+        ))
+
+        with self.assertRaisesMessage(CommandError, 'Row 3'):
+            self._import(path, '--batch-size', '2')
+        self.assertEqual(Recipe.objects.filter(user=self.user).count(), 2)
+
+        self._write('recipes.csv', (
+            'title,time_minutes,price\n'
+            'One,1,1.00\n'
+            'Two,2,2.00\n'
+            'Three,3,3.00\n'
+        ))
+        out = self._import(path, '--batch-size', '2', '--resume')
+
+        self.assertIn('Resuming after 2 rows', out)
+        self.assertEqual(
+            list(Recipe.objects.filter(user=self.user).order_by('id')
+                 .values_list('title', flat=True)),
+            ['One', 'Two', 'Three'],
+        )
+        self.assertFalse(os.path.exists(f'{path}.checkpoint'))
+
+    def test_import_malformed_json(self):
+        """Test a line that is no JSON object is reported by row."""
+        for line in ('{"title": ', '[1, 2]'):
+            path = self._write(
+                'recipes.ndjson',
+                '{"title": "One", "time_minutes": 1, "price": "1.00"}\n'
+                f'{line}\n',
+            )
+
+            with self.assertRaisesMessage(CommandError, 'Row 2 is invalid'):
+                self._import(path, '--batch-size', '1')
+        self.assertEqual(Recipe.objects.filter(user=self.user).count(), 2)
+
+    def test_import_batch_size_positive(self):
+        """Test a batch size below 1 is rejected."""
+        path = self._write('recipes.csv', 'title,time_minutes,price\n')
+
+        with self.assertRaisesMessage(CommandError, '--batch-size'):
+            self._import(path, '--batch-size', '0')
+
+    def test_import_unknown_user(self):
+        """Test importing for an unknown user fails."""
+        path = self._write('recipes.csv', 'title,time_minutes,price\n')
+
+        with self.assertRaises(CommandError):
+            call_command('import_recipes', path, '--user', 'no@example.com')
+
+
+class SeedDataCommandTests(TestCase):
+    """Test the seed_data command."""
+
+    def _seed(self, prefix, seed=0):
+        """Seed a small dataset and return its recipes."""
+        call_command(
+            'seed_data', '--users', '3', '--recipes', '40', '--tags', '5',
+            '--ingredients', '20', '--batch-size', '15', '--seed', str(seed),
+            '--email-prefix', prefix, stdout=StringIO(),
+        )
+
+        return Recipe.objects.filter(
+            user__email__startswith=prefix).order_by('id')
+
+    def _summary(self, recipes):
+        """Return comparable data of recipes across users."""
+        return [
+            (
+                recipe.user.email.split('-')[1],
+                recipe.title,
+                recipe.price,
+                sorted(tag.name for tag in recipe.tags.all()),
+                sorted(ing.name for ing in recipe.ingredients.all()),
+            )
+            for recipe in recipes.select_related('user').prefetch_related(
+                'tags', 'ingredients')
+        ]
+
+    def test_seed_data(self):
+        """Test users get skewed recipe counts and attributes."""
+        recipes = self._seed('a-')
+
+        self.assertEqual(recipes.count(), 40)
+        counts = [
+            Recipe.objects.filter(user__email=f'a-{number}@example.com')
+            .count()
+            for number in range(3)
+        ]
+        self.assertEqual(counts, sorted(counts, reverse=True))
+        self.assertGreater(counts[0], counts[2])
+        self.assertEqual(
+            Tag.objects.filter(user__email__startswith='a-').count(), 15)
+        for recipe in recipes:
+            self.assertGreaterEqual(recipe.ingredients.count(), 1)
+
+    def test_seed_data_deterministic(self):
+        """Test the same seed generates the same dataset."""
+        first = self._summary(self._seed('a-'))
+        second = self._summary(self._seed('b-'))
+        other = self._summary(self._seed('c-', seed=1))
+
+        self.assertEqual(first, second)
+        self.assertNotEqual(first, other)
+
+    def test_seed_data_existing_users(self):
+        """Test seeding twice with the same prefix fails."""
+        self._seed('a-')
+
+        with self.assertRaises(CommandError):
+            self._seed('a-')
+
+
+class GcImagesCommandTests(TestCase):
+    """Test the gc_images command."""
+
+    def setUp(self):
+        media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(media_root.cleanup)
+        settings_override = override_settings(
+            MEDIA_ROOT=media_root.name,
+            FILE_UPLOAD_TEMP_DIR=os.path.join(media_root.name, 'tmp'),
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.storage = Recipe._meta.get_field('image').storage
+
+    def _save(self, content, ref_count=None, age_minutes=120):
+        """Store a file, optionally with a row, aged by age_minutes."""
+        name = self.storage.save('uploads/recipe/a.jpg', ContentFile(content))
+        old = time.time() - age_minutes * 60
+        os.utime(self.storage.path(name), (old, old))
+        """the storage counted it when saving"""
+        if ref_count is None:
+            ImageBlob.objects.filter(name=name).delete()
+        else:
+            ImageBlob.objects.filter(name=name).update(
+                ref_count=ref_count,
+                updated_at=timezone.now() - timedelta(minutes=age_minutes),
+            )
+
+        return name
+
+    def _gc(self, *args):
+        call_command('gc_images', '--batch-size', '2', *args,
+                     stdout=StringIO())
+
+    def test_gc_unreferenced_blobs(self):
+        """Test only files unreferenced for longer than the grace go."""
+        unreferenced = [self._save(f'old {i}'.encode(), 0) for i in range(3)]
+        referenced = self._save(b'used', 1)
+        recent = self._save(b'recent', 0, age_minutes=1)
+
+        self._gc()
+
+        for name in unreferenced:
+            self.assertFalse(self.storage.exists(name))
+        self.assertFalse(
+            ImageBlob.objects.filter(name__in=unreferenced).exists())
+        self.assertTrue(self.storage.exists(referenced))
+        self.assertTrue(self.storage.exists(recent))
+
+    def test_gc_keeps_files_saved_again(self):
+        """Test saving the bytes of an unreferenced file counts it."""
+        name = self._save(b'old', 0)
+
+        self.storage.save('uploads/recipe/b.jpg', ContentFile(b'old'))
+        self._gc()
+
+        self.assertTrue(self.storage.exists(name))
+        self.assertEqual(ImageBlob.objects.get(name=name).ref_count, 1)
+
+    def test_save_after_gc_rewrites_file(self):
+        """Test the bytes of a collected file are written again."""
+        name = self._save(b'old', 0)
+        self._gc()
+
+        saved = self.storage.save('uploads/recipe/b.jpg', ContentFile(b'old'))
+
+        self.assertEqual(saved, name)
+        self.assertTrue(self.storage.exists(name))
+        self.assertEqual(ImageBlob.objects.get(name=name).ref_count, 1)
+
+    def test_gc_dry_run(self):
+        """Test a dry run deletes nothing."""
+        name = self._save(b'old', 0)
+
+        self._gc('--dry-run', '--scan-files')
+
+        self.assertTrue(self.storage.exists(name))
+        self.assertTrue(ImageBlob.objects.filter(name=name).exists())
+
+    def test_gc_scan_files(self):
+        """Test files without a row are deleted when scanning."""
+        orphan = self._save(b'orphan')
+        recent_orphan = self._save(b'recent', age_minutes=1)
+        referenced = self._save(b'used', 1)
+        os.makedirs(settings.FILE_UPLOAD_TEMP_DIR)
+
+        self._gc()
+        self.assertTrue(self.storage.exists(orphan))
+
+        self._gc('--scan-files')
+
+        self.assertFalse(self.storage.exists(orphan))
+        self.assertTrue(self.storage.exists(recent_orphan))
+        self.assertTrue(self.storage.exists(referenced))
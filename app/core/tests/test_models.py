@@ -3,6 +3,7 @@ Tests for models.
 """
 from unittest.mock import patch
 from decimal import Decimal
+from django.db import IntegrityError
 from django.test import TestCase
 from django.contrib.auth import get_user_model
 
@@ -95,6 +96,50 @@ class ModelTests(TestCase):
         self.assertEqual(str(ingredient), ingredient.name)
 
 
+    def test_tag_name_unique_per_user(self):
+        """Test a user cannot have two tags with the same name."""
+        user = create_user()
+        other_user = create_user(email='other@example.com')
+        models.Tag.objects.create(user=user, name='Vegan')
+        models.Tag.objects.create(user=other_user, name='Vegan')
+
+        with self.assertRaises(IntegrityError):
+            models.Tag.objects.create(user=user, name='Vegan')
+
+    def test_get_or_create_many_tags(self):
+        """Test resolving tag names reuses existing tags."""
+        user = create_user()
+        existing = models.Tag.objects.create(user=user, name='Vegan')
+
+        tags = models.Tag.objects.get_or_create_many(
+            user,
+            ['Vegan', 'Dinner', 'Vegan'],
+        )
+
+        self.assertEqual([tag.name for tag in tags], ['Vegan', 'Dinner'])
+        self.assertEqual(tags[0].id, existing.id)
+        self.assertEqual(models.Tag.objects.filter(user=user).count(), 2)
+
+    def test_image_blob_acquire_release(self):
+        """Test counting references to stored images."""
+        models.ImageBlob.objects.acquire(['a.jpg', 'a.jpg', 'b.jpg', ''])
+        models.ImageBlob.objects.acquire(['b.jpg'])
+        models.ImageBlob.objects.release(['a.jpg', 'b.jpg', 'b.jpg'])
+
+        self.assertEqual(
+            dict(models.ImageBlob.objects.values_list('name', 'ref_count')),
+            {'a.jpg': 1, 'b.jpg': 0},
+        )
+
+    def test_recipe_file_names(self):
+        """Test listing the files of an image and its variants."""
+        variants = {'card': {'jpeg': 'c.jpg', 'width': 10, 'height': 10}}
+
+        self.assertEqual(
+            models.Recipe.file_names('a.jpg', variants), ['a.jpg', 'c.jpg'])
+        self.assertEqual(models.Recipe.file_names(None, {}), [])
+
+
     @patch('core.models.uuid.uuid4')
     def test_recipe_file_name_uuid(self, mock_uuid):
         """Test generating image path."""
@@ -0,0 +1,107 @@
+"""
+Tests for the JSON renderer and parser.
+"""
+import datetime
+import io
+import uuid
+from decimal import Decimal
+from unittest import skipIf
+from unittest.mock import patch
+
+from django.test import SimpleTestCase
+from django.utils import timezone
+
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+
+from core.parsers import FastJSONParser
+from core.renderers import FastJSONRenderer, dumps, orjson
+
+
+DATA = {
+    'price': Decimal('5.25'),
+    'created': datetime.datetime(
+        2021, 6, 1, 12, 30, 15, 123456, tzinfo=timezone.utc),
+    'day': datetime.date(2021, 6, 1),
+    'at': datetime.time(12, 30),
+    'naive': datetime.datetime(2021, 6, 1, 12, 30),
+    'uuid': uuid.UUID('12345678123456781234567812345678'),
+    'title': 'Crème brûlée\u2028\u2029',
+    'counts': {1: 'one'},
+    'tags': ({'id': 1, 'name': 'Vegan'},),
+}
+
+
+class FastJSONRendererTests(SimpleTestCase):
+    """Test rendering JSON."""
+
+    def test_same_as_drf(self):
+        """Test the output is byte for byte DRF's JSONRenderer one."""
+        self.assertEqual(
+            FastJSONRenderer().render(DATA), JSONRenderer().render(DATA))
+
+    def test_without_orjson(self):
+        """Test stdlib json is used when orjson is not installed."""
+        with patch('core.renderers.orjson', None):
+            self.assertEqual(
+                FastJSONRenderer().render(DATA), JSONRenderer().render(DATA))
+            self.assertEqual(dumps(DATA), JSONRenderer().render(DATA))
+
+    def test_indent(self):
+        """Test indented output is still rendered."""
+        rendered = FastJSONRenderer().render(
+            {'a': 1}, 'application/json; indent=2')
+
+        self.assertEqual(rendered, b'{\n  "a": 1\n}')
+
+    def test_none(self):
+        """Test no data renders an empty body."""
+        self.assertEqual(FastJSONRenderer().render(None), b'')
+
+    @skipIf(orjson is None, 'orjson is not installed')
+    def test_uses_orjson(self):
+        """Test orjson encodes when it is installed."""
+        with patch('core.renderers.orjson.dumps') as orjson_dumps:
+            orjson_dumps.return_value = b'{}'
+            FastJSONRenderer().render({'a': 1})
+
+        orjson_dumps.assert_called_once()
+
+
+class FastJSONParserTests(SimpleTestCase):
+    """Test parsing JSON."""
+
+    def parse(self, body, parser_context=None):
+        return FastJSONParser().parse(
+            io.BytesIO(body), 'application/json', parser_context)
+
+    def test_same_as_drf(self):
+        """Test the result is DRF's JSONParser one."""
+        body = '{"title": "Crème", "price": 5.25, "tags": [1, 2]}'.encode()
+
+        self.assertEqual(
+            self.parse(body),
+            JSONParser().parse(io.BytesIO(body), 'application/json'),
+        )
+
+    def test_invalid(self):
+        """Test malformed JSON, NaN and bad UTF-8 are rejected."""
+        for body in (b'{"title": ', b'{"price": NaN}', b'"\xff"'):
+            with self.assertRaises(ParseError):
+                self.parse(body)
+
+    def test_other_charset(self):
+        """Test bodies in other charsets are still decoded."""
+        body = '{"title": "Crème"}'.encode('latin-1')
+
+        data = self.parse(body, {'encoding': 'latin-1'})
+
+        self.assertEqual(data, {'title': 'Crème'})
+
+    def test_without_orjson(self):
+        """Test stdlib json is used when orjson is not installed."""
+        with patch('core.parsers.orjson', None):
+            self.assertEqual(self.parse(b'{"a": [1]}'), {'a': [1]})
+            with self.assertRaises(ParseError):
+                self.parse(b'{"a": ')
@@ -0,0 +1,49 @@
+"""
+Tests for the content-addressed storage.
+"""
+import hashlib
+import os
+import tempfile
+
+from django.core.files.base import ContentFile
+from django.core.files.uploadedfile import TemporaryUploadedFile
+from django.test import SimpleTestCase
+
+from core.storage import ContentAddressedStorage
+
+
+class ContentAddressedStorageTests(SimpleTestCase):
+    """Test naming stored files after their content."""
+
+    def setUp(self):
+        location = tempfile.TemporaryDirectory()
+        self.addCleanup(location.cleanup)
+        self.storage = ContentAddressedStorage(location=location.name)
+
+    def test_same_content_same_file(self):
+        """Test identical bytes are stored once under their hash."""
+        digest = hashlib.sha256(b'image').hexdigest()
+
+        first = self.storage.save('uploads/a.JPG', ContentFile(b'image'))
+        second = self.storage.save('uploads/b.jpg', ContentFile(b'image'))
+        other = self.storage.save('uploads/c.jpg', ContentFile(b'other'))
+
+        self.assertEqual(first, f'uploads/{digest[:2]}/{digest}.jpg')
+        self.assertEqual(second, first)
+        self.assertNotEqual(other, first)
+        with self.storage.open(first) as f:
+            self.assertEqual(f.read(), b'image')
+
+    def test_temporary_upload_moved(self):
+        """Test a file spooled to disk is moved rather than copied."""
+        upload = TemporaryUploadedFile('a.jpg', 'image/jpeg', 5, None)
+        upload.write(b'image')
+        upload.seek(0)
+        spooled = upload.temporary_file_path()
+
+        name = self.storage.save('uploads/a.jpg', upload)
+        upload.close()
+
+        self.assertFalse(os.path.exists(spooled))
+        with self.storage.open(name) as f:
+            self.assertEqual(f.read(), b'image')
@@ -0,0 +1,71 @@
+"""
+Type-ahead search of tag and ingredient names.
+"""
+import re
+import threading
+from collections import OrderedDict
+
+from django.conf import settings
+from django.contrib.postgres.search import TrigramSimilarity
+from django.db.models import BooleanField, Count, ExpressionWrapper, Q
+
+
+class AutocompleteCache:
+    """Bounded LRU of the matches of recently typed prefixes."""
+
+    """Keys carry the user's CollectionVersion, so any write to the user's
+    tags, ingredients or recipes makes the old entries unreachable and the
+    LRU drops them, nothing has to be invalidated"""
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """Return the cached matches of key or None."""
+        with self._lock:
+            value = self._entries.get(key)
+            if value is not None:
+                self._entries.move_to_end(key)
+
+            return value
+
+    def set(self, key, value):
+        """Cache value, evicting the least recently used entry."""
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def autocomplete_cache():
+    """Return the cache of this process, created on first use."""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = AutocompleteCache(
+                settings.RECIPE_ATTR_AUTOCOMPLETE['CACHE_SIZE'])
+
+    return _cache
+
+
+"""Both conditions are answered by the (user_id, name gin_trgm_ops)
+index: an anchored case-insensitive regex for names starting with q and
+the % operator for names similar to it (pg_trgm.similarity_threshold)"""
+def matches(queryset, q, limit):
+    """Return the top names of queryset matching q."""
+    """names starting with q come first, then the more similar and the
+    more used by recipes"""
+    prefix = Q(name__iregex=f'^{re.escape(q)}')
+    return queryset.filter(
+        prefix | Q(name__trigram_similar=q),
+    ).annotate(
+        is_prefix=ExpressionWrapper(prefix, output_field=BooleanField()),
+        similarity=TrigramSimilarity('name', q),
+        usage=Count('recipe'),
+    ).order_by('-is_prefix', '-similarity', '-usage', 'name')[:limit]
@@ -0,0 +1,134 @@
+"""
+Disk cache of the resized recipe images.
+"""
+import fcntl
+import os
+import tempfile
+import threading
+
+from django.conf import settings
+
+
+"""Reads touch the file's mtime, which gives the LRU order. The entries are
+shared by every worker process using the directory, and flock on a lock
+file per key makes concurrent misses for one key produce it only once"""
+class DiskLRUCache:
+    """Files on disk, least recently used evicted first past max_bytes."""
+
+    def __init__(self, directory, max_bytes):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        """estimate of the bytes stored, so not every write walks the
+        directory; None until the first write measures it"""
+        self._size = None
+
+    def path(self, key):
+        """Return the file of a key."""
+        return os.path.join(self.directory, key[:2], key)
+
+    def get(self, key):
+        """Return the file of key and mark it used, or None."""
+        path = self.path(key)
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+
+        return path
+
+    def get_or_create(self, key, produce):
+        """Return the file of key, writing produce() on a miss."""
+        path = self.get(key)
+        if path is not None:
+            return path
+
+        path = self.path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(f'{path}.lock', 'w') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                """another worker may have produced it while we waited"""
+                if self.get(key) is not None:
+                    return path
+                content = produce()
+                self._write(path, content)
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+        self._added(len(content))
+        return path
+
+    def _write(self, path, content):
+        """Write content so readers never see a partial file."""
+        with tempfile.NamedTemporaryFile(
+                dir=os.path.dirname(path), delete=False) as tmp:
+            tmp.write(content)
+        os.chmod(tmp.name, 0o644)
+        os.replace(tmp.name, path)
+
+    def _added(self, size):
+        """Account for a new file and evict if over the limit."""
+        with self._lock:
+            if self._size is None:
+                self._size = sum(size for mtime, size, path in self._files())
+            else:
+                self._size += size
+            over = self._size > self.max_bytes
+        if over:
+            self.evict()
+
+    def _files(self):
+        """Yield (mtime, size, path) of the cached files."""
+        for directory, subdirs, files in os.walk(self.directory):
+            for filename in files:
+                if filename.endswith('.lock') or filename.startswith('tmp'):
+                    continue
+                path = os.path.join(directory, filename)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                yield stat.st_mtime, stat.st_size, path
+
+    def evict(self):
+        """Delete the least recently used files down to 90% of max_bytes."""
+        """the margin keeps the next few writes from evicting again; a
+        non-blocking lock lets one process evict while the others go on"""
+        os.makedirs(self.directory, exist_ok=True)
+        with open(os.path.join(self.directory, '.evict.lock'), 'w') as lock:
+            try:
+                fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                return
+            try:
+                files = sorted(self._files())
+                total = sum(size for mtime, size, path in files)
+                target = self.max_bytes * 0.9
+                for mtime, size, path in files:
+                    if total <= target:
+                        break
+                    for stale in (path, f'{path}.lock'):
+                        try:
+                            os.remove(stale)
+                        except FileNotFoundError:
+                            pass
+                    total -= size
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+        with self._lock:
+            self._size = total
+
+
+_caches = {}
+
+
+def resized_image_cache():
+    """Return the cache of the resized recipe images."""
+    config = settings.RECIPE_IMAGE_RESIZE
+    key = (config['CACHE_DIR'], config['CACHE_MAX_BYTES'])
+    if key not in _caches:
+        _caches[key] = DiskLRUCache(*key)
+
+    return _caches[key]
@@ -0,0 +1,169 @@
+"""
+Resized variants of the recipe images.
+"""
+import io
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import close_old_connections, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from PIL import Image, ImageOps, features
+
+from core.models import (
+    ImageBlob,
+    Recipe,
+)
+
+
+logger = logging.getLogger(__name__)
+
+"""variant name -> bounding box, the aspect ratio is kept and smaller
+images are not upscaled"""
+VARIANTS = {
+    'thumbnail': (160, 160),
+    'card': (640, 640),
+    'full': (1600, 1600),
+}
+
+"""(key in image_variants, Pillow format, file extension)"""
+FORMATS = [
+    ('webp', 'WEBP', 'webp'),
+    ('jpeg', 'JPEG', 'jpg'),
+]
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def available_formats():
+    """Return the FORMATS this Pillow build can write."""
+    """WebP needs Pillow built against libwebp"""
+    return [
+        image_format for image_format in FORMATS
+        if image_format[1] != 'WEBP' or features.check('webp')
+    ]
+
+
+def stored_as(name):
+    """Return a filter of the recipes whose image or variants are name."""
+    query = Q(image=name)
+    for variant in VARIANTS:
+        for key, image_format, ext in FORMATS:
+            query |= Q(image_variants__contains={variant: {key: name}})
+
+    return query
+
+
+def _get_executor():
+    """Return the worker pool, started on first use."""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.RECIPE_IMAGE_WORKERS,
+                thread_name_prefix='recipe-images',
+            )
+
+    return _executor
+
+
+def schedule_variants(recipe):
+    """Generate the variants of the recipe image after the commit."""
+    image_name = recipe.image.name
+
+    def submit():
+        if settings.RECIPE_IMAGE_WORKERS:
+            _get_executor().submit(_work, recipe.id, image_name)
+        else:
+            _run(recipe.id, image_name)
+
+    transaction.on_commit(submit)
+
+
+def _work(recipe_id, image_name):
+    """Generate variants in a worker thread, which has its own DB
+    connection to keep healthy between jobs."""
+    close_old_connections()
+    try:
+        _run(recipe_id, image_name)
+    finally:
+        close_old_connections()
+
+
+def _run(recipe_id, image_name):
+    """Generate variants, logging rather than raising a failure."""
+    """the upload is committed by then, a broken image must not turn
+    its response into a 500"""
+    try:
+        generate_variants(recipe_id, image_name)
+    except Exception:
+        logger.exception('Generating variants of %s failed.', image_name)
+
+
+def generate_variants(recipe_id, image_name):
+    """Write the variants beside the original and record them."""
+    field = Recipe._meta.get_field('image')
+    storage = field.storage
+    with storage.open(image_name) as f, Image.open(f) as original:
+        """apply the EXIF orientation, the variants are saved without
+        any EXIF (camera, GPS...) since it is not passed to save()"""
+        image = ImageOps.exif_transpose(original)
+    if image.mode not in ('RGB', 'RGBA'):
+        image = image.convert('RGB')
+
+    variants = {}
+    for name, size in VARIANTS.items():
+        resized = image.copy()
+        resized.thumbnail(size, Image.LANCZOS)
+        variant = {'width': resized.width, 'height': resized.height}
+        for key, image_format, ext in available_formats():
+            content = io.BytesIO()
+            output = resized.convert('RGB') if image_format == 'JPEG' \
+                else resized
+            output.save(content, format=image_format, quality=85)
+            """stored in the upload directory of the images under the
+            hash of their content, so recipes sharing an image share the
+            variants too"""
+            variant[key] = storage.save(
+                field.generate_filename(None, f'{name}.{ext}'),
+                ContentFile(content.getvalue()),
+            )
+        variants[name] = variant
+
+    """only record them if the image was not replaced in the meantime,
+    otherwise the storage's counts are dropped and the files are left
+    unreferenced for gc_images. updated_at changes the ETag of the recipe
+    detail"""
+    with transaction.atomic():
+        updated = Recipe.objects.filter(
+            pk=recipe_id,
+            image=image_name,
+        ).update(image_variants=variants, updated_at=timezone.now())
+        if not updated:
+            ImageBlob.objects.release(
+                Recipe.file_names(image_name, variants)[1:])
+
+    return variants
+
+
+def resize(image_name, width, quality, image_format):
+    """Return the image resized to width, encoded as image_format."""
+    """the aspect ratio is kept and the image is never upscaled"""
+    key, pillow_format, ext = next(
+        f for f in FORMATS if f[0] == image_format)
+    storage = Recipe._meta.get_field('image').storage
+    with storage.open(image_name) as f, Image.open(f) as original:
+        image = ImageOps.exif_transpose(original)
+
+    image.thumbnail((width, image.height), Image.LANCZOS)
+    if pillow_format == 'JPEG' or image.mode not in ('RGB', 'RGBA'):
+        image = image.convert('RGB')
+    content = io.BytesIO()
+    image.save(content, format=pillow_format, quality=quality)
+
+    return content.getvalue()
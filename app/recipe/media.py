@@ -0,0 +1,116 @@
+"""
+Sending the stored media files once the view allowed them.
+"""
+import mimetypes
+import os
+import re
+from urllib.parse import quote
+
+from django.conf import settings
+from django.http import FileResponse, Http404, HttpResponse
+from django.utils.cache import patch_cache_control
+
+
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+class FileRange:
+    """File object reading at most length bytes from its position."""
+
+    """fileno() is kept so servers with wsgi.file_wrapper (gunicorn)
+    still sendfile() it, from the current offset for Content-Length"""
+    def __init__(self, file, length):
+        self.file = file
+        self.remaining = length
+
+    def read(self, size=-1):
+        if size < 0 or size > self.remaining:
+            size = self.remaining
+        data = self.file.read(size)
+        self.remaining -= len(data)
+        return data
+
+    def fileno(self):
+        return self.file.fileno()
+
+    def close(self):
+        self.file.close()
+
+
+def parse_range(header, size):
+    """Return (start, end) of a single byte range, None for the whole."""
+    """multiple and malformed ranges are ignored as RFC 7233 allows, a
+    start past the end is returned as is for a 416"""
+    match = RANGE_RE.match((header or '').replace(' ', ''))
+    if not match:
+        return None
+    first, last = match.groups()
+    if first:
+        start = int(first)
+        end = size - 1 if not last else min(int(last), size - 1)
+        if last and int(last) < start:
+            return None
+    elif last:
+        start = size - int(last) if int(last) else size
+        start, end = max(start, 0), size - 1
+    else:
+        return None
+
+    return start, end
+
+
+def serve(request, path, name):
+    """Return a response sending the file at path, stored as name."""
+    content_type = mimetypes.guess_type(path)[0] or \
+        'application/octet-stream'
+    header = settings.MEDIA_SENDFILE_HEADER
+    if header:
+        """the proxy replaces the body, handles Range itself and keeps
+        Content-Type and Cache-Control set here"""
+        response = HttpResponse(content_type=content_type)
+        if header == 'X-Accel-Redirect':
+            response[header] = settings.MEDIA_INTERNAL_URL + quote(name)
+        else:
+            response[header] = path
+    else:
+        response = _file_response(request, path, content_type)
+
+    """stored names change with the content, so the files never do"""
+    patch_cache_control(
+        response,
+        private=True,
+        max_age=settings.MEDIA_MAX_AGE,
+        immutable=True,
+    )
+
+    return response
+
+
+def _file_response(request, path, content_type):
+    """Send the file, or the byte range asked for, from the worker."""
+    try:
+        f = open(path, 'rb')
+    except FileNotFoundError:
+        raise Http404('No such file.')
+    size = os.fstat(f.fileno()).st_size
+
+    byte_range = parse_range(request.META.get('HTTP_RANGE'), size)
+    if byte_range is None:
+        response = FileResponse(f, content_type=content_type)
+    elif byte_range[0] >= size:
+        f.close()
+        response = HttpResponse(status=416)
+        response['Content-Range'] = f'bytes */{size}'
+    else:
+        start, end = byte_range
+        f.seek(start)
+        response = FileResponse(
+            FileRange(f, end - start + 1),
+            status=206,
+            content_type=content_type,
+        )
+        response['Content-Length'] = end - start + 1
+        response['Content-Range'] = f'bytes {start}-{end}/{size}'
+    response['Accept-Ranges'] = 'bytes'
+
+    return response
@@ -0,0 +1,162 @@
+"""
+Pagination for the recipe APIs.
+"""
+import json
+
+from django.conf import settings
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Q
+
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import CursorPagination, Cursor
+
+
+class RecipeCursorPagination(CursorPagination):
+    """Keyset pagination for recipes, over the ordering of the view."""
+
+    """The cursor is an opaque token holding the sort keys of the last row
+    seen, so every page is a "WHERE (keys) < (x) ORDER BY keys LIMIT n"
+    range scan and deep pages cost the same as the first one. No OFFSET
+    and no COUNT(*) are ever run. The ordering comes from the view's
+    get_ordering() and must end with a unique key, the id."""
+    ordering = ('-id',)
+    page_size = settings.RECIPE_PAGE_SIZE
+    page_size_query_param = 'page_size'
+    max_page_size = settings.RECIPE_MAX_PAGE_SIZE
+
+    def get_ordering(self, request, queryset, view):
+        if hasattr(view, 'get_ordering'):
+            return tuple(view.get_ordering())
+
+        return self.ordering
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.page_size = self.get_page_size(request)
+        if not self.page_size:
+            return None
+
+        self.base_url = request.build_absolute_uri()
+        self.ordering = self.get_ordering(request, queryset, view)
+        self.cursor = self.decode_cursor(request)
+        if self.cursor is None:
+            reverse, values = False, None
+        else:
+            reverse, values = self.cursor.reverse, self._load_position(
+                self.cursor.position, queryset)
+
+        """previous pages are read backwards from the first row shown"""
+        ordering = [
+            _reversed(key) for key in self.ordering
+        ] if reverse else list(self.ordering)
+        queryset = queryset.order_by(*ordering)
+        if values is not None:
+            queryset = queryset.filter(_after(ordering, values))
+
+        results = list(queryset[:self.page_size + 1])
+        self.page = results[:self.page_size]
+        has_more = len(results) > self.page_size
+        if reverse:
+            self.page.reverse()
+            self.has_next, self.has_previous = values is not None, has_more
+        else:
+            self.has_next, self.has_previous = has_more, values is not None
+
+        return self.page
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+
+        return self._link(self.page[-1], reverse=False)
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+
+        return self._link(self.page[0], reverse=True)
+
+    def _link(self, instance, reverse):
+        """Return the link to the rows after (or before) instance."""
+        position = json.dumps({
+            'k': list(self.ordering),
+            'v': [
+                _value(instance, key.lstrip('-')) for key in self.ordering
+            ],
+        }, cls=DjangoJSONEncoder, separators=(',', ':'))
+
+        return self.encode_cursor(Cursor(
+            offset=0,
+            reverse=reverse,
+            position=position,
+        ))
+
+    def _load_position(self, position, queryset):
+        """Return the sort key values of a cursor of this ordering."""
+        """a cursor of another ordering would compare unrelated columns,
+        and values the sort keys cannot hold would fail in the query"""
+        try:
+            position = json.loads(position)
+            keys, values = position['k'], position['v']
+        except (TypeError, ValueError, KeyError):
+            raise NotFound(self.invalid_cursor_message)
+        if keys != list(self.ordering) or not isinstance(values, list) or \
+                len(values) != len(keys):
+            raise NotFound(self.invalid_cursor_message)
+
+        loaded = []
+        for key, value in zip(keys, values):
+            if not isinstance(value, (str, int, float)) or \
+                    isinstance(value, bool) or '\x00' in str(value):
+                raise NotFound(self.invalid_cursor_message)
+            field = _field(queryset, key.lstrip('-'))
+            try:
+                value = field.to_python(value)
+                field.run_validators(value)
+            except ValidationError:
+                raise NotFound(self.invalid_cursor_message)
+            loaded.append(value)
+
+        return loaded
+
+
+def _field(queryset, name):
+    """Return the model field or annotation output field of name."""
+    try:
+        return queryset.model._meta.get_field(name)
+    except FieldDoesNotExist:
+        return queryset.query.annotations[name].output_field
+
+
+def _value(instance, name):
+    """Return a sort key of a model instance or a .values() row."""
+    if isinstance(instance, dict):
+        return instance[name]
+
+    return getattr(instance, name)
+
+
+def _reversed(key):
+    """Return the ordering key sorting the other way."""
+    return key[1:] if key.startswith('-') else f'-{key}'
+
+
+def _after(ordering, values):
+    """Return a filter of the rows sorting after values in ordering."""
+    """(a, b) > (x, y) is spelt a >= x AND (a > x OR (a = x AND b > y)),
+    the leading bound lets Postgres range scan an index on (a, b)"""
+    keys = [
+        (key.lstrip('-'), 'lt' if key.startswith('-') else 'gt')
+        for key in ordering
+    ]
+    condition = None
+    for (name, op), value in reversed(list(zip(keys, values))):
+        strictly_after = Q(**{f'{name}__{op}': value})
+        condition = strictly_after if condition is None else \
+            strictly_after | (Q(**{name: value}) & condition)
+
+    if len(keys) > 1:
+        name, op = keys[0]
+        condition = Q(**{f'{name}__{op}e': values[0]}) & condition
+
+    return condition
@@ -1,16 +1,50 @@
 """
 Serializers for recipe APIs
 """
+import operator
+import os
+
+from django.conf import settings
+from django.db import transaction
+
+from PIL import Image
+
 from rest_framework import serializers
 
+from drf_spectacular.utils import (
+    extend_schema_field,
+    OpenApiTypes,
+)
+
 from core.models import (
     Recipe,
     Tag,
     Ingredient,
 )
+from recipe.images import available_formats
+from recipe.uploads import IMAGE_FORMATS
+
+
+class RecipeAttrSerializer(serializers.ModelSerializer):
+    """Base serializer for recipe attributes like tags and ingredients."""
+
+    """Names are unique per user. Only renames are checked here, when
+    nested in a recipe an existing name just links the existing row"""
+    def validate_name(self, value):
+        """Check a renamed tag/ingredient does not clash with another."""
+        if self.instance is not None:
+            clash = type(self.instance).objects.filter(
+                user=self.instance.user_id,
+                name=value,
+            ).exclude(id=self.instance.id)
+            if clash.exists():
+                raise serializers.ValidationError(
+                    f'You already have one named "{value}".')
+
+        return value
 
 
-class IngredientSerializer(serializers.ModelSerializer):
+class IngredientSerializer(RecipeAttrSerializer):
     """Serializer for ingredients."""
 
     class Meta:
@@ -19,7 +53,7 @@ class IngredientSerializer(serializers.ModelSerializer):
         read_only_fields = ['id']
 
 
-class TagSerializer(serializers.ModelSerializer):
+class TagSerializer(RecipeAttrSerializer):
     """Serializer for tags."""
 
     class Meta:
@@ -28,6 +62,77 @@ class TagSerializer(serializers.ModelSerializer):
         read_only_fields = ['id']
 
 
+class RecipeAttrAutocompleteSerializer(serializers.Serializer):
+    """Serializer for a type-ahead search of tag/ingredient names."""
+    q = serializers.CharField(max_length=100)
+    limit = serializers.IntegerField(min_value=1, required=False)
+
+    """read when used rather than at import, so settings overrides apply"""
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        config = settings.RECIPE_ATTR_AUTOCOMPLETE
+        self.fields['limit'] = serializers.IntegerField(
+            min_value=1,
+            max_value=config['MAX_LIMIT'],
+            default=config['LIMIT'],
+        )
+
+
+def link_recipe_attrs(field_name, links):
+    """Link (recipe, tag/ingredient) pairs in a single insert."""
+    """one INSERT into the recipe_tags/recipe_ingredients through table,
+    existing links are skipped by ON CONFLICT DO NOTHING"""
+    field = Recipe._meta.get_field(field_name)
+    through = field.remote_field.through
+    through.objects.bulk_create(
+        [
+            through(**{
+                field.m2m_field_name(): recipe,
+                field.m2m_reverse_field_name(): obj,
+            })
+            for recipe, obj in links
+        ],
+        ignore_conflicts=True,
+    )
+
+
+class RecipeListSerializer(serializers.ListSerializer):
+    """Serializer for creating many recipes at once."""
+
+    """The recipes are inserted in one statement, the tags/ingredients of
+    the whole batch are resolved together and all the links are written
+    in one insert per relation"""
+    @transaction.atomic
+    def create(self, validated_data):
+        """Create the recipes."""
+        attrs = {
+            field_name: [item.pop(field_name, []) for item in validated_data]
+            for field_name in ('tags', 'ingredients')
+        }
+        recipes = Recipe.objects.bulk_create(
+            [Recipe(**item) for item in validated_data]
+        )
+
+        user = self.context['request'].user
+        for field_name, items_per_recipe in attrs.items():
+            model = Recipe._meta.get_field(field_name).related_model
+            objs = {
+                obj.name: obj
+                for obj in model.objects.get_or_create_many(
+                    user,
+                    [item['name'] for items in items_per_recipe
+                     for item in items],
+                )
+            }
+            link_recipe_attrs(field_name, [
+                (recipe, objs[name])
+                for recipe, items in zip(recipes, items_per_recipe)
+                for name in dict.fromkeys(item['name'] for item in items)
+            ])
+
+        return recipes
+
+
 """To serialize speific recipe model use ModelSerializer"""
 class RecipeSerializer(serializers.ModelSerializer):
     """Serializer for recipes."""
@@ -43,34 +148,58 @@ class RecipeSerializer(serializers.ModelSerializer):
         model = Recipe
         fields = ['id', 'title', 'time_minutes', 'price', 'link', 'tags', 'ingredients']
         read_only_fields = ['id']
+        list_serializer_class = RecipeListSerializer
 
-    def _get_or_create_tags(self, tags, recipe):
-        """Handle getting or creating tags as needed."""
+    """fields limits the output to those names, for sparse fieldsets"""
+    def __init__(self, *args, fields=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        if fields is not None:
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
+
+    def _get_or_create_attrs(self, field_name, items, recipe, replace=False):
+        """Handle getting or creating tags/ingredients for a recipe."""
 
         """get the current logged in user"""
         auth_user = self.context['request'].user
-        for tag in tags:
-            """First check the tag exists, if not exists then create in Tag table
-            if tag exist then just get that tag from db.
-            Then save passed tags in recipe tag field"""
-            tag_obj, created = Tag.objects.get_or_create(
-                user=auth_user,
-                **tag,
-            )
-            recipe.tags.add(tag_obj)
-
-    def _get_or_create_ingredients(self, ingredients, recipe):
+        field = Recipe._meta.get_field(field_name)
+
+        """Fetch all the existing names in one query and create the
+        missing ones in one bulk insert, instead of get_or_create per item"""
+        objs = field.related_model.objects.get_or_create_many(
+            auth_user,
+            [item['name'] for item in items],
+        )
+
+        """When replacing, only delete the links that are no longer wanted
+        and only insert the new ones, so an unchanged list writes nothing.
+        The current links come from the prefetch cache when available."""
+        current = set()
+        if replace:
+            current = {obj.id for obj in getattr(recipe, field_name).all()}
+            stale = current - {obj.id for obj in objs}
+            if stale:
+                field.remote_field.through.objects.filter(**{
+                    field.m2m_field_name(): recipe,
+                    f'{field.m2m_reverse_field_name()}__in': stale,
+                }).delete()
+
+        link_recipe_attrs(
+            field_name,
+            [(recipe, obj) for obj in objs if obj.id not in current],
+        )
+
+    def _get_or_create_tags(self, tags, recipe, replace=False):
+        """Handle getting or creating tags as needed."""
+        self._get_or_create_attrs('tags', tags, recipe, replace)
+
+    def _get_or_create_ingredients(self, ingredients, recipe, replace=False):
         """Handle getting or creating ingredients as needed."""
-        auth_user = self.context['request'].user
-        for ingredient in ingredients:
-            ingredient_obj, created = Ingredient.objects.get_or_create(
-                user=auth_user,
-                **ingredient,
-            )
-            recipe.ingredients.add(ingredient_obj)
+        self._get_or_create_attrs('ingredients', ingredients, recipe, replace)
 
     """While creating a new recipe, check the tags in that recipe
     (if provided) to avoid duplication"""
+    @transaction.atomic
     def create(self, validated_data):
         """Create a recipe."""
 
@@ -86,20 +215,20 @@ class RecipeSerializer(serializers.ModelSerializer):
 
         return recipe
 
-    """Update all the previous Tags/Ingradients for this recipe
-    with the ones passed now"""
+    """Replace the previous Tags/Ingradients for this recipe
+    with the ones passed now, touching only the links that changed"""
+    @transaction.atomic
     def update(self, instance, validated_data):
         """Update recipe."""
         tags = validated_data.pop('tags', None)
         ingredients = validated_data.pop('ingredients', None)
 
         if tags is not None:
-            instance.tags.clear()
-            self._get_or_create_tags(tags, instance)
+            self._get_or_create_tags(tags, instance, replace=True)
 
         if ingredients is not None:
-            instance.ingredients.clear()
-            self._get_or_create_ingredients(ingredients, instance)
+            self._get_or_create_ingredients(
+                ingredients, instance, replace=True)
 
         for attr, value in validated_data.items():
             setattr(instance, attr, value)
@@ -112,9 +241,168 @@ class RecipeSerializer(serializers.ModelSerializer):
 becaus eits almost same and we are going add few more fields to it"""
 class RecipeDetailSerializer(RecipeSerializer):
     """Serializer for recipe detail view."""
+    image_variants = serializers.SerializerMethodField()
 
+    """the image is only written through the upload-image action, which
+    bounds the upload, counts the stored files and regenerates the
+    variants"""
     class Meta(RecipeSerializer.Meta):
-        fields = RecipeSerializer.Meta.fields + ['description', 'image']
+        fields = RecipeSerializer.Meta.fields + [
+            'description',
+            'image',
+            'image_variants',
+        ]
+        read_only_fields = RecipeSerializer.Meta.read_only_fields + ['image']
+
+    """empty until the variants of a new image are generated"""
+    @extend_schema_field(OpenApiTypes.OBJECT)
+    def get_image_variants(self, recipe):
+        """Return the sizes and URLs of the resized images."""
+        return image_variant_urls(
+            recipe.image_variants, file_url(self.context.get('request')))
+
+
+def file_url(request):
+    """Return a function giving the URL of a stored recipe image."""
+    storage = Recipe._meta.get_field('image').storage
+
+    def url(name):
+        url = storage.url(name)
+        return request.build_absolute_uri(url) if request else url
+
+    return url
+
+
+def image_variant_urls(image_variants, url):
+    """Return image_variants with URLs in place of the stored names."""
+    variants = {}
+    for name, variant in image_variants.items():
+        variants[name] = {}
+        for key, value in variant.items():
+            if key in ('width', 'height'):
+                variants[name][key] = value
+            else:
+                variants[name][key] = url(value)
+
+    return variants
+
+
+"""Running the DRF fields per recipe, and a nested serializer per tag and
+ingredient, costs more CPU than the queries on large lists. Reads take
+plain rows from .values() instead, load the tags/ingredients as (recipe
+id, id, name) tuples in one query each and build the same dicts as
+RecipeSerializer/RecipeDetailSerializer, key for key and in the same
+order, so the JSON is byte-identical"""
+class RecipeReadSerializer:
+    """Read-only serializer of recipe rows, without the field machinery."""
+
+    def __init__(self, instance, fields, many=False, context=None):
+        self.instance = instance
+        self.fields = fields
+        self.many = many
+        self.context = context or {}
+
+    @property
+    def data(self):
+        rows = list(self.instance) if self.many else [self.instance]
+        data = self.to_representation(rows, self.load_related(rows))
+
+        return data if self.many else data[0]
+
+    def load_related(self, rows):
+        """Return field name -> recipe id -> the emitted tags/ingredients."""
+        """the same join as the prefetch of the serializers, so the items
+        come in the same order"""
+        ids = [row['id'] for row in rows]
+        related = {}
+        for field_name in ('tags', 'ingredients'):
+            if field_name not in self.fields:
+                continue
+            model = Recipe._meta.get_field(field_name).related_model
+            items = related[field_name] = {}
+            if not ids:
+                continue
+            for recipe_id, item_id, name in model.objects.filter(
+                recipe__in=ids,
+            ).values_list('recipe', 'id', 'name'):
+                items.setdefault(recipe_id, []).append(
+                    {'id': item_id, 'name': name})
+
+        return related
+
+    def to_representation(self, rows, related):
+        """Return the recipes of rows as dicts."""
+        url = file_url(self.context.get('request'))
+        getters = []
+        for name in self.fields:
+            if name in related:
+                getters.append((name, _related_getter(related[name])))
+            elif name == 'price':
+                """the column scale is the serializer's decimal_places,
+                so DecimalField's quantize() would not change it"""
+                getters.append(
+                    (name, lambda row: '{:f}'.format(row['price'])))
+            elif name == 'image':
+                getters.append((name, lambda row: (
+                    url(row['image']) if row['image'] else None)))
+            elif name == 'image_variants':
+                getters.append((name, lambda row: image_variant_urls(
+                    row['image_variants'], url)))
+            else:
+                getters.append((name, operator.itemgetter(name)))
+
+        return [
+            {name: get(row) for name, get in getters}
+            for row in rows
+        ]
+
+
+def _related_getter(items):
+    """Return a getter of the tags/ingredients of a row."""
+    def get(row):
+        return items.get(row['id'], [])
+
+    return get
+
+
+class RecipeImageField(serializers.FileField):
+    """Image upload field reading only the header of the file."""
+
+    default_error_messages = {
+        'invalid_image': 'Upload a valid JPEG, PNG, WebP or GIF image.',
+        'too_many_pixels': 'The image is larger than {max_pixels} pixels.',
+    }
+
+    """Image.open only parses the header, the pixels are decoded later
+    (by the variants job) and only for images under the pixel limit,
+    which guards against decompression bombs"""
+    def to_internal_value(self, data):
+        file_object = super().to_internal_value(data)
+        try:
+            with Image.open(file_object) as image:
+                image_format, (width, height) = image.format, image.size
+        except Image.DecompressionBombError:
+            self._fail_too_many_pixels()
+        except (OSError, SyntaxError):
+            self.fail('invalid_image')
+        finally:
+            file_object.seek(0)
+
+        if image_format not in IMAGE_FORMATS:
+            self.fail('invalid_image')
+        if width * height > settings.RECIPE_IMAGE_MAX_PIXELS:
+            self._fail_too_many_pixels()
+
+        """store it under the extension of its actual format"""
+        stem = os.path.splitext(os.path.basename(file_object.name))[0]
+        file_object.name = f'{stem}.{IMAGE_FORMATS[image_format]}'
+        file_object.content_type = Image.MIME[image_format]
+
+        return file_object
+
+    def _fail_too_many_pixels(self):
+        self.fail('too_many_pixels',
+                  max_pixels=settings.RECIPE_IMAGE_MAX_PIXELS)
 
 
 """created seperate endpoint for uploading image
@@ -122,9 +410,92 @@ Through resipe-serializer image uploading is optional,
 In this serializer/endpoint its must"""
 class RecipeImageSerializer(serializers.ModelSerializer):
     """Serializer for uploading images to recipes."""
+    image = RecipeImageField(required=True)
 
     class Meta:
         model = Recipe
         fields = ['id', 'image']
         read_only_fields = ['id']
-        extra_kwargs = {'image': {'required': 'True'}}
+
+
+class RecipeImageResizeSerializer(serializers.Serializer):
+    """Serializer for the size of a resized recipe image."""
+    width = serializers.ChoiceField(choices=[])
+    quality = serializers.ChoiceField(choices=[], required=False)
+    format = serializers.ChoiceField(choices=[], default='jpeg')
+
+    """read when used rather than at import, so settings overrides apply"""
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        config = settings.RECIPE_IMAGE_RESIZE
+        self.fields['width'].choices = config['WIDTHS']
+        self.fields['quality'].choices = config['QUALITIES']
+        self.fields['quality'].default = config['DEFAULT_QUALITY']
+        self.fields['format'].choices = [
+            key for key, image_format, ext in available_formats()]
+
+
+class RecipeRangeFilterSerializer(serializers.Serializer):
+    """Serializer for the price and time range filters of recipes."""
+    price_min = serializers.DecimalField(
+        max_digits=5, decimal_places=2, required=False)
+    price_max = serializers.DecimalField(
+        max_digits=5, decimal_places=2, required=False)
+    time_min = serializers.IntegerField(required=False)
+    time_max = serializers.IntegerField(required=False)
+
+    """parameter -> queryset lookup, all bounds are inclusive"""
+    lookups = {
+        'price_min': 'price__gte',
+        'price_max': 'price__lte',
+        'time_min': 'time_minutes__gte',
+        'time_max': 'time_minutes__lte',
+    }
+
+
+"""Bulk actions select recipes by ids and/or the same tags/ingredients
+filters as the recipe list"""
+class RecipeBulkSelectSerializer(serializers.Serializer):
+    """Serializer for selecting recipes in bulk actions."""
+    ids = serializers.ListField(
+        child=serializers.IntegerField(),
+        required=False,
+        allow_empty=False,
+    )
+    tags = serializers.RegexField(r'^\d+(,\d+)*$', required=False)
+    ingredients = serializers.RegexField(r'^\d+(,\d+)*$', required=False)
+    match = serializers.ChoiceField(choices=['any', 'all'], required=False)
+
+    def validate(self, attrs):
+        """Refuse to act on every recipe when nothing is selected."""
+        if not {'ids', 'tags', 'ingredients'} & attrs.keys():
+            raise serializers.ValidationError(
+                'Select recipes by ids, tags or ingredients.')
+
+        return attrs
+
+
+class RecipeBulkUpdateSerializer(RecipeBulkSelectSerializer):
+    """Serializer for updating fields of recipes in bulk."""
+    price = serializers.DecimalField(
+        max_digits=5,
+        decimal_places=2,
+        required=False,
+    )
+    time_minutes = serializers.IntegerField(required=False)
+    link = serializers.CharField(
+        max_length=255,
+        allow_blank=True,
+        required=False,
+    )
+
+    update_fields = ['price', 'time_minutes', 'link']
+
+    def validate(self, attrs):
+        """Check there is at least one field to update."""
+        attrs = super().validate(attrs)
+        if not set(self.update_fields) & attrs.keys():
+            raise serializers.ValidationError(
+                f'Give at least one of {", ".join(self.update_fields)}.')
+
+        return attrs
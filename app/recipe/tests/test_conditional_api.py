@@ -0,0 +1,163 @@
+"""
+Tests for conditional GET (ETag / 304) on recipe APIs.
+"""
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import (
+    CollectionVersion,
+    Recipe,
+    Tag,
+)
+
+
+RECIPES_URL = reverse('recipe:recipe-list')
+TAGS_URL = reverse('recipe:tag-list')
+
+
+def detail_url(recipe_id):
+    """Create and return a recipe detail URL"""
+    return reverse('recipe:recipe-detail', args=[recipe_id])
+
+
+def tag_detail_url(tag_id):
+    """Create and return a tag detail URL."""
+    return reverse('recipe:tag-detail', args=[tag_id])
+
+
+def create_recipe(user, **params):
+    """Create and return a sample recipe."""
+    defaults = {
+        'title': 'Sample recipe title',
+        'time_minutes': 22,
+        'price': Decimal('5.25'),
+    }
+    defaults.update(params)
+
+    return Recipe.objects.create(user=user, **defaults)
+
+
+class ConditionalGetTests(TestCase):
+    """Test unchanged resources are answered with 304."""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            'user@example.com',
+            'testpass123',
+        )
+        self.client.force_authenticate(self.user)
+
+    def _get(self, url, etag=None, **params):
+        """GET url, sending etag in If-None-Match when given."""
+        headers = {'HTTP_IF_NONE_MATCH': etag} if etag else {}
+        return self.client.get(url, params, **headers)
+
+    def test_unchanged_list_not_modified(self):
+        """Test an unchanged list returns 304 after one query."""
+        create_recipe(user=self.user)
+        res = self._get(RECIPES_URL)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        etag = res['ETag']
+
+        with self.assertNumQueries(1):
+            res = self._get(RECIPES_URL, etag)
+
+        self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(res['ETag'], etag)
+
+    def test_weak_etag_matches(self):
+        """Test a weak validator from a proxy still matches."""
+        res = self._get(RECIPES_URL)
+
+        res = self._get(RECIPES_URL, f'W/{res["ETag"]}')
+
+        self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_list_etag_depends_on_query(self):
+        """Test another filter or page is not answered with 304."""
+        res = self._get(RECIPES_URL)
+
+        res = self._get(RECIPES_URL, res['ETag'], page_size=1)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+    def test_write_changes_list_etag(self):
+        """Test creating a recipe changes the list ETag."""
+        res = self._get(RECIPES_URL)
+        etag = res['ETag']
+
+        payload = {'title': 'New', 'time_minutes': 5, 'price': '1.00'}
+        self.client.post(RECIPES_URL, payload)
+        res = self._get(RECIPES_URL, etag)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(res['ETag'], etag)
+        self.assertEqual(len(res.data['results']), 1)
+
+    def test_etag_limited_to_user(self):
+        """Test another user's ETag does not match."""
+        res = self._get(RECIPES_URL)
+        other_user = get_user_model().objects.create_user(
+            'other@example.com',
+            'testpass123',
+        )
+        self.client.force_authenticate(other_user)
+
+        res = self._get(RECIPES_URL, res['ETag'])
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+    def test_unchanged_detail_not_modified(self):
+        """Test a recipe is not invalidated by writes to another one."""
+        recipe = create_recipe(user=self.user)
+        other = create_recipe(user=self.user)
+        res = self._get(detail_url(recipe.id))
+        etag = res['ETag']
+
+        self.client.patch(detail_url(other.id), {'title': 'Changed'})
+        res = self._get(detail_url(recipe.id), etag)
+
+        self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_tag_rename_changes_detail_etag(self):
+        """Test renaming a tag invalidates the recipes using it."""
+        recipe = create_recipe(user=self.user)
+        tag = Tag.objects.create(user=self.user, name='Vegan')
+        recipe.tags.add(tag)
+        res = self._get(detail_url(recipe.id))
+        etag = res['ETag']
+
+        self.client.patch(tag_detail_url(tag.id), {'name': 'Vegetarian'})
+        res = self._get(detail_url(recipe.id), etag)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['tags'][0]['name'], 'Vegetarian')
+
+    def test_tag_delete_changes_tag_list_etag(self):
+        """Test deleting a tag changes the tag list ETag."""
+        tag = Tag.objects.create(user=self.user, name='Vegan')
+        res = self._get(TAGS_URL)
+        etag = res['ETag']
+
+        self.client.delete(tag_detail_url(tag.id))
+        res = self._get(TAGS_URL, etag)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data, [])
+
+    def test_writes_bump_version(self):
+        """Test recipe updates and deletes bump the collection version."""
+        recipe = create_recipe(user=self.user)
+
+        self.client.patch(detail_url(recipe.id), {'title': 'Changed'})
+        self.assertEqual(CollectionVersion.objects.current(self.user.id), 1)
+
+        self.client.delete(detail_url(recipe.id))
+        self.assertEqual(CollectionVersion.objects.current(self.user.id), 2)
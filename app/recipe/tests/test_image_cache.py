@@ -0,0 +1,67 @@
+"""
+Tests for the disk cache of resized images.
+"""
+import os
+import tempfile
+import threading
+import time
+
+from django.test import SimpleTestCase
+
+from recipe.image_cache import DiskLRUCache
+
+
+class DiskLRUCacheTests(SimpleTestCase):
+    """Test the disk LRU cache."""
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+
+    def test_get_or_create(self):
+        """Test a miss is produced once and then read from disk."""
+        cache = DiskLRUCache(self.directory, max_bytes=1000)
+
+        path = cache.get_or_create('ab12', lambda: b'image')
+        again = cache.get_or_create('ab12', lambda: self.fail('produced'))
+
+        self.assertEqual(path, again)
+        with open(path, 'rb') as f:
+            self.assertEqual(f.read(), b'image')
+
+    def test_concurrent_misses_collapsed(self):
+        """Test concurrent misses for one key produce it only once."""
+        cache = DiskLRUCache(self.directory, max_bytes=1000)
+        calls = []
+
+        def produce():
+            calls.append(1)
+            time.sleep(0.1)
+            return b'image'
+
+        threads = [
+            threading.Thread(
+                target=cache.get_or_create, args=('ab12', produce))
+            for _ in range(4)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(len(calls), 1)
+
+    def test_evicts_least_recently_used(self):
+        """Test the least recently used files go past max_bytes."""
+        cache = DiskLRUCache(self.directory, max_bytes=25)
+        for i, key in enumerate(['aa', 'bb']):
+            path = cache.get_or_create(key, lambda: b'x' * 10)
+            os.utime(path, (i, i))
+        cache.get('aa')
+
+        cache.get_or_create('cc', lambda: b'x' * 10)
+
+        self.assertIsNotNone(cache.get('aa'))
+        self.assertIsNone(cache.get('bb'))
+        self.assertIsNotNone(cache.get('cc'))
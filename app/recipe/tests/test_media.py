@@ -0,0 +1,162 @@
+"""
+Tests for serving the stored recipe images.
+"""
+from decimal import Decimal
+import tempfile
+
+from django.contrib.auth import get_user_model
+from django.core.files.base import ContentFile
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import Recipe
+from recipe.media import parse_range
+
+
+def media_url(name):
+    """Create and return the URL of a stored file."""
+    return reverse('media', args=[name])
+
+
+class ParseRangeTests(SimpleTestCase):
+    """Test parsing the Range header."""
+
+    def test_parse_range(self):
+        """Test single ranges are clamped to the file size."""
+        self.assertEqual(parse_range('bytes=0-3', 10), (0, 3))
+        self.assertEqual(parse_range('bytes=5-', 10), (5, 9))
+        self.assertEqual(parse_range('bytes=5-50', 10), (5, 9))
+        self.assertEqual(parse_range('bytes=-4', 10), (6, 9))
+        self.assertEqual(parse_range('bytes=-40', 10), (0, 9))
+
+    def test_parse_range_ignored(self):
+        """Test missing, malformed and multiple ranges send the whole."""
+        for header in (None, 'bytes=-', 'bytes=4-2', 'lines=0-1',
+                       'bytes=0-1,4-5'):
+            self.assertIsNone(parse_range(header, 10))
+
+    def test_parse_range_unsatisfiable(self):
+        """Test ranges past the end start at the size."""
+        self.assertEqual(parse_range('bytes=10-', 10)[0], 10)
+        self.assertEqual(parse_range('bytes=-0', 10)[0], 10)
+
+
+class MediaViewTests(TestCase):
+    """Test the media view."""
+
+    def setUp(self):
+        media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(media_root.cleanup)
+        settings_override = override_settings(
+            MEDIA_ROOT=media_root.name,
+            MEDIA_SENDFILE_HEADER=None,
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            'user@example.com',
+            'password123',
+        )
+        self.client.force_authenticate(self.user)
+        self.recipe = Recipe.objects.create(
+            user=self.user,
+            title='Sample recipe',
+            time_minutes=10,
+            price=Decimal('5.00'),
+        )
+        self.recipe.image.save('photo.jpg', ContentFile(b'0123456789'))
+        self.name = self.recipe.image.name
+
+    def test_owner_gets_file(self):
+        """Test the owner of the recipe gets the whole file."""
+        res = self.client.get(media_url(self.name), HTTP_ACCEPT='image/*')
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(b''.join(res.streaming_content), b'0123456789')
+        self.assertEqual(res['Content-Type'], 'image/jpeg')
+        self.assertEqual(res['Accept-Ranges'], 'bytes')
+        self.assertIn('private', res['Cache-Control'])
+
+    def test_owner_gets_variant(self):
+        """Test the variants of the recipe image are served too."""
+        storage = Recipe._meta.get_field('image').storage
+        variant = storage.save(
+            'uploads/recipe/card.jpg', ContentFile(b'variant'))
+        self.recipe.image_variants = {
+            'card': {'jpeg': variant, 'width': 1, 'height': 1}}
+        self.recipe.save()
+
+        res = self.client.get(media_url(variant))
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(b''.join(res.streaming_content), b'variant')
+
+    def test_range(self):
+        """Test a byte range is answered with 206."""
+        res = self.client.get(media_url(self.name), HTTP_RANGE='bytes=2-5')
+
+        self.assertEqual(res.status_code, status.HTTP_206_PARTIAL_CONTENT)
+        self.assertEqual(b''.join(res.streaming_content), b'2345')
+        self.assertEqual(res['Content-Length'], '4')
+        self.assertEqual(res['Content-Range'], 'bytes 2-5/10')
+
+    def test_range_not_satisfiable(self):
+        """Test a range past the end of the file is answered with 416."""
+        res = self.client.get(media_url(self.name), HTTP_RANGE='bytes=10-')
+
+        self.assertEqual(
+            res.status_code,
+            status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE,
+        )
+        self.assertEqual(res['Content-Range'], 'bytes */10')
+
+    def test_other_user_not_found(self):
+        """Test files of other users' recipes are not served."""
+        other_user = get_user_model().objects.create_user(
+            'other@example.com',
+            'password123',
+        )
+        self.client.force_authenticate(other_user)
+
+        res = self.client.get(media_url(self.name))
+
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_unknown_file_not_found(self):
+        """Test files that are no recipe image are not served."""
+        res = self.client.get(media_url('tmp/upload.jpg'))
+
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_auth_required(self):
+        """Test anonymous requests are rejected."""
+        res = APIClient().get(media_url(self.name))
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    @override_settings(
+        MEDIA_SENDFILE_HEADER='X-Accel-Redirect',
+        MEDIA_INTERNAL_URL='/internal/media/',
+    )
+    def test_accel_redirect(self):
+        """Test the transfer is handed to nginx."""
+        res = self.client.get(media_url(self.name))
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            res['X-Accel-Redirect'], f'/internal/media/{self.name}')
+        self.assertEqual(res['Content-Type'], 'image/jpeg')
+        self.assertEqual(res.content, b'')
+
+    @override_settings(MEDIA_SENDFILE_HEADER='X-Sendfile')
+    def test_sendfile(self):
+        """Test the transfer is handed to Apache by file path."""
+        res = self.client.get(media_url(self.name))
+
+        storage = Recipe._meta.get_field('image').storage
+        self.assertEqual(res['X-Sendfile'], storage.path(self.name))
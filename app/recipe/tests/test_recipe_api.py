@@ -1,14 +1,19 @@
 """
 Tests for recipe APIs.
 """
+from base64 import b64encode
 from decimal import Decimal
+from unittest.mock import patch
+from urllib.parse import urlencode
 import tempfile
 import os
 
 from PIL import Image
 
 from django.contrib.auth import get_user_model
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 
 from rest_framework import status
@@ -19,6 +24,7 @@ from core.models import (
     Tag,
     Ingredient,
 )
+from recipe.pagination import RecipeCursorPagination
 
 """RecipeSerializer-lists all the recipe as preview
 RecipeDetailSerializer-displays specific recipe in detail"""
@@ -103,7 +109,7 @@ class PrivateRecipeApiTests(TestCase):
         then check response status code and recipe data with response data"""
         serializer = RecipeSerializer(recipes, many=True)
         self.assertEqual(res.status_code, status.HTTP_200_OK)
-        self.assertEqual(res.data, serializer.data)
+        self.assertEqual(res.data['results'], serializer.data)
 
     def test_recipe_list_limited_to_user(self):
         """Test list of recipes is limited to authenticated user."""
@@ -122,7 +128,7 @@ class PrivateRecipeApiTests(TestCase):
 
         serializer = RecipeSerializer(recipes, many=True)
         self.assertEqual(res.status_code, status.HTTP_200_OK)
-        self.assertEqual(res.data, serializer.data)
+        self.assertEqual(res.data['results'], serializer.data)
 
 
     def test_get_recipe_detail(self):
@@ -137,6 +143,12 @@ class PrivateRecipeApiTests(TestCase):
         serializer = RecipeDetailSerializer(recipe)
         self.assertEqual(res.data, serializer.data)
 
+    def test_get_recipe_detail_bad_id(self):
+        """Test an id that is no number is not found."""
+        res = self.client.get(detail_url('abc'))
+
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
 
     """creating recipe through the source code thats going to be tested"""
     def test_create_recipe(self):
@@ -434,9 +446,9 @@ class PrivateRecipeApiTests(TestCase):
         s1 = RecipeSerializer(r1)
         s2 = RecipeSerializer(r2)
         s3 = RecipeSerializer(r3)
-        self.assertIn(s1.data, res.data)
-        self.assertIn(s2.data, res.data)
-        self.assertNotIn(s3.data, res.data)
+        self.assertIn(s1.data, res.data['results'])
+        self.assertIn(s2.data, res.data['results'])
+        self.assertNotIn(s3.data, res.data['results'])
 
     def test_filter_by_ingredients(self):
         """Test filtering recipes by ingredients."""
@@ -454,9 +466,447 @@ class PrivateRecipeApiTests(TestCase):
         s1 = RecipeSerializer(r1)
         s2 = RecipeSerializer(r2)
         s3 = RecipeSerializer(r3)
-        self.assertIn(s1.data, res.data)
-        self.assertIn(s2.data, res.data)
-        self.assertNotIn(s3.data, res.data)
+        self.assertIn(s1.data, res.data['results'])
+        self.assertIn(s2.data, res.data['results'])
+        self.assertNotIn(s3.data, res.data['results'])
+
+    def test_filter_by_tags_match_all(self):
+        """Test filtering recipes having all of the tags."""
+        r1 = create_recipe(user=self.user, title='Vegan Curry')
+        r2 = create_recipe(user=self.user, title='Vegan Salad')
+        tag1 = Tag.objects.create(user=self.user, name='Vegan')
+        tag2 = Tag.objects.create(user=self.user, name='Spicy')
+        r1.tags.add(tag1, tag2)
+        r2.tags.add(tag1)
+
+        params = {'tags': f'{tag1.id},{tag2.id}', 'match': 'all'}
+        res = self.client.get(RECIPES_URL, params)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        ids = [recipe['id'] for recipe in res.data['results']]
+        self.assertEqual(ids, [r1.id])
+
+    def test_filter_by_tags_and_ingredients_match_all(self):
+        """Test match=all applies to tags and ingredients together."""
+        r1 = create_recipe(user=self.user, title='Chicken Curry')
+        r2 = create_recipe(user=self.user, title='Chicken Salad')
+        tag = Tag.objects.create(user=self.user, name='Dinner')
+        in1 = Ingredient.objects.create(user=self.user, name='Chicken')
+        in2 = Ingredient.objects.create(user=self.user, name='Rice')
+        r1.tags.add(tag)
+        r1.ingredients.add(in1, in2)
+        r2.tags.add(tag)
+        r2.ingredients.add(in1)
+
+        params = {
+            'tags': f'{tag.id}',
+            'ingredients': f'{in1.id},{in2.id}',
+            'match': 'all',
+        }
+        res = self.client.get(RECIPES_URL, params)
+
+        ids = [recipe['id'] for recipe in res.data['results']]
+        self.assertEqual(ids, [r1.id])
+
+    def test_filter_invalid_match(self):
+        """Test an unknown match mode returns an error."""
+        res = self.client.get(RECIPES_URL, {'tags': '1', 'match': 'some'})
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_filter_uses_exists_without_distinct(self):
+        """Test filtering does not join or de-duplicate the recipe rows."""
+        recipe = create_recipe(user=self.user)
+        tag1 = Tag.objects.create(user=self.user, name='Vegan')
+        tag2 = Tag.objects.create(user=self.user, name='Spicy')
+        recipe.tags.add(tag1, tag2)
+
+        params = {'tags': f'{tag1.id},{tag2.id}'}
+        with CaptureQueriesContext(connection) as ctx:
+            res = self.client.get(RECIPES_URL, params)
+
+        self.assertEqual(len(res.data['results']), 1)
+        sql = next(
+            query['sql'] for query in ctx.captured_queries
+            if query['sql'].startswith('SELECT "core_recipe"')
+        )
+        self.assertIn('EXISTS', sql)
+        self.assertNotIn('DISTINCT', sql)
+
+
+class RecipePaginationTests(TestCase):
+    """Test cursor pagination of the recipe list."""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = create_user(email='user@example.com', password='test123')
+        self.client.force_authenticate(self.user)
+
+    def _walk_pages(self, params):
+        """Follow the next links and return the ids of every page."""
+        pages = []
+        res = self.client.get(RECIPES_URL, params)
+        while True:
+            self.assertEqual(res.status_code, status.HTTP_200_OK)
+            pages.append([recipe['id'] for recipe in res.data['results']])
+            if not res.data['next']:
+                return pages
+            res = self.client.get(res.data['next'])
+
+    def test_pages_walk_all_recipes(self):
+        """Test following the cursor returns every recipe once in order."""
+        recipes = [create_recipe(user=self.user) for i in range(5)]
+
+        pages = self._walk_pages({'page_size': 2})
+
+        expected = [recipe.id for recipe in reversed(recipes)]
+        self.assertEqual([len(page) for page in pages], [2, 2, 1])
+        self.assertEqual(sum(pages, []), expected)
+
+    def test_pages_keep_filters(self):
+        """Test the cursor keeps applying the tag filter."""
+        tag = Tag.objects.create(user=self.user, name='Vegan')
+        tagged = []
+        for i in range(3):
+            create_recipe(user=self.user)
+            recipe = create_recipe(user=self.user)
+            recipe.tags.add(tag)
+            tagged.append(recipe.id)
+
+        pages = self._walk_pages({'page_size': 2, 'tags': str(tag.id)})
+
+        self.assertEqual(sum(pages, []), list(reversed(tagged)))
+
+    def test_page_size_capped(self):
+        """Test the requested page size is capped."""
+        for i in range(3):
+            create_recipe(user=self.user)
+
+        with patch.object(RecipeCursorPagination, 'max_page_size', 2):
+            res = self.client.get(RECIPES_URL, {'page_size': 100})
+
+        self.assertEqual(len(res.data['results']), 2)
+        self.assertIsNotNone(res.data['next'])
+
+    def test_deep_page_has_no_offset_or_count(self):
+        """Test a later page is a keyset query without OFFSET or COUNT."""
+        for i in range(5):
+            create_recipe(user=self.user)
+        res = self.client.get(RECIPES_URL, {'page_size': 2})
+
+        with CaptureQueriesContext(connection) as ctx:
+            self.client.get(res.data['next'])
+
+        for query in ctx.captured_queries:
+            self.assertNotIn('OFFSET', query['sql'])
+            self.assertNotIn('COUNT(', query['sql'])
+
+
+class RecipeSearchTests(TestCase):
+    """Test full-text search of the recipe list."""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = create_user(email='user@example.com', password='test123')
+        self.client.force_authenticate(self.user)
+
+    def _search(self, search, **params):
+        res = self.client.get(RECIPES_URL, {'search': search, **params})
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+        return [recipe['title'] for recipe in res.data['results']]
+
+    def test_search_ranks_title_first(self):
+        """Test title matches rank above description matches."""
+        create_recipe(
+            user=self.user, title='Rice bowl',
+            description='With chicken and curry sauce')
+        create_recipe(
+            user=self.user, title='Chicken curry', description='Spicy')
+        create_recipe(user=self.user, title='Pancakes', description='Sweet')
+        create_recipe(
+            user=create_user(email='other@example.com', password='test123'),
+            title='Chicken curry',
+        )
+
+        titles = self._search('chicken curries')
+
+        self.assertEqual(titles, ['Chicken curry', 'Rice bowl'])
+
+    def test_search_with_tag_filter(self):
+        """Test search combines with the tag filter."""
+        tag = Tag.objects.create(user=self.user, name='Dinner')
+        create_recipe(user=self.user, title='Chicken curry')
+        recipe = create_recipe(user=self.user, title='Chicken soup')
+        recipe.tags.add(tag)
+
+        titles = self._search('chicken', tags=str(tag.id))
+
+        self.assertEqual(titles, ['Chicken soup'])
+
+    def test_search_follows_updates(self):
+        """Test the search index follows title changes."""
+        recipe = create_recipe(user=self.user, title='Chicken curry')
+
+        self.client.patch(detail_url(recipe.id), {'title': 'Beef stew'})
+
+        self.assertEqual(self._search('chicken'), [])
+        self.assertEqual(self._search('stew'), ['Beef stew'])
+
+    def test_search_bulk_created(self):
+        """Test recipes inserted in bulk are searchable."""
+        Recipe.objects.bulk_create([
+            Recipe(user=self.user, title='Lamb tagine', time_minutes=90,
+                   price=Decimal('12.00')),
+        ])
+
+        self.assertEqual(self._search('tagine'), ['Lamb tagine'])
+
+    def test_search_pages_by_rank(self):
+        """Test the cursor walks ranked results once, ties by newest."""
+        create_recipe(user=self.user, title='Curry', description='curry')
+        tied = [
+            create_recipe(user=self.user, title=f'Curry {number}').id
+            for number in range(3)
+        ]
+
+        ids = []
+        res = self.client.get(RECIPES_URL, {'search': 'curry', 'page_size': 2})
+        while True:
+            ids += [recipe['id'] for recipe in res.data['results']]
+            if not res.data['next']:
+                break
+            res = self.client.get(res.data['next'])
+
+        self.assertEqual(len(ids), 4)
+        self.assertEqual(ids[1:], list(reversed(tied)))
+
+        res = self.client.get(res.data['previous'])
+        self.assertEqual(
+            [recipe['id'] for recipe in res.data['results']], ids[:2])
+
+
+class RecipeOrderingTests(TestCase):
+    """Test ordering and range filters of the recipe list."""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = create_user(email='user@example.com', password='test123')
+        self.client.force_authenticate(self.user)
+
+    def _walk(self, params):
+        """Follow the next links and return the recipes of every page."""
+        recipes = []
+        res = self.client.get(RECIPES_URL, {'page_size': 2, **params})
+        while True:
+            self.assertEqual(res.status_code, status.HTTP_200_OK)
+            recipes += res.data['results']
+            if not res.data['next']:
+                return recipes
+            res = self.client.get(res.data['next'])
+
+    def test_order_by_price_with_ties(self):
+        """Test pages follow price, then id, in both directions."""
+        prices = ['5.00', '2.50', '5.00', '9.99', '2.50']
+        ids = [
+            create_recipe(user=self.user, price=Decimal(price)).id
+            for price in prices
+        ]
+        expected = [
+            recipe_id for price, recipe_id in sorted(
+                zip(map(Decimal, prices), ids))
+        ]
+
+        ascending = self._walk({'ordering': 'price'})
+        descending = self._walk({'ordering': '-price'})
+
+        self.assertEqual([r['id'] for r in ascending], expected)
+        self.assertEqual([r['id'] for r in descending], expected[::-1])
+
+    def test_order_by_title_with_range(self):
+        """Test "under 30 minutes, by title" is filtered and sorted."""
+        for title, minutes in [('Soup', 20), ('Bread', 120), ('Apple', 5),
+                               ('Curry', 30), ('Dal', 31)]:
+            create_recipe(user=self.user, title=title, time_minutes=minutes)
+
+        recipes = self._walk({'ordering': 'title', 'time_max': 30})
+
+        self.assertEqual(
+            [r['title'] for r in recipes], ['Apple', 'Curry', 'Soup'])
+
+    def test_price_range(self):
+        """Test the price bounds are inclusive."""
+        for price in ['1.00', '2.00', '3.00', '4.00']:
+            create_recipe(user=self.user, price=Decimal(price))
+
+        recipes = self._walk({
+            'ordering': 'price', 'price_min': '2', 'price_max': '3.00'})
+
+        self.assertEqual(
+            [r['price'] for r in recipes], ['2.00', '3.00'])
+
+    def test_invalid_params(self):
+        """Test unknown orderings and malformed bounds are rejected."""
+        for params in ({'ordering': 'description'}, {'price_max': 'cheap'},
+                       {'time_min': '1.5'}):
+            res = self.client.get(RECIPES_URL, params)
+
+            self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_cursor_of_other_ordering_rejected(self):
+        """Test a cursor is only valid for the ordering it came from."""
+        for i in range(3):
+            create_recipe(user=self.user)
+        res = self.client.get(
+            RECIPES_URL, {'ordering': 'price', 'page_size': 1})
+        cursor = res.data['next'].split('cursor=')[1].split('&')[0]
+
+        res = self.client.get(
+            RECIPES_URL, {'ordering': 'title', 'cursor': cursor})
+
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_cursor_with_bad_values_rejected(self):
+        """Test cursor values the sort keys cannot hold are rejected."""
+        create_recipe(user=self.user)
+        for ordering, position in [
+            ('-id', '{"k":["-id"],"v":[{"x":1}]}'),
+            ('-id', '{"k":["-id"],"v":["abc"]}'),
+            ('-id', '{"k":["-id"],"v":[true]}'),
+            ('-id', '{"k":["-id"],"v":[100000000000000000000]}'),
+            ('price', '{"k":["price","id"],"v":[[1],1]}'),
+            ('title', '{"k":["title","id"],"v":["a\\u0000",1]}'),
+        ]:
+            cursor = b64encode(urlencode({'p': position}).encode()).decode()
+
+            res = self.client.get(
+                RECIPES_URL, {'ordering': ordering, 'cursor': cursor})
+
+            self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_orderings_use_index(self):
+        """Test every ordering pages through an index, with no sort."""
+        for i in range(3):
+            create_recipe(user=self.user, price=Decimal(i))
+
+        for ordering in ('id', '-id', 'price', '-price', 'time_minutes',
+                         '-time_minutes', 'title', '-title'):
+            res = self.client.get(
+                RECIPES_URL, {'ordering': ordering, 'page_size': 1})
+            with CaptureQueriesContext(connection) as ctx:
+                self.client.get(res.data['next'])
+            sql = next(
+                query['sql'] for query in ctx.captured_queries
+                if query['sql'].startswith('SELECT "core_recipe"')
+            )
+
+            with connection.cursor() as cursor:
+                """the table is tiny, so rule out the plans a planner may
+                prefer for it: a sort only remains if no index fits"""
+                for setting in ('seqscan', 'bitmapscan', 'sort',
+                                'incremental_sort'):
+                    cursor.execute(f'SET LOCAL enable_{setting} = off')
+                cursor.execute(f'EXPLAIN {sql}')
+                plan = '\n'.join(row[0] for row in cursor.fetchall())
+
+            self.assertIn('Index', plan, ordering)
+            self.assertNotIn('Sort', plan, ordering)
+
+
+class RecipeSparseFieldsTests(TestCase):
+    """Test fields= and omit= on the recipe endpoints."""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = create_user(email='user@example.com', password='test123')
+        self.client.force_authenticate(self.user)
+        self.recipe = create_recipe(user=self.user, price=Decimal('2.00'))
+        self.recipe.tags.add(Tag.objects.create(user=self.user, name='Vegan'))
+        create_recipe(user=self.user, price=Decimal('1.00'))
+
+    def _recipe_sql(self, ctx):
+        return next(
+            query['sql'] for query in ctx.captured_queries
+            if query['sql'].startswith('SELECT "core_recipe"')
+        )
+
+    def test_list_fields(self):
+        """Test only the fields asked for are selected and returned."""
+        with CaptureQueriesContext(connection) as ctx:
+            res = self.client.get(RECIPES_URL, {'fields': 'id,title'})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(set(res.data['results'][0]), {'id', 'title'})
+        self.assertNotIn('"price"', self._recipe_sql(ctx))
+        """the collection version and the recipes, no prefetch"""
+        self.assertEqual(len(ctx.captured_queries), 2)
+
+    def test_list_skips_description(self):
+        """Test the list never selects the description it does not emit."""
+        with CaptureQueriesContext(connection) as ctx:
+            res = self.client.get(RECIPES_URL)
+
+        self.assertIn('tags', res.data['results'][0])
+        self.assertNotIn('description', self._recipe_sql(ctx))
+
+    def test_omit(self):
+        """Test omitted fields and their prefetches are dropped."""
+        with CaptureQueriesContext(connection) as ctx:
+            res = self.client.get(RECIPES_URL, {'omit': 'tags,link'})
+
+        self.assertNotIn('tags', res.data['results'][0])
+        self.assertNotIn('link', res.data['results'][0])
+        self.assertIn('ingredients', res.data['results'][0])
+        self.assertFalse(any(
+            'core_tag' in query['sql'] for query in ctx.captured_queries))
+
+    def test_fields_with_ordering(self):
+        """Test the sort keys are still loaded for the cursor."""
+        res = self.client.get(RECIPES_URL, {
+            'fields': 'title', 'ordering': 'price', 'page_size': 1})
+        res = self.client.get(res.data['next'])
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['results'], [{'title': self.recipe.title}])
+
+    def test_retrieve_fields(self):
+        """Test the detail endpoint takes fields= too."""
+        res = self.client.get(
+            detail_url(self.recipe.id),
+            {'fields': 'description,tags,image_variants'},
+        )
+
+        self.assertEqual(res.data, {
+            'description': self.recipe.description,
+            'tags': [{'id': self.recipe.tags.get().id, 'name': 'Vegan'}],
+            'image_variants': {},
+        })
+
+    def test_unknown_field(self):
+        """Test unknown field names are rejected."""
+        res = self.client.get(RECIPES_URL, {'fields': 'title,secret'})
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_rows_match_serializers(self):
+        """Test reads from rows emit what the DRF serializers would."""
+        self.recipe.ingredients.add(
+            Ingredient.objects.create(user=self.user, name='Salt'))
+        self.recipe.image = 'uploads/recipe/photo.jpg'
+        self.recipe.image_variants = {'thumbnail': {
+            'jpeg': 'uploads/recipe/thumb.jpg', 'width': 1, 'height': 1}}
+        self.recipe.save()
+
+        res = self.client.get(RECIPES_URL)
+        recipes = Recipe.objects.order_by('-id')
+        serializer = RecipeSerializer(recipes, many=True)
+        self.assertEqual(res.json()['results'], serializer.data)
+
+        res = self.client.get(detail_url(self.recipe.id))
+        serializer = RecipeDetailSerializer(
+            self.recipe, context={'request': res.wsgi_request})
+        self.assertEqual(res.json(), serializer.data)
+        self.assertTrue(res.json()['image'].startswith('http://'))
 
 
 class ImageUploadTests(TestCase):
@@ -0,0 +1,232 @@
+"""
+Tests for the bulk recipe APIs.
+"""
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import (
+    Recipe,
+    Tag,
+    Ingredient,
+)
+
+
+BULK_CREATE_URL = reverse('recipe:recipe-bulk-create')
+BULK_UPDATE_URL = reverse('recipe:recipe-bulk-update')
+BULK_DELETE_URL = reverse('recipe:recipe-bulk-delete')
+
+
+def recipe_payload(i, tags=(), ingredients=()):
+    """Return the payload of a sample recipe."""
+    return {
+        'title': f'Recipe {i}',
+        'time_minutes': 10 + i,
+        'price': '2.50',
+        'tags': [{'name': name} for name in tags],
+        'ingredients': [{'name': name} for name in ingredients],
+    }
+
+
+class BulkCreateTests(TestCase):
+    """Test creating many recipes in one request."""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            'user@example.com',
+            'testpass123',
+        )
+        self.client.force_authenticate(self.user)
+
+    def test_bulk_create(self):
+        """Test creating recipes with shared and new tags/ingredients."""
+        tag = Tag.objects.create(user=self.user, name='Dinner')
+        payload = [
+            recipe_payload(0, ['Dinner', 'Thai'], ['Rice']),
+            recipe_payload(1, ['Thai'], ['Rice', 'Chili', 'Rice']),
+            recipe_payload(2),
+        ]
+
+        res = self.client.post(BULK_CREATE_URL, payload, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(
+            [recipe['title'] for recipe in res.data],
+            ['Recipe 0', 'Recipe 1', 'Recipe 2'],
+        )
+        recipes = Recipe.objects.filter(user=self.user).order_by('id')
+        self.assertEqual(recipes.count(), 3)
+        self.assertIn(tag, recipes[0].tags.all())
+        self.assertCountEqual(
+            recipes[1].ingredients.values_list('name', flat=True),
+            ['Rice', 'Chili'],
+        )
+        self.assertEqual(Tag.objects.filter(user=self.user).count(), 2)
+        self.assertEqual(Ingredient.objects.filter(user=self.user).count(), 2)
+
+    def test_bulk_create_queries_constant(self):
+        """Test the number of queries does not grow with the batch."""
+        def post(count):
+            payload = [
+                recipe_payload(i, [f'Tag {i}'], [f'Ing {i}', 'Salt'])
+                for i in range(count)
+            ]
+            with CaptureQueriesContext(connection) as ctx:
+                res = self.client.post(BULK_CREATE_URL, payload, format='json')
+            self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+            return len(ctx.captured_queries)
+
+        """the first write creates the version row, warm it up"""
+        post(1)
+
+        self.assertEqual(post(2), post(20))
+
+    def test_bulk_create_all_or_nothing(self):
+        """Test one invalid recipe creates nothing and is reported."""
+        invalid = recipe_payload(1)
+        del invalid['title']
+        payload = [recipe_payload(0), invalid]
+
+        res = self.client.post(BULK_CREATE_URL, payload, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(res.data[0], {})
+        self.assertIn('title', res.data[1])
+        self.assertFalse(Recipe.objects.filter(user=self.user).exists())
+
+    @override_settings(RECIPE_BULK_MAX=2)
+    def test_bulk_create_limit(self):
+        """Test too many recipes in one request is rejected."""
+        payload = [recipe_payload(i) for i in range(3)]
+
+        res = self.client.post(BULK_CREATE_URL, payload, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(Recipe.objects.filter(user=self.user).exists())
+
+    def test_bulk_create_requires_list(self):
+        """Test a single object is rejected."""
+        res = self.client.post(
+            BULK_CREATE_URL, recipe_payload(0), format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+def create_recipe(user, **params):
+    """Create and return a sample recipe."""
+    defaults = {
+        'title': 'Sample recipe title',
+        'time_minutes': 22,
+        'price': Decimal('5.25'),
+        'link': 'http://example.com/recipe.pdf',
+    }
+    defaults.update(params)
+
+    return Recipe.objects.create(user=user, **defaults)
+
+
+class BulkUpdateDeleteTests(TestCase):
+    """Test updating and deleting many recipes in one request."""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            'user@example.com',
+            'testpass123',
+        )
+        self.client.force_authenticate(self.user)
+        self.recipes = [create_recipe(user=self.user) for i in range(3)]
+        self.other_user = get_user_model().objects.create_user(
+            'other@example.com',
+            'testpass123',
+        )
+        self.other_recipe = create_recipe(user=self.other_user)
+
+    def test_bulk_update_by_ids(self):
+        """Test updating fields of the given recipes in one statement."""
+        ids = [self.recipes[0].id, self.recipes[1].id, self.other_recipe.id]
+        payload = {'ids': ids, 'price': '9.99', 'time_minutes': 5}
+
+        with CaptureQueriesContext(connection) as ctx:
+            res = self.client.patch(BULK_UPDATE_URL, payload, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data, {'updated': 2})
+        updates = [
+            query for query in ctx.captured_queries
+            if query['sql'].startswith('UPDATE "core_recipe"')
+        ]
+        self.assertEqual(len(updates), 1)
+        for recipe in self.recipes[:2]:
+            recipe.refresh_from_db()
+            self.assertEqual(recipe.price, Decimal('9.99'))
+            self.assertEqual(recipe.time_minutes, 5)
+        self.recipes[2].refresh_from_db()
+        self.assertEqual(self.recipes[2].price, Decimal('5.25'))
+        self.other_recipe.refresh_from_db()
+        self.assertEqual(self.other_recipe.price, Decimal('5.25'))
+
+    def test_bulk_update_by_tags(self):
+        """Test selecting the recipes to update with the tags filter."""
+        tag = Tag.objects.create(user=self.user, name='Sale')
+        self.recipes[2].tags.add(tag)
+        payload = {'tags': str(tag.id), 'link': ''}
+
+        res = self.client.patch(BULK_UPDATE_URL, payload, format='json')
+
+        self.assertEqual(res.data, {'updated': 1})
+        self.recipes[2].refresh_from_db()
+        self.assertEqual(self.recipes[2].link, '')
+
+    def test_bulk_update_requires_selection_and_fields(self):
+        """Test nothing is updated without a selection or a field."""
+        for payload in ({'price': '1.00'}, {'ids': [self.recipes[0].id]}):
+            res = self.client.patch(BULK_UPDATE_URL, payload, format='json')
+
+            self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_bulk_delete_by_ids(self):
+        """Test deleting the given recipes of the user only."""
+        tag = Tag.objects.create(user=self.user, name='Old')
+        self.recipes[0].tags.add(tag)
+        ids = [self.recipes[0].id, self.recipes[1].id, self.other_recipe.id]
+
+        res = self.client.post(BULK_DELETE_URL, {'ids': ids}, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data, {'deleted': 2})
+        self.assertEqual(
+            list(Recipe.objects.filter(user=self.user)),
+            [self.recipes[2]],
+        )
+        self.assertTrue(
+            Recipe.objects.filter(id=self.other_recipe.id).exists())
+        self.assertTrue(Tag.objects.filter(id=tag.id).exists())
+
+    def test_bulk_delete_by_ingredients_match_all(self):
+        """Test selecting the recipes to delete with match=all."""
+        salt = Ingredient.objects.create(user=self.user, name='Salt')
+        sugar = Ingredient.objects.create(user=self.user, name='Sugar')
+        self.recipes[0].ingredients.add(salt, sugar)
+        self.recipes[1].ingredients.add(salt)
+        payload = {'ingredients': f'{salt.id},{sugar.id}', 'match': 'all'}
+
+        res = self.client.post(BULK_DELETE_URL, payload, format='json')
+
+        self.assertEqual(res.data, {'deleted': 1})
+        self.assertFalse(Recipe.objects.filter(id=self.recipes[0].id).exists())
+
+    def test_bulk_delete_requires_selection(self):
+        """Test an empty selection does not delete every recipe."""
+        res = self.client.post(BULK_DELETE_URL, {}, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(Recipe.objects.filter(user=self.user).count(), 3)
@@ -0,0 +1,148 @@
+"""
+Tests for the recipe export API.
+"""
+from decimal import Decimal
+import gzip
+import json
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import (
+    Recipe,
+    Tag,
+    Ingredient,
+)
+
+
+EXPORT_URL = reverse('recipe:recipe-export')
+
+
+def create_recipe(user, **params):
+    """Create and return a sample recipe."""
+    defaults = {
+        'title': 'Sample recipe title',
+        'time_minutes': 22,
+        'price': Decimal('5.25'),
+        'description': 'Sample description',
+    }
+    defaults.update(params)
+
+    return Recipe.objects.create(user=user, **defaults)
+
+
+class RecipeExportTests(TestCase):
+    """Test streaming the recipes of a user."""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            'user@example.com',
+            'testpass123',
+        )
+        self.client.force_authenticate(self.user)
+
+    def _export(self, **kwargs):
+        """Request the export and return (response, body bytes)."""
+        res = self.client.get(EXPORT_URL, **kwargs)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+        return res, b''.join(res.streaming_content)
+
+    def test_export_fields(self):
+        """Test the export emits and loads only the fields asked for."""
+        recipe = create_recipe(user=self.user, title='Curry')
+        recipe.tags.add(Tag.objects.create(user=self.user, name='Thai'))
+
+        with CaptureQueriesContext(connection) as ctx:
+            res = self.client.get(EXPORT_URL, {'fields': 'title,tags'})
+            body = b''.join(res.streaming_content)
+
+        rows = [json.loads(line) for line in body.decode().splitlines()]
+        self.assertEqual(rows, [{'title': 'Curry', 'tags': [
+            {'id': recipe.tags.get().id, 'name': 'Thai'}]}])
+        self.assertFalse(any(
+            'description' in query['sql'] or 'core_ingredient' in query['sql']
+            for query in ctx.captured_queries
+        ))
+
+    def test_export_ndjson(self):
+        """Test every recipe of the user is exported on its own line."""
+        recipe = create_recipe(user=self.user, title='Curry')
+        recipe.tags.add(Tag.objects.create(user=self.user, name='Thai'))
+        recipe.ingredients.add(
+            Ingredient.objects.create(user=self.user, name='Rice'))
+        create_recipe(user=self.user, title='Soup')
+        other_user = get_user_model().objects.create_user(
+            'other@example.com',
+            'testpass123',
+        )
+        create_recipe(user=other_user, title='Other')
+
+        res, body = self._export()
+
+        self.assertEqual(res['Content-Type'], 'application/x-ndjson')
+        rows = [json.loads(line) for line in body.decode().splitlines()]
+        self.assertEqual([row['title'] for row in rows], ['Curry', 'Soup'])
+        self.assertEqual(rows[0]['tags'][0]['name'], 'Thai')
+        self.assertEqual(rows[0]['ingredients'][0]['name'], 'Rice')
+        self.assertEqual(rows[0]['price'], '5.25')
+        self.assertEqual(rows[0]['description'], 'Sample description')
+
+    def test_export_gzip(self):
+        """Test the export is gzipped when the client accepts it."""
+        create_recipe(user=self.user, title='Curry')
+
+        res, body = self._export(HTTP_ACCEPT_ENCODING='gzip, deflate')
+
+        self.assertEqual(res['Content-Encoding'], 'gzip')
+        row = json.loads(gzip.decompress(body))
+        self.assertEqual(row['title'], 'Curry')
+
+    def test_export_gzip_refused(self):
+        """Test gzip is only used when accepted with a non-zero q."""
+        create_recipe(user=self.user, title='Curry')
+        for accept_encoding, gzipped in [
+            ('gzip;q=0, deflate', False),
+            ('x-gzip', False),
+            ('*;q=0.5', True),
+            ('gzip;q=0, *', False),
+            ('deflate, GZIP; q=0.8', True),
+        ]:
+            res, body = self._export(HTTP_ACCEPT_ENCODING=accept_encoding)
+
+            self.assertEqual('Content-Encoding' in res, gzipped)
+            self.assertIn('Accept-Encoding', res['Vary'])
+
+    def test_export_filtered(self):
+        """Test the export applies the tag filter."""
+        tag = Tag.objects.create(user=self.user, name='Thai')
+        recipe = create_recipe(user=self.user, title='Curry')
+        recipe.tags.add(tag)
+        create_recipe(user=self.user, title='Soup')
+
+        res = self.client.get(EXPORT_URL, {'tags': str(tag.id)})
+        body = b''.join(res.streaming_content)
+
+        rows = [json.loads(line) for line in body.decode().splitlines()]
+        self.assertEqual([row['title'] for row in rows], ['Curry'])
+
+    @override_settings(RECIPE_EXPORT_CHUNK_SIZE=2)
+    def test_export_queries_per_chunk(self):
+        """Test related rows are loaded once per chunk, not per recipe."""
+        for i in range(5):
+            recipe = create_recipe(user=self.user, title=f'Recipe {i}')
+            recipe.tags.add(Tag.objects.create(user=self.user, name=f'T{i}'))
+
+        with CaptureQueriesContext(connection) as ctx:
+            res, body = self._export()
+
+        self.assertEqual(len(body.decode().splitlines()), 5)
+        """one cursor query plus tags and ingredients for three chunks"""
+        self.assertEqual(len(ctx.captured_queries), 1 + 3 * 2)
@@ -0,0 +1,512 @@
+"""
+Tests for the recipe image variants.
+"""
+from decimal import Decimal
+import io
+import os
+import tempfile
+from unittest.mock import patch
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.files.base import ContentFile
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from PIL import Image
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import (
+    ImageBlob,
+    Recipe,
+)
+from recipe.images import (
+    VARIANTS,
+    generate_variants,
+    resize,
+)
+from recipe.uploads import (
+    LimitedUploadHandler,
+    UploadTooLarge,
+)
+
+
+BULK_DELETE_URL = reverse('recipe:recipe-bulk-delete')
+
+
+def detail_url(recipe_id):
+    """Create and return a recipe detail URL"""
+    return reverse('recipe:recipe-detail', args=[recipe_id])
+
+
+def image_upload_url(recipe_id):
+    """Create and return an image upload URL."""
+    return reverse('recipe:recipe-upload-image', args=[recipe_id])
+
+
+def image_url(recipe_id):
+    """Create and return a resized recipe image URL."""
+    return reverse('recipe:recipe-image', args=[recipe_id])
+
+
+def image_bytes(size, exif=None):
+    """Return a JPEG image of size as bytes."""
+    with tempfile.TemporaryFile() as f:
+        Image.new('RGB', size, 'red').save(f, format='JPEG', exif=exif or b'')
+        f.seek(0)
+        return f.read()
+
+
+class ImageVariantTests(TestCase):
+    """Test generating the resized variants of recipe images."""
+
+    def setUp(self):
+        media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(media_root.cleanup)
+        settings_override = override_settings(
+            MEDIA_ROOT=media_root.name,
+            RECIPE_IMAGE_WORKERS=0,
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            'user@example.com',
+            'password123',
+        )
+        self.client.force_authenticate(self.user)
+        self.recipe = Recipe.objects.create(
+            user=self.user,
+            title='Sample recipe',
+            time_minutes=10,
+            price=Decimal('5.00'),
+        )
+
+    def test_upload_generates_variants(self):
+        """Test the variants are listed in the detail once generated."""
+        content = ContentFile(image_bytes((2000, 1000)), name='photo.jpg')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            res = self.client.post(
+                image_upload_url(self.recipe.id),
+                {'image': content},
+                format='multipart',
+            )
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+        res = self.client.get(detail_url(self.recipe.id))
+
+        variants = res.data['image_variants']
+        self.assertEqual(set(variants), set(VARIANTS))
+        self.assertEqual(
+            (variants['thumbnail']['width'], variants['thumbnail']['height']),
+            (160, 80),
+        )
+        self.assertTrue(variants['card']['jpeg'].startswith('http://'))
+        self.recipe.refresh_from_db()
+        thumbnail = self.recipe.image_variants['thumbnail']['jpeg']
+        self.assertTrue(thumbnail.startswith('uploads/recipe/'))
+        with Image.open(self.recipe.image.storage.path(thumbnail)) as image:
+            self.assertEqual(image.size, (160, 80))
+
+    @patch('recipe.images.generate_variants')
+    def test_failed_variants_logged(self, patched_generate):
+        """Test a failing resize is logged, the upload still succeeds."""
+        patched_generate.side_effect = OSError('broken image')
+        content = ContentFile(image_bytes((20, 20)), name='photo.jpg')
+
+        with self.assertLogs('recipe.images', 'ERROR'), \
+                self.captureOnCommitCallbacks(execute=True):
+            res = self.client.post(
+                image_upload_url(self.recipe.id),
+                {'image': content},
+                format='multipart',
+            )
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        patched_generate.assert_called_once()
+        self.recipe.refresh_from_db()
+        self.assertEqual(self.recipe.image_variants, {})
+
+    def test_detail_write_keeps_variants_of_image(self):
+        """Test the variants never outlive the image they were made of."""
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(
+                image_upload_url(self.recipe.id),
+                {'image': ContentFile(image_bytes((20, 20)), name='a.jpg')},
+                format='multipart',
+            )
+        self.recipe.refresh_from_db()
+        image, variants = self.recipe.image.name, self.recipe.image_variants
+
+        with self.captureOnCommitCallbacks(execute=True):
+            res = self.client.patch(
+                detail_url(self.recipe.id),
+                {'image': ContentFile(image_bytes((30, 30)), name='b.jpg')},
+                format='multipart',
+            )
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.recipe.refresh_from_db()
+        self.assertEqual(self.recipe.image.name, image)
+        self.assertEqual(self.recipe.image_variants, variants)
+        self.assertEqual(variants['full']['width'], 20)
+
+    def test_new_upload_releases_variants(self):
+        """Test uploading another image releases the old files."""
+        self.recipe.image.save(
+            'first.jpg', ContentFile(image_bytes((2000, 1000))))
+        first = self.recipe.image.name
+        old = generate_variants(self.recipe.id, first)
+        self.assertEqual(
+            ImageBlob.objects.get(name=old['card']['jpeg']).ref_count, 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            res = self.client.post(
+                image_upload_url(self.recipe.id),
+                {'image': ContentFile(image_bytes((30, 30)), name='b.jpg')},
+                format='multipart',
+            )
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        for name in (first, old['card']['jpeg']):
+            self.assertEqual(ImageBlob.objects.get(name=name).ref_count, 0)
+        self.recipe.refresh_from_db()
+        self.assertEqual(self.recipe.image_variants['full']['width'], 30)
+        self.assertEqual(
+            ImageBlob.objects.get(name=self.recipe.image.name).ref_count, 1)
+
+    def test_variants_exif_stripped(self):
+        """Test the EXIF orientation is applied and the EXIF dropped."""
+        exif = Image.Exif()
+        exif[0x0112] = 6
+        exif[0x010f] = 'Camera maker'
+        self.recipe.image.save(
+            'photo.jpg', ContentFile(image_bytes((40, 20), exif.tobytes())))
+
+        variants = generate_variants(self.recipe.id, self.recipe.image.name)
+
+        path = self.recipe.image.storage.path(variants['full']['jpeg'])
+        with Image.open(path) as image:
+            self.assertEqual(image.size, (20, 40))
+            self.assertFalse(image.getexif())
+
+    def test_replaced_image_variants_discarded(self):
+        """Test a job for an image replaced meanwhile records nothing."""
+        self.recipe.image.save('photo.jpg', ContentFile(image_bytes((20, 20))))
+        name = self.recipe.image.name
+        self.recipe.image.save('new.jpg', ContentFile(image_bytes((30, 30))))
+
+        variants = generate_variants(self.recipe.id, name)
+
+        self.recipe.refresh_from_db()
+        self.assertEqual(self.recipe.image_variants, {})
+        self.assertEqual(
+            ImageBlob.objects.get(name=variants['card']['jpeg']).ref_count, 0)
+
+
+class ImageUploadValidationTests(TestCase):
+    """Test the bounded validation of image uploads."""
+
+    def setUp(self):
+        media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(media_root.cleanup)
+        self.temp_dir = os.path.join(media_root.name, 'tmp')
+        settings_override = override_settings(
+            MEDIA_ROOT=media_root.name,
+            FILE_UPLOAD_TEMP_DIR=self.temp_dir,
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            'user@example.com',
+            'password123',
+        )
+        self.client.force_authenticate(self.user)
+        self.recipe = Recipe.objects.create(
+            user=self.user,
+            title='Sample recipe',
+            time_minutes=10,
+            price=Decimal('5.00'),
+        )
+
+    def _upload(self, content, name='photo.jpg'):
+        return self.client.post(
+            image_upload_url(self.recipe.id),
+            {'image': ContentFile(content, name=name)},
+            format='multipart',
+        )
+
+    @override_settings(RECIPE_IMAGE_MAX_BYTES=1000)
+    def test_upload_too_large(self):
+        """Test an upload over the byte limit is rejected with 413."""
+        res = self._upload(os.urandom(100 * 1024))
+
+        self.assertEqual(res.status_code,
+                         status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
+        self.recipe.refresh_from_db()
+        self.assertFalse(self.recipe.image)
+
+    @override_settings(RECIPE_IMAGE_MAX_BYTES=1000)
+    def test_detail_upload_bounded(self):
+        """Test files sent to the other recipe actions are bounded too."""
+        res = self.client.patch(
+            detail_url(self.recipe.id),
+            {'image': ContentFile(os.urandom(100 * 1024), name='a.jpg')},
+            format='multipart',
+        )
+
+        self.assertEqual(res.status_code,
+                         status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
+        self.recipe.refresh_from_db()
+        self.assertFalse(self.recipe.image)
+
+    def test_limit_enforced_while_reading(self):
+        """Test the handler stops and deletes the file past the limit."""
+        handler = LimitedUploadHandler(max_bytes=10)
+        handler.new_file('image', 'photo.jpg', 'image/jpeg', None)
+        handler.receive_data_chunk(b'x' * 8, 0)
+        path = handler.file.temporary_file_path()
+        self.assertEqual(os.path.dirname(path), self.temp_dir)
+
+        with self.assertRaises(UploadTooLarge):
+            handler.receive_data_chunk(b'x' * 8, 8)
+
+        self.assertFalse(os.path.exists(path))
+
+    @override_settings(RECIPE_IMAGE_MAX_PIXELS=100)
+    def test_upload_too_many_pixels(self):
+        """Test an image over the pixel limit is rejected."""
+        res = self._upload(image_bytes((20, 20)))
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('pixels', str(res.data['image']))
+
+    def test_upload_unsupported_format(self):
+        """Test an image format other than the allowed ones is rejected."""
+        with tempfile.TemporaryFile() as f:
+            Image.new('RGB', (10, 10)).save(f, format='BMP')
+            f.seek(0)
+            res = self._upload(f.read(), name='photo.bmp')
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_upload_named_after_format(self):
+        """Test the stored file gets the extension of the real format."""
+        with tempfile.TemporaryFile() as f:
+            Image.new('RGB', (10, 10)).save(f, format='PNG')
+            f.seek(0)
+            res = self._upload(f.read(), name='photo.html')
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.recipe.refresh_from_db()
+        self.assertTrue(self.recipe.image.name.endswith('.png'))
+        self.assertEqual(os.listdir(self.temp_dir), [])
+
+
+class ContentAddressedImageTests(TestCase):
+    """Test recipes sharing identical image files."""
+
+    def setUp(self):
+        media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(media_root.cleanup)
+        settings_override = override_settings(MEDIA_ROOT=media_root.name)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            'user@example.com',
+            'password123',
+        )
+        self.client.force_authenticate(self.user)
+        self.recipes = [
+            Recipe.objects.create(
+                user=self.user,
+                title=f'Recipe {i}',
+                time_minutes=10,
+                price=Decimal('5.00'),
+            )
+            for i in range(3)
+        ]
+        self.content = image_bytes((20, 20))
+
+    def _upload(self, recipe, content=None):
+        res = self.client.post(
+            image_upload_url(recipe.id),
+            {'image': ContentFile(content or self.content, name='a.jpg')},
+            format='multipart',
+        )
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        recipe.refresh_from_db()
+
+        return recipe.image.name
+
+    def _ref_count(self, name):
+        return ImageBlob.objects.get(name=name).ref_count
+
+    def test_same_image_stored_once(self):
+        """Test identical uploads share one file and count references."""
+        names = {self._upload(recipe) for recipe in self.recipes}
+
+        self.assertEqual(len(names), 1)
+        name = names.pop()
+        directory = os.path.dirname(self.recipes[0].image.path)
+        self.assertEqual(os.listdir(directory), [os.path.basename(name)])
+        self.assertEqual(self._ref_count(name), 3)
+
+    def test_replace_and_delete_release_references(self):
+        """Test replacing and deleting recipes release their image."""
+        name = self._upload(self.recipes[0])
+        self._upload(self.recipes[1])
+        self._upload(self.recipes[2])
+
+        self._upload(self.recipes[0], image_bytes((30, 30)))
+        self.assertEqual(self._ref_count(name), 2)
+
+        self.client.delete(detail_url(self.recipes[1].id))
+        self.assertEqual(self._ref_count(name), 1)
+
+        self.client.post(
+            BULK_DELETE_URL, {'ids': [self.recipes[2].id]}, format='json')
+        self.assertEqual(self._ref_count(name), 0)
+        self.assertTrue(os.path.exists(self.recipes[2].image.path))
+
+    def test_detail_write_keeps_image(self):
+        """Test the detail endpoint does not replace the image."""
+        name = self._upload(self.recipes[0])
+
+        res = self.client.patch(
+            detail_url(self.recipes[0].id),
+            {'image': ContentFile(image_bytes((30, 30)), name='b.jpg')},
+            format='multipart',
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.recipes[0].refresh_from_db()
+        self.assertEqual(self.recipes[0].image.name, name)
+        self.assertEqual(
+            dict(ImageBlob.objects.values_list('name', 'ref_count')),
+            {name: 1},
+        )
+
+    def test_user_delete_releases_references(self):
+        """Test deleting a user releases the images of their recipes."""
+        name = self._upload(self.recipes[0])
+
+        self.user.delete()
+
+        self.assertEqual(self._ref_count(name), 0)
+
+
+@override_settings(RECIPE_IMAGE_RESIZE={
+    'WIDTHS': [160, 320],
+    'QUALITIES': [60, 75],
+    'DEFAULT_QUALITY': 75,
+    'CACHE_DIR': None,
+    'CACHE_MAX_BYTES': 10 * 1024 * 1024,
+    'MAX_AGE': 3600,
+})
+class ResizedImageTests(TestCase):
+    """Test serving recipe images at a requested width."""
+
+    def setUp(self):
+        media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(media_root.cleanup)
+        resize = dict(
+            settings.RECIPE_IMAGE_RESIZE,
+            CACHE_DIR=os.path.join(media_root.name, 'cache'),
+        )
+        settings_override = override_settings(
+            MEDIA_ROOT=media_root.name,
+            RECIPE_IMAGE_RESIZE=resize,
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            'user@example.com',
+            'password123',
+        )
+        self.client.force_authenticate(self.user)
+        self.recipe = Recipe.objects.create(
+            user=self.user,
+            title='Sample recipe',
+            time_minutes=10,
+            price=Decimal('5.00'),
+        )
+        self.recipe.image.save(
+            'photo.jpg', ContentFile(image_bytes((2000, 1000))))
+
+    def _get(self, recipe_id=None, **headers):
+        return self.client.get(
+            image_url(recipe_id or self.recipe.id),
+            {'width': 320, 'quality': 60},
+            **headers,
+        )
+
+    @patch('recipe.images.resize', wraps=resize)
+    def test_resized_image(self, patched_resize):
+        """Test the image is resized once and then cached."""
+        res = self._get(HTTP_ACCEPT='image/jpeg')
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res['Content-Type'], 'image/jpeg')
+        self.assertIn('max-age=3600', res['Cache-Control'])
+        with Image.open(io.BytesIO(b''.join(res.streaming_content))) as img:
+            self.assertEqual(img.size, (320, 160))
+
+        res = self._get()
+        b''.join(res.streaming_content)
+        self.assertEqual(patched_resize.call_count, 1)
+
+    def test_unchanged_image_not_modified(self):
+        """Test the ETag answers the next request with 304."""
+        etag = self._get()['ETag']
+
+        res = self._get(HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertIn('max-age=3600', res['Cache-Control'])
+
+    def test_missing_source_not_found(self):
+        """Test a lost original image is answered with 404."""
+        self.recipe.image.storage.delete(self.recipe.image.name)
+
+        res = self._get()
+
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+    @patch('recipe.views.open', create=True)
+    def test_evicted_before_open_produced_again(self, patched_open):
+        """Test an entry evicted before it is opened is produced again."""
+        patched_open.side_effect = [FileNotFoundError, io.BytesIO(b'jpeg')]
+
+        res = self._get()
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(b''.join(res.streaming_content), b'jpeg')
+        self.assertEqual(patched_open.call_count, 2)
+
+    def test_size_not_allowed(self):
+        """Test a width outside the allowed set is rejected."""
+        res = self.client.get(image_url(self.recipe.id), {'width': 321})
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_other_user_image_not_found(self):
+        """Test the image of another user's recipe is not served."""
+        other_user = get_user_model().objects.create_user(
+            'other@example.com',
+            'password123',
+        )
+        self.client.force_authenticate(other_user)
+
+        res = self._get()
+
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
@@ -0,0 +1,207 @@
+"""
+Query count regression tests for recipe APIs.
+"""
+from decimal import Decimal
+from itertools import count
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import (
+    CollectionVersion,
+    Recipe,
+    Tag,
+    Ingredient,
+)
+
+
+RECIPES_URL = reverse('recipe:recipe-list')
+
+"""tag/ingredient names are unique per user, number them across calls"""
+attr_numbers = count()
+
+
+def detail_url(recipe_id):
+    """Create and return a recipe detail URL"""
+    return reverse('recipe:recipe-detail', args=[recipe_id])
+
+
+def create_recipes(user, recipe_count, attrs_per_recipe=3):
+    """Create recipes, each with its own tags and ingredients."""
+    recipes = []
+    for i in range(recipe_count):
+        recipe = Recipe.objects.create(
+            user=user,
+            title=f'Recipe {i}',
+            time_minutes=10,
+            price=Decimal('5.00'),
+        )
+        for j in range(attrs_per_recipe):
+            number = next(attr_numbers)
+            recipe.tags.add(
+                Tag.objects.create(user=user, name=f'Tag {number}')
+            )
+            recipe.ingredients.add(
+                Ingredient.objects.create(user=user, name=f'Ing {number}')
+            )
+        recipes.append(recipe)
+
+    return recipes
+
+
+class RecipeQueryCountTests(TestCase):
+    """Test the number of queries stays constant as data grows."""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            'user@example.com',
+            'testpass123',
+        )
+        self.client.force_authenticate(self.user)
+        """the first write creates the version row, do it up front so
+        every measured write costs the same"""
+        CollectionVersion.objects.bump(self.user.id)
+
+    def _count_queries(self, method, url, *args, **kwargs):
+        """Run a request and return (response, number of queries)."""
+        with CaptureQueriesContext(connection) as ctx:
+            res = getattr(self.client, method)(url, *args, **kwargs)
+
+        return res, len(ctx.captured_queries)
+
+    def test_list_queries_constant(self):
+        """Test listing recipes does not run a query per recipe."""
+        create_recipes(self.user, 2)
+        res, small = self._count_queries('get', RECIPES_URL)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+        create_recipes(self.user, 20)
+        res, large = self._count_queries('get', RECIPES_URL)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+        self.assertEqual(small, large)
+
+    def test_list_filtered_queries_constant(self):
+        """Test filtering recipes does not run a query per recipe."""
+        tag = Tag.objects.create(user=self.user, name='Shared')
+        for recipe in create_recipes(self.user, 2):
+            recipe.tags.add(tag)
+        params = {'tags': str(tag.id)}
+        res, small = self._count_queries('get', RECIPES_URL, params)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+        for recipe in create_recipes(self.user, 20):
+            recipe.tags.add(tag)
+        res, large = self._count_queries('get', RECIPES_URL, params)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+        self.assertEqual(small, large)
+
+    def test_retrieve_queries_constant(self):
+        """Test retrieving a recipe does not run a query per tag."""
+        small_recipe = create_recipes(self.user, 1, attrs_per_recipe=1)[0]
+        large_recipe = create_recipes(self.user, 1, attrs_per_recipe=20)[0]
+
+        res, small = self._count_queries('get', detail_url(small_recipe.id))
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        res, large = self._count_queries('get', detail_url(large_recipe.id))
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+        self.assertEqual(small, large)
+
+    def test_update_response_queries_constant(self):
+        """Test the response after an update does not query per tag."""
+        small_recipe = create_recipes(self.user, 1, attrs_per_recipe=1)[0]
+        large_recipe = create_recipes(self.user, 1, attrs_per_recipe=20)[0]
+        payload = {'title': 'New title'}
+
+        res, small = self._count_queries(
+            'patch', detail_url(small_recipe.id), payload)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        res, large = self._count_queries(
+            'patch', detail_url(large_recipe.id), payload)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+        self.assertEqual(small, large)
+
+    def test_create_queries_constant(self):
+        """Test creating a recipe does not run queries per tag."""
+        def payload(count):
+            return {
+                'title': 'Curry',
+                'time_minutes': 30,
+                'price': Decimal('2.50'),
+                'tags': [{'name': f'Tag {i}'} for i in range(count)],
+                'ingredients': [{'name': f'Ing {i}'} for i in range(count)],
+            }
+
+        res, small = self._count_queries(
+            'post', RECIPES_URL, payload(1), format='json')
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        res, large = self._count_queries(
+            'post', RECIPES_URL, payload(30), format='json')
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+
+        self.assertEqual(small, large)
+        self.assertEqual(len(res.data['ingredients']), 30)
+
+
+class RecipeUpdateDiffTests(TestCase):
+    """Test updating tags/ingredients writes only the changed links."""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            'user@example.com',
+            'testpass123',
+        )
+        self.client.force_authenticate(self.user)
+        self.recipe = create_recipes(self.user, 1, attrs_per_recipe=10)[0]
+        self.tag_names = [tag.name for tag in self.recipe.tags.all()]
+
+    def _patch_tags(self, names):
+        """Patch the recipe tags and return the through-table writes."""
+        payload = {'tags': [{'name': name} for name in names]}
+        with CaptureQueriesContext(connection) as ctx:
+            res = self.client.patch(
+                detail_url(self.recipe.id), payload, format='json')
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+        self.assertCountEqual(
+            self.recipe.tags.values_list('name', flat=True),
+            names,
+        )
+        table = Recipe.tags.through._meta.db_table
+        return [
+            query['sql'].split()[0]
+            for query in ctx.captured_queries
+            if query['sql'].startswith(('INSERT', 'DELETE'))
+            and f'"{table}"' in query['sql']
+        ]
+
+    def test_noop_update_writes_nothing(self):
+        """Test sending the same tags does not touch the through table."""
+        writes = self._patch_tags(self.tag_names)
+
+        self.assertEqual(writes, [])
+
+    def test_small_change_update(self):
+        """Test swapping one tag runs one delete and one insert."""
+        names = self.tag_names[1:] + ['New tag']
+        writes = self._patch_tags(names)
+
+        self.assertEqual(sorted(writes), ['DELETE', 'INSERT'])
+
+    def test_full_replace_update(self):
+        """Test replacing every tag runs one delete and one insert."""
+        names = [f'Replacement {i}' for i in range(10)]
+        writes = self._patch_tags(names)
+
+        self.assertEqual(sorted(writes), ['DELETE', 'INSERT'])
@@ -92,6 +92,19 @@ class PrivateTagsApiTests(TestCase):
         tag.refresh_from_db()
         self.assertEqual(tag.name, payload['name'])
 
+    def test_update_tag_duplicate_name_error(self):
+        """Test renaming a tag to a name already in use fails."""
+        Tag.objects.create(user=self.user, name='Dessert')
+        tag = Tag.objects.create(user=self.user, name='After Dinner')
+
+        payload = {'name': 'Dessert'}
+        url = detail_url(tag.id)
+        res = self.client.patch(url, payload)
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        tag.refresh_from_db()
+        self.assertEqual(tag.name, 'After Dinner')
+
     def test_delete_tag(self):
         """Test deleting a tag."""
         tag = Tag.objects.create(user=self.user, name='Breakfast')
@@ -143,4 +156,74 @@ class PrivateTagsApiTests(TestCase):
 
         res = self.client.get(TAGS_URL, {'assigned_only': 1})
 
-        self.assertEqual(len(res.data), 1)
\ No newline at end of file
+        self.assertEqual(len(res.data), 1)
+
+
+class TagAutocompleteTests(TestCase):
+    """Test the type-ahead search of tag names."""
+
+    def setUp(self):
+        self.user = create_user()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def _names(self, res):
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        return [tag['name'] for tag in res.data]
+
+    def _use(self, tag, times):
+        """Link tag to times new recipes."""
+        for i in range(times):
+            recipe = Recipe.objects.create(
+                user=self.user,
+                title='Sample recipe',
+                time_minutes=10,
+                price=Decimal('5.00'),
+            )
+            recipe.tags.add(tag)
+
+    def test_prefix_then_similar_then_usage(self):
+        """Test prefix matches first, then by similarity and usage."""
+        for name in ['Chicken', 'Chicken red', 'Chiken', 'Beef']:
+            Tag.objects.create(user=self.user, name=name)
+        self._use(Tag.objects.create(user=self.user, name='Chicken tan'), 2)
+        Tag.objects.create(user=create_user('other@example.com'),
+                           name='Chicken')
+
+        res = self.client.get(TAGS_URL, {'q': 'chicken'})
+
+        self.assertEqual(
+            self._names(res),
+            ['Chicken', 'Chicken tan', 'Chicken red', 'Chiken'],
+        )
+
+    def test_limit(self):
+        """Test only the top matches are returned."""
+        for name in ['Chicken', 'Chicken red', 'Chicken tan']:
+            Tag.objects.create(user=self.user, name=name)
+
+        res = self.client.get(TAGS_URL, {'q': 'chick', 'limit': 1})
+
+        self.assertEqual(self._names(res), ['Chicken'])
+
+    def test_invalid_limit(self):
+        """Test a limit over the maximum is rejected."""
+        res = self.client.get(TAGS_URL, {'q': 'chick', 'limit': 1000})
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_cached_until_changed(self):
+        """Test repeated prefixes are cached until the tags change."""
+        Tag.objects.create(user=self.user, name='Chicken')
+        tag = Tag.objects.create(user=self.user, name='Beef')
+        self._names(self.client.get(TAGS_URL, {'q': 'Chick'}))
+
+        """only the collection version is read"""
+        with self.assertNumQueries(1):
+            names = self._names(self.client.get(TAGS_URL, {'q': 'chick'}))
+        self.assertEqual(names, ['Chicken'])
+
+        self.client.patch(detail_url(tag.id), {'name': 'Chicken wings'})
+        res = self.client.get(TAGS_URL, {'q': 'chick'})
+
+        self.assertEqual(self._names(res), ['Chicken', 'Chicken wings'])
@@ -0,0 +1,60 @@
+"""
+Bounded handling of recipe image uploads.
+"""
+import os
+
+from django.conf import settings
+from django.core.files.uploadhandler import TemporaryFileUploadHandler
+
+from rest_framework import status
+from rest_framework.exceptions import APIException
+
+
+"""Pillow format -> extension of the stored file"""
+IMAGE_FORMATS = {
+    'JPEG': 'jpg',
+    'PNG': 'png',
+    'WEBP': 'webp',
+    'GIF': 'gif',
+}
+
+"""room for the multipart boundaries and headers around the file"""
+MULTIPART_OVERHEAD = 64 * 1024
+
+
+class UploadTooLarge(APIException):
+    status_code = status.HTTP_413_REQUEST_ENTITY_TOO_LARGE
+    default_detail = 'The image is larger than the upload limit.'
+    default_code = 'upload_too_large'
+
+
+class LimitedUploadHandler(TemporaryFileUploadHandler):
+    """Spool uploads to disk chunk by chunk, up to a byte limit."""
+
+    """Only one chunk is ever held in memory. The temporary file lives
+    next to MEDIA_ROOT (FILE_UPLOAD_TEMP_DIR), so FileSystemStorage
+    saves it with a rename instead of copying it"""
+    def __init__(self, request=None, max_bytes=None):
+        super().__init__(request)
+        self.max_bytes = max_bytes or settings.RECIPE_IMAGE_MAX_BYTES
+        self.received = 0
+
+    def handle_raw_input(self, input_data, META, content_length, boundary,
+                         encoding=None):
+        """Reject a request announcing too many bytes before reading."""
+        if content_length > self.max_bytes + MULTIPART_OVERHEAD:
+            raise UploadTooLarge()
+
+    def new_file(self, *args, **kwargs):
+        os.makedirs(settings.FILE_UPLOAD_TEMP_DIR, exist_ok=True)
+        super().new_file(*args, **kwargs)
+
+    def receive_data_chunk(self, raw_data, start):
+        """Write a chunk, failing as soon as the limit is passed."""
+        self.received += len(raw_data)
+        if self.received > self.max_bytes:
+            """closing the temporary file deletes it"""
+            self.file.close()
+            raise UploadTooLarge()
+
+        return super().receive_data_chunk(raw_data, start)
@@ -1,6 +1,27 @@
 """
 Views for the recipe APIs
 """
+import hashlib
+import zlib
+
+from django.conf import settings
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.contrib.postgres.search import SearchQuery, SearchRank
+from django.db import transaction
+from django.db.models import (
+    Count,
+    Exists,
+    F,
+    FloatField,
+    OuterRef,
+    Prefetch,
+)
+from django.db.models.functions import Cast
+from django.http import FileResponse, StreamingHttpResponse
+from django.utils import timezone
+from django.utils.cache import patch_cache_control, patch_vary_headers
+from django.utils.http import parse_etags
+
 from rest_framework import (
     viewsets,
     mixins,
@@ -15,18 +36,110 @@ from drf_spectacular.utils import (
 )
 
 from rest_framework.decorators import action
+from rest_framework.exceptions import NotFound, ValidationError
 from rest_framework.response import Response
-from rest_framework.authentication import TokenAuthentication
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.views import APIView
+from rest_framework.permissions import SAFE_METHODS, IsAuthenticated
 
-from recipe import serializers
+from recipe import autocomplete, images, media, serializers
+from recipe.image_cache import resized_image_cache
+from recipe.pagination import RecipeCursorPagination
+from recipe.uploads import LimitedUploadHandler
 
+from core.authentication import CachedTokenAuthentication
+from core import renderers
 from core.models import(
+    RECIPE_SEARCH_CONFIG,
+    CollectionVersion,
+    ImageBlob,
     Recipe,
     Tag,
     Ingredient,
 )
 
+
+"""Every write bumps the user's CollectionVersion in the same transaction,
+so an ETag built from that version changes as soon as the data does and an
+unchanged list is answered with 304 before the main query or the
+serializer run"""
+class VersionedCollectionMixin:
+    """Version writes to a user's collection and answer unchanged GETs."""
+
+    def _bump_version(self):
+        """Mark the user's collection as changed."""
+        CollectionVersion.objects.bump(self.request.user.id)
+
+    def perform_create(self, serializer):
+        with transaction.atomic():
+            super().perform_create(serializer)
+            self._bump_version()
+
+    def perform_update(self, serializer):
+        with transaction.atomic():
+            super().perform_update(serializer)
+            self._bump_version()
+
+    def perform_destroy(self, instance):
+        with transaction.atomic():
+            super().perform_destroy(instance)
+            self._bump_version()
+
+    def _etag(self, *parts):
+        """Return a strong ETag for this request and the given parts."""
+        request = self.request
+        key = ':'.join(str(part) for part in (
+            request.user.id,
+            request.get_full_path(),
+            request.accepted_media_type,
+            *parts,
+        ))
+        return '"%s"' % hashlib.sha1(key.encode()).hexdigest()
+
+    def _conditional_response(self, etag, handler, *args, **kwargs):
+        """Return 304 if the client has etag, else run handler."""
+        if_none_match = self.request.META.get('HTTP_IF_NONE_MATCH')
+        etags = [
+            tag.replace('W/', '', 1)
+            for tag in parse_etags(if_none_match or '')
+        ]
+        if etags == ['*'] or etag in etags:
+            response = Response(status=status.HTTP_304_NOT_MODIFIED)
+        else:
+            response = handler(self.request, *args, **kwargs)
+
+        if response.status_code in (
+            status.HTTP_200_OK,
+            status.HTTP_304_NOT_MODIFIED,
+        ):
+            response['ETag'] = etag
+
+        return response
+
+    def list(self, request, *args, **kwargs):
+        """List the collection, or 304 if the client has it already."""
+        version = CollectionVersion.objects.current(request.user.id)
+        return self._conditional_response(
+            self._etag(version),
+            super().list,
+            *args,
+            **kwargs,
+        )
+
+
+SPARSE_FIELDS_PARAMETERS = [
+    OpenApiParameter(
+        'fields',
+        OpenApiTypes.STR,
+        description='Comma separated list of the fields to return',
+    ),
+    OpenApiParameter(
+        'omit',
+        OpenApiTypes.STR,
+        description='Comma separated list of the fields not to return',
+    ),
+]
+
+
 """Below is schema used by Django spectacular to extend the
 documentation view. here we can give as much info to the user
 about the usage and information about the api"""
@@ -44,21 +157,52 @@ about the usage and information about the api"""
                 OpenApiTypes.STR,
                 description='Comma separated list of ingredient IDs to filter',
             ),
+            OpenApiParameter(
+                'match',
+                OpenApiTypes.STR, enum=['any', 'all'],
+                description='Match recipes having any (default) or all '
+                            'of the given tags/ingredients',
+            ),
+            OpenApiParameter(
+                'search',
+                OpenApiTypes.STR,
+                description='Full-text search of title and description, '
+                            'best matches first',
+            ),
+            OpenApiParameter(
+                'ordering',
+                OpenApiTypes.STR,
+                enum=[
+                    f'{direction}{field}'
+                    for field in ('id', 'price', 'time_minutes', 'title')
+                    for direction in ('', '-')
+                ],
+                description='Sort key, prefixed with - for descending. '
+                            'Default: -id, or best matches for a search',
+            ),
+            OpenApiParameter('price_min', OpenApiTypes.DECIMAL),
+            OpenApiParameter('price_max', OpenApiTypes.DECIMAL),
+            OpenApiParameter('time_min', OpenApiTypes.INT),
+            OpenApiParameter('time_max', OpenApiTypes.INT),
+            *SPARSE_FIELDS_PARAMETERS,
         ]
-    )
+    ),
+    retrieve=extend_schema(parameters=SPARSE_FIELDS_PARAMETERS),
 )
 
 
 
-class RecipeViewSet(viewsets.ModelViewSet):
+class RecipeViewSet(VersionedCollectionMixin, viewsets.ModelViewSet):
     """View for manage recipe APIs."""
 
     """ModelViewSet used with specific model definition like Recipe
     ModelViewSet gives already defined logic for CRUD operation"""
     serializer_class = serializers.RecipeDetailSerializer
-    queryset = Recipe.objects.all()
-    authentication_classes = [TokenAuthentication]
+    """search_vector is only read by the database"""
+    queryset = Recipe.objects.defer('search_vector')
+    authentication_classes = [CachedTokenAuthentication]
     permission_classes = [IsAuthenticated]
+    pagination_class = RecipeCursorPagination
 
     """passed strings contains tags/ingredients ids, that
     will be converted into integer list[]"""
@@ -66,24 +210,237 @@ class RecipeViewSet(viewsets.ModelViewSet):
         """Convert a list of strings to integers."""
         return [int(str_id) for str_id in qs.split(',')]
 
+    """match=any keeps recipes linked to at least one of the ids,
+    match=all keeps recipes linked to every one of them"""
+    def _filter_recipes(self, queryset, params):
+        """Apply the tags/ingredients filters from params."""
+        match = params.get('match', 'any')
+        if match not in ('any', 'all'):
+            raise ValidationError({'match': 'Must be "any" or "all".'})
+
+        for field_name in ('tags', 'ingredients'):
+            value = params.get(field_name)
+            if value:
+                queryset = self._filter_by_attrs(
+                    queryset,
+                    field_name,
+                    set(self._params_to_ints(value)),
+                    match,
+                )
+
+        search = params.get('search')
+        if search:
+            queryset = queryset.filter(
+                search_vector=self._search_query(search))
+
+        ranges = serializers.RecipeRangeFilterSerializer(data=params)
+        ranges.is_valid(raise_exception=True)
+        return queryset.filter(**{
+            ranges.lookups[name]: value
+            for name, value in ranges.validated_data.items()
+        })
+
+    def _search_query(self, search):
+        """Return the tsquery of a search typed by a user."""
+        """websearch syntax never fails to parse: quoted phrases, "or"
+        and -word work and anything else is taken as words"""
+        return SearchQuery(
+            search,
+            config=RECIPE_SEARCH_CONFIG,
+            search_type='websearch',
+        )
+
+    """Every sort key has an index on (user_id, key, id). The id breaks
+    ties in the same direction, so each ordering is a scan of one index,
+    forwards or backwards, and never a sort. Searches default to the best
+    matches first: ts_rank is a real, cast to double precision so the
+    value in the cursor compares exactly"""
+    ordering_fields = ['id', 'price', 'time_minutes', 'title']
+
+    def get_ordering(self):
+        """Return the keyset ordering of the list, ending with the id."""
+        ordering = self.request.query_params.get('ordering')
+        if not ordering:
+            if self.request.query_params.get('search'):
+                return ('-rank', '-id')
+            return ('-id',)
+
+        descending = ordering.startswith('-')
+        field = ordering[1:] if descending else ordering
+        if field not in self.ordering_fields:
+            raise ValidationError({'ordering': (
+                f'Must be one of {", ".join(self.ordering_fields)}, '
+                'optionally prefixed with -.'
+            )})
+        keys = [field] if field == 'id' else [field, 'id']
+
+        return tuple(f'-{key}' if descending else key for key in keys)
+
+    """Both modes only read the recipe_tags/recipe_ingredients through
+    table: "any" is a correlated EXISTS (a semi-join) and "all" groups the
+    links by recipe and keeps those having a link to every id"""
+    def _filter_by_attrs(self, queryset, field_name, ids, match):
+        """Filter recipes by the ids of their tags or ingredients."""
+        field = Recipe._meta.get_field(field_name)
+        recipe_col = f'{field.m2m_field_name()}_id'
+        attr_col = f'{field.m2m_reverse_field_name()}_id'
+        links = field.remote_field.through.objects.filter(
+            **{f'{attr_col}__in': ids}
+        )
+
+        if match == 'all':
+            matching = links.values(recipe_col).annotate(
+                matched=Count(attr_col, distinct=True),
+            ).filter(matched=len(ids)).values(recipe_col)
+            return queryset.filter(id__in=matching)
+
+        return queryset.filter(
+            Exists(links.filter(**{recipe_col: OuterRef('pk')}))
+        )
+
+    """Every multipart body sent to the recipes is spooled by the bounded
+    handler, set before anything parses it, not only the upload-image
+    ones: the other actions ignore files but would still read them"""
+    def initialize_request(self, request, *args, **kwargs):
+        request.upload_handlers = [LimitedUploadHandler(request)]
+        return super().initialize_request(request, *args, **kwargs)
+
     """By default get_queryset returns all the objects in the db
     we have override this function to return only the objects/recipe
     of the logged-in/current user"""
     def get_queryset(self):
         """Retrieve recipes for authenticated user."""
-        tags = self.request.query_params.get('tags')
-        ingredients = self.request.query_params.get('ingredients')
-        queryset = self.queryset
-        if tags:
-            tag_ids = self._params_to_ints(tags)
-            queryset = queryset.filter(tags__id__in=tag_ids)
-        if ingredients:
-            ingredient_ids = self._params_to_ints(ingredients)
-            queryset = queryset.filter(ingredients__id__in=ingredient_ids)
+        queryset = self._filter_recipes(
+            self.queryset,
+            self.request.query_params,
+        )
 
-        return queryset.filter(
+        """the filters are EXISTS subqueries rather than joins, so every
+        recipe appears once and no DISTINCT is needed"""
+        search = self.request.query_params.get('search')
+        if search:
+            queryset = queryset.annotate(rank=Cast(
+                SearchRank(F('search_vector'), self._search_query(search)),
+                FloatField(),
+            ))
+
+        queryset = queryset.filter(
             user=self.request.user
-        ).order_by('-id').distinct()
+        ).order_by(*self.get_ordering())
+
+        """the image actions only touch the image column, so they do not need
+        the nested tags/ingredients loaded"""
+        if self.action in ('upload_image', 'image'):
+            return queryset
+
+        """reads get plain rows for RecipeReadSerializer, which loads the
+        tags/ingredients itself"""
+        fields = self._output_fields()
+        if fields is not None:
+            return queryset.values(
+                *self._columns(fields, self.get_ordering()))
+
+        return self._prefetch_related(queryset)
+
+    """Reads only emit the fields asked for with fields= (default: all of
+    the serializer) minus those in omit=. Only their columns are selected
+    and the tags/ingredients are only loaded when emitted, so a list never
+    loads the description it does not return"""
+    read_actions = ('list', 'retrieve', 'export')
+
+    """serializer field -> the columns it reads, when not its own"""
+    sparse_columns = {
+        'tags': [],
+        'ingredients': [],
+        'image_variants': ['image', 'image_variants'],
+    }
+
+    def _output_fields(self):
+        """Return the serializer fields emitted, None for all and writes."""
+        if self.request.method not in SAFE_METHODS or \
+                self.action not in self.read_actions:
+            return None
+        if not hasattr(self, '_fields'):
+            available = self.get_serializer_class().Meta.fields
+            fields = self._fields_param('fields', available) or available
+            omit = self._fields_param('omit', available)
+            self._fields = [name for name in fields if name not in omit]
+
+        return self._fields
+
+    def _fields_param(self, param, available):
+        """Return the field names listed in a query parameter."""
+        value = self.request.query_params.get(param)
+        if not value:
+            return []
+        names = [name.strip() for name in value.split(',')]
+        unknown = [name for name in names if name not in available]
+        if unknown:
+            raise ValidationError({param: (
+                f'Unknown fields: {", ".join(unknown)}. '
+                f'Available: {", ".join(available)}.'
+            )})
+
+        return names
+
+    def _columns(self, fields, ordering):
+        """Return the columns needed to emit fields and page the rows."""
+        """the sort keys are read from the rows to build the cursor"""
+        columns = {'id'} | {key.lstrip('-') for key in ordering}
+        for name in fields:
+            columns.update(self.sparse_columns.get(name, [name]))
+
+        return sorted(columns)
+
+    """writes, and the forms of the browsable API, which ask for them
+    with the method of the form, keep the DRF serializers"""
+    def get_serializer(self, *args, **kwargs):
+        fields = self._output_fields()
+        if fields is not None:
+            kwargs.setdefault('context', self.get_serializer_context())
+            return serializers.RecipeReadSerializer(
+                *args, fields=fields, **kwargs)
+
+        return super().get_serializer(*args, **kwargs)
+
+    """Serializing nested tags/ingredients per recipe costs two queries
+    for every row, prefetching loads them for the whole page at once"""
+    def _prefetch_related(self, queryset):
+        """Prefetch the tags and ingredients used by the serializers."""
+        return queryset.prefetch_related(*self._related_prefetches())
+
+    def _related_prefetches(self):
+        """Return the prefetches of the tags and ingredients."""
+        return [
+            Prefetch('tags', queryset=Tag.objects.only('id', 'name')),
+            Prefetch(
+                'ingredients',
+                queryset=Ingredient.objects.only('id', 'name'),
+            ),
+        ]
+
+    """A single recipe is versioned by its own updated_at, which also
+    changes when one of its tags/ingredients is renamed or deleted, so
+    writes to other recipes do not invalidate it"""
+    def retrieve(self, request, *args, **kwargs):
+        """Retrieve a recipe, or 304 if the client has it already."""
+        """an id that is no number is left to get_object() for the 404"""
+        try:
+            updated_at = Recipe.objects.filter(
+                user=request.user,
+                pk=kwargs['pk'],
+            ).values_list('updated_at', flat=True).first()
+        except (TypeError, ValueError, DjangoValidationError):
+            updated_at = None
+        if updated_at is None:
+            return super().retrieve(request, *args, **kwargs)
+
+        return self._conditional_response(
+            self._etag(updated_at.isoformat()),
+            super().retrieve,
+            *args,
+            **kwargs,
+        )
 
     """Below method available in django documentation
     which returns serializer class to be used"""
@@ -97,6 +454,11 @@ class RecipeViewSet(viewsets.ModelViewSet):
 
         return self.serializer_class
 
+    def perform_destroy(self, instance):
+        with transaction.atomic():
+            super().perform_destroy(instance)
+            ImageBlob.objects.release(
+                Recipe.file_names(instance.image, instance.image_variants))
 
     """perform_create method is called while creating the object in ModelViewSet
     https://www.django-rest-framework.org/api-guide/generic-views/#get_serializer_classself"""
@@ -105,7 +467,244 @@ class RecipeViewSet(viewsets.ModelViewSet):
 
         """This will save the user as current authenticated user,
         when we create a recipe"""
-        serializer.save(user=self.request.user)
+        with transaction.atomic():
+            serializer.save(user=self.request.user)
+            self._bump_version()
+
+    """Importers send many recipes in one request, validation errors
+    come back as a list with one entry per recipe and nothing is created
+    unless every recipe is valid"""
+    @extend_schema(
+        request=serializers.RecipeDetailSerializer(many=True),
+        responses={201: serializers.RecipeDetailSerializer(many=True)},
+    )
+    @action(methods=['POST'], detail=False, url_path='bulk')
+    def bulk_create(self, request):
+        """Create many recipes at once."""
+        if not isinstance(request.data, list):
+            raise ValidationError('Expected a list of recipes.')
+        if len(request.data) > settings.RECIPE_BULK_MAX:
+            raise ValidationError(
+                f'At most {settings.RECIPE_BULK_MAX} recipes per request.')
+
+        serializer = self.get_serializer(data=request.data, many=True)
+        serializer.is_valid(raise_exception=True)
+        with transaction.atomic():
+            recipes = serializer.save(user=request.user)
+            self._bump_version()
+
+        queryset = self._prefetch_related(Recipe.objects.filter(
+            id__in=[recipe.id for recipe in recipes],
+        ).order_by('id'))
+        serializer = self.get_serializer(queryset, many=True)
+        return Response(serializer.data, status=status.HTTP_201_CREATED)
+
+    def _bulk_queryset(self, data):
+        """Return the user's recipes selected for a bulk action."""
+        queryset = Recipe.objects.filter(user=self.request.user)
+        if 'ids' in data:
+            queryset = queryset.filter(id__in=data['ids'])
+
+        return self._filter_recipes(queryset, data)
+
+    """Bulk actions run one UPDATE, or one DELETE per table, over the
+    selected recipes instead of a request per recipe"""
+    @extend_schema(
+        request=serializers.RecipeBulkUpdateSerializer,
+        responses={200: OpenApiTypes.OBJECT},
+    )
+    @action(methods=['PATCH'], detail=False, url_path='bulk-update')
+    def bulk_update(self, request):
+        """Update price, time_minutes or link of many recipes."""
+        serializer = serializers.RecipeBulkUpdateSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        fields = {
+            name: value
+            for name, value in serializer.validated_data.items()
+            if name in serializer.update_fields
+        }
+
+        with transaction.atomic():
+            updated = self._bulk_queryset(serializer.validated_data).update(
+                updated_at=timezone.now(),
+                **fields,
+            )
+            if updated:
+                self._bump_version()
+
+        return Response({'updated': updated}, status=status.HTTP_200_OK)
+
+    @extend_schema(
+        request=serializers.RecipeBulkSelectSerializer,
+        responses={200: OpenApiTypes.OBJECT},
+    )
+    @action(methods=['POST'], detail=False, url_path='bulk-delete')
+    def bulk_delete(self, request):
+        """Delete many recipes."""
+        serializer = serializers.RecipeBulkSelectSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        """only the ids are needed to delete the recipes and their links,
+        plus the image names to release"""
+        with transaction.atomic():
+            queryset = self._bulk_queryset(serializer.validated_data)
+            files = [
+                name
+                for image, variants in queryset.filter(image__gt='')
+                .values_list('image', 'image_variants')
+                for name in Recipe.file_names(image, variants)
+            ]
+            _, deleted = queryset.only('id').delete()
+            deleted = deleted.get(Recipe._meta.label, 0)
+            if deleted:
+                ImageBlob.objects.release(files)
+                self._bump_version()
+
+        return Response({'deleted': deleted}, status=status.HTTP_200_OK)
+
+    """The export is written while it is read: recipes come from a
+    server-side cursor, tags/ingredients are prefetched per chunk and every
+    chunk is serialized and sent before the next one is fetched, so memory
+    stays flat and the first bytes go out straight away"""
+    @extend_schema(
+        parameters=SPARSE_FIELDS_PARAMETERS,
+        responses={(200, 'application/x-ndjson'): OpenApiTypes.STR},
+    )
+    @action(methods=['GET'], detail=False, url_path='export')
+    def export(self, request):
+        """Stream all the user's recipes as NDJSON."""
+        queryset = self._filter_recipes(
+            self.queryset.filter(user=request.user),
+            request.query_params,
+        ).order_by('id').values(
+            *self._columns(self._output_fields(), ['id']))
+
+        use_gzip = self._accepts_gzip(request)
+        response = StreamingHttpResponse(
+            self._export_lines(queryset, use_gzip),
+            content_type='application/x-ndjson',
+        )
+        response['Content-Disposition'] = (
+            'attachment; filename="recipes.ndjson"')
+        if use_gzip:
+            response['Content-Encoding'] = 'gzip'
+        patch_vary_headers(response, ['Accept-Encoding'])
+
+        return response
+
+    def _accepts_gzip(self, request):
+        """Return whether Accept-Encoding allows a gzipped response."""
+        """an explicit gzip wins over *, either one with q=0 refuses it"""
+        qvalues = {}
+        for coding in request.META.get('HTTP_ACCEPT_ENCODING', '').split(','):
+            name, *params = [part.strip() for part in coding.split(';')]
+            qvalue = 1.0
+            for param in params:
+                key, _, value = param.partition('=')
+                if key.strip().lower() == 'q':
+                    try:
+                        qvalue = float(value)
+                    except ValueError:
+                        qvalue = 0.0
+            qvalues[name.lower()] = qvalue
+
+        return qvalues.get('gzip', qvalues.get('*', 0.0)) > 0
+
+    def _export_lines(self, queryset, use_gzip):
+        """Yield the recipes as NDJSON, gzipped if asked to."""
+        compressor = zlib.compressobj(wbits=16 + zlib.MAX_WBITS)
+        chunk_size = settings.RECIPE_EXPORT_CHUNK_SIZE
+        chunk = []
+
+        def encode(recipes):
+            serializer = self.get_serializer(recipes, many=True)
+            data = b''.join(
+                renderers.dumps(item) + b'\n' for item in serializer.data)
+            return compressor.compress(data) if use_gzip else data
+
+        for recipe in queryset.iterator(chunk_size=chunk_size):
+            chunk.append(recipe)
+            if len(chunk) == chunk_size:
+                yield encode(chunk)
+                chunk = []
+
+        if chunk:
+            yield encode(chunk)
+        if use_gzip:
+            yield compressor.flush()
+
+    """The resized images are cached on disk under a key made of the
+    stored image name, itself the hash of its content, and the requested
+    size. So the key doubles as a strong ETag and recipes sharing an image
+    share its cached sizes"""
+    @extend_schema(
+        parameters=[
+            OpenApiParameter('width', OpenApiTypes.INT, required=True),
+            OpenApiParameter('quality', OpenApiTypes.INT),
+            OpenApiParameter('format', OpenApiTypes.STR,
+                             enum=['jpeg', 'webp']),
+        ],
+        responses={(200, 'image/*'): OpenApiTypes.BINARY},
+    )
+    @action(methods=['GET'], detail=True, url_path='image')
+    def image(self, request, pk=None):
+        """Return the recipe image resized to one of the allowed widths."""
+        recipe = self.get_object()
+        if not recipe.image:
+            raise NotFound('This recipe has no image.')
+        serializer = serializers.RecipeImageResizeSerializer(
+            data=request.query_params)
+        serializer.is_valid(raise_exception=True)
+        size = serializer.validated_data
+
+        key = hashlib.sha256(':'.join(str(part) for part in (
+            recipe.image.name,
+            size['width'],
+            size['quality'],
+            size['format'],
+        )).encode()).hexdigest()
+        response = self._conditional_response(
+            f'"{key}"',
+            self._resized_image,
+            recipe.image.name,
+            key,
+            size,
+        )
+        patch_cache_control(
+            response,
+            private=True,
+            max_age=settings.RECIPE_IMAGE_RESIZE['MAX_AGE'],
+        )
+
+        return response
+
+    def _resized_image(self, request, image_name, key, size):
+        """Return the resized image, encoding it on a cache miss."""
+        cache = resized_image_cache()
+
+        def produce():
+            try:
+                return images.resize(
+                    image_name, size['width'], size['quality'],
+                    size['format'])
+            except FileNotFoundError:
+                raise NotFound('The image file is missing.')
+
+        path = cache.get_or_create(key, produce)
+        try:
+            image_file = open(path, 'rb')
+        except FileNotFoundError:
+            """evicted before it could be opened, produce it again"""
+            image_file = open(cache.get_or_create(key, produce), 'rb')
+
+        return FileResponse(image_file, content_type=f'image/{size["format"]}')
+
+    """the image action answers with the image whatever Accept says"""
+    def perform_content_negotiation(self, request, force=False):
+        return super().perform_content_negotiation(
+            request,
+            force=force or self.action == 'image',
+        )
 
     """decorator function for handling upload image endpoint
     used with POST request, specific recipe-id(detail) required"""
@@ -116,7 +715,15 @@ class RecipeViewSet(viewsets.ModelViewSet):
         serializer = self.get_serializer(recipe, data=request.data)
 
         if serializer.is_valid():
-            serializer.save()
+            """the files of the old image are released, the storage may
+            share them with other recipes. The storage counted the new
+            one when saving it"""
+            old_files = Recipe.file_names(recipe.image, recipe.image_variants)
+            with transaction.atomic():
+                serializer.save(image_variants={})
+                ImageBlob.objects.release(old_files)
+                self._bump_version()
+                images.schedule_variants(recipe)
             return Response(serializer.data, status=status.HTTP_200_OK)
 
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
@@ -129,19 +736,47 @@ class RecipeViewSet(viewsets.ModelViewSet):
                 OpenApiTypes.INT, enum=[0, 1],
                 description='Filter by items assigned to recipes.',
             ),
+            OpenApiParameter(
+                'q',
+                OpenApiTypes.STR,
+                description='Type-ahead search: names starting with or '
+                            'similar to q, best matches first',
+            ),
+            OpenApiParameter(
+                'limit',
+                OpenApiTypes.INT,
+                description='Number of matches returned with q.',
+            ),
         ]
     )
 )
 
 
-class BaseRecipeAttrViewSet(mixins.DestroyModelMixin,
+class BaseRecipeAttrViewSet(VersionedCollectionMixin,
+                            mixins.DestroyModelMixin,
                             mixins.UpdateModelMixin,
                             mixins.ListModelMixin,
                             viewsets.GenericViewSet):
     """Base viewset for recipe attributes like Tags and Ingradients."""
-    authentication_classes = [TokenAuthentication]
+    authentication_classes = [CachedTokenAuthentication]
     permission_classes = [IsAuthenticated]
 
+    """renaming or deleting a tag/ingredient changes how its recipes are
+    shown, so their updated_at is touched in one UPDATE"""
+    def _touch_recipes(self, instance):
+        """Mark the recipes linked to instance as changed."""
+        instance.recipe_set.update(updated_at=timezone.now())
+
+    def perform_update(self, serializer):
+        with transaction.atomic():
+            super().perform_update(serializer)
+            self._touch_recipes(serializer.instance)
+
+    def perform_destroy(self, instance):
+        with transaction.atomic():
+            self._touch_recipes(instance)
+            super().perform_destroy(instance)
+
     def get_queryset(self):
         """Filter queryset to authenticated user."""
         assigned_only = bool(
@@ -155,6 +790,57 @@ class BaseRecipeAttrViewSet(mixins.DestroyModelMixin,
             user=self.request.user
         ).order_by('-name').distinct()
 
+    """Type-ahead requests repeat the same prefixes as the user types and
+    deletes, so the matches are cached per process under the collection
+    version, which also makes them answer If-None-Match with 304"""
+    def list(self, request, *args, **kwargs):
+        """List the names, or the best matches of q."""
+        if 'q' not in request.query_params:
+            return super().list(request, *args, **kwargs)
+
+        serializer = serializers.RecipeAttrAutocompleteSerializer(
+            data=request.query_params)
+        serializer.is_valid(raise_exception=True)
+        version = CollectionVersion.objects.current(request.user.id)
+
+        return self._conditional_response(
+            self._etag(version),
+            self._autocomplete,
+            version,
+            serializer.validated_data['q'],
+            serializer.validated_data['limit'],
+        )
+
+    def _autocomplete(self, request, version, q, limit):
+        """Return the best matches of q, from the cache if possible."""
+        assigned_only = bool(
+            int(request.query_params.get('assigned_only', 0))
+        )
+        """similarity and the regex ignore case, so does the key"""
+        key = (
+            self.queryset.model._meta.label,
+            request.user.id,
+            version,
+            q.lower(),
+            limit,
+            assigned_only,
+        )
+        cache = autocomplete.autocomplete_cache()
+        data = cache.get(key)
+        if data is None:
+            queryset = self.queryset.filter(user=request.user)
+            if assigned_only:
+                """rows are grouped by name for the usage count, so the
+                join adds no duplicates"""
+                queryset = queryset.filter(recipe__isnull=False)
+            data = self.get_serializer(
+                autocomplete.matches(queryset, q.lower(), limit),
+                many=True,
+            ).data
+            cache.set(key, data)
+
+        return Response(data)
+
 
 """mixin provides additional functionality. ListModelMixin, specific for listing models
 GenericViewSet, along with CRUD operations, it provides desired functionality for our api"""
@@ -167,4 +853,28 @@ class TagViewSet(BaseRecipeAttrViewSet):
 class IngredientViewSet(BaseRecipeAttrViewSet):
     """Manage ingredients in the database."""
     serializer_class = serializers.IngredientSerializer
-    queryset = Ingredient.objects.all()
\ No newline at end of file
+    queryset = Ingredient.objects.all()
+
+
+"""Media URLs used to be served by static() in DEBUG only. Stored files
+are only sent to the owner of a recipe using them, which also keeps the
+upload and cache directories out of reach"""
+@extend_schema(exclude=True)
+class RecipeMediaView(APIView):
+    """Send a recipe image or variant to the owner of the recipe."""
+    authentication_classes = [CachedTokenAuthentication]
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, name):
+        if not Recipe.objects.filter(
+            images.stored_as(name),
+            user=request.user,
+        ).exists():
+            raise NotFound()
+
+        storage = Recipe._meta.get_field('image').storage
+        return media.serve(request, storage.path(name), name)
+
+    """the file is sent whatever Accept says"""
+    def perform_content_negotiation(self, request, force=False):
+        return super().perform_content_negotiation(request, force=True)